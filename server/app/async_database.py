@@ -0,0 +1,39 @@
+from typing import AsyncIterator
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from .database import DATABASE_URL, apply_sqlite_pragmas, engine_options
+
+# Async driver for each sync URL scheme DATABASE_URL may use
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def async_url(url: str) -> str:
+    """The same database through its asyncio driver"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend in ASYNC_DRIVERS:
+        parsed = parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+    return parsed.render_as_string(hide_password=False)
+
+
+def make_async_engine(url: str = DATABASE_URL) -> AsyncEngine:
+    url = async_url(url)
+    engine = create_async_engine(url, **engine_options(url))
+    apply_sqlite_pragmas(engine.sync_engine)
+    return engine
+
+
+async_engine = make_async_engine()
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
+        yield db
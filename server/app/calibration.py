@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""Calibrate the similarity threshold, event boost and keyword prefilter
+
+Scores every pair of labeled posts once, with the clusterer's own feature
+code, into matrices: keyword overlap, title similarity, event match and
+same domain. The greedy assignment PostClusterer makes for any threshold,
+boost and prefilter only depends on those, so each setting of the grid is
+replayed from the matrices in milliseconds instead of re-running the
+clusterer, and the grid is split across worker processes.
+
+Labels come from a JSON file of {label: [posts]} like
+tests/sample_data/sample_posts.json. Posts in groups named by --singletons
+each belong to their own story. Each setting reports pairwise precision,
+recall and F1, plus title comparisons per post and the posts per second
+they would cost, since a looser prefilter buys recall with scoring work.
+
+    python -m app.calibration tests/sample_data/sample_posts.json
+    python -m app.calibration labels.json --thresholds 0.1:0.6:0.05 --workers 4
+"""
+
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .clustering import SOCIAL_DOMAINS, EXACT_TITLE_MATCH, PostClusterer
+from .features import extract_event_features
+from .fingerprints import post_fingerprints
+
+# Bump when feature code changes, so cached matrices are recomputed
+MATRIX_VERSION = 1
+
+DEFAULT_THRESHOLDS = "0.1:0.6:0.05"
+DEFAULT_BOOSTS = "0,0.05,0.1,0.15,0.2,0.25"
+DEFAULT_PREFILTERS = "0,0.1,0.2,0.3"
+
+
+class SimilarityMatrices:
+    """Pairwise features of labeled posts, in stream order
+
+    Entry [i, j] with j < i compares post i with post j as the
+    representative of an earlier cluster; the upper triangle is unused.
+    """
+
+    def __init__(self, posts: List[Dict], labels: List[str]):
+        self.post_ids = [post["id"] for post in posts]
+        self.labels = labels
+        n = len(posts)
+        self.overlap = np.zeros((n, n))
+        self.title = np.zeros((n, n))
+        self.event = np.zeros((n, n), dtype=bool)
+        self.same_domain = np.zeros((n, n), dtype=bool)
+        fingerprints = [post_fingerprints(post) for post in posts]
+        self.link_fingerprints = [fp.links for fp in fingerprints]
+        self.title_fingerprints = [fp.title for fp in fingerprints]
+        self.compare_seconds = 0.0  # Mean cost of one title comparison
+
+    def __len__(self) -> int:
+        return len(self.post_ids)
+
+    @classmethod
+    def compute(cls, posts: List[Dict], labels: List[str]) -> "SimilarityMatrices":
+        matrices = cls(posts, labels)
+        clusterer = PostClusterer(verbose=False)
+        keywords = [clusterer._post_keywords(post) for post in posts]
+        domains = [clusterer.extract_domain(post.get("url", "")) for post in posts]
+        features = [
+            extract_event_features(post["title"], clusterer.gazetteer) for post in posts
+        ]
+
+        if len(posts) > 1:  # Warm up, the first call imports scikit-learn
+            clusterer._title_similarity(posts[0]["title"], posts[1]["title"])
+        compared = 0
+        started = time.perf_counter()
+        for i, post in enumerate(posts):
+            for j in range(i):
+                matrices.overlap[i, j] = clusterer._keyword_set_overlap(
+                    keywords[i], keywords[j]
+                )
+                matrices.title[i, j] = clusterer._title_similarity(
+                    post["title"], posts[j]["title"]
+                )
+                matrices.event[i, j] = features[i].matches(features[j])
+                matrices.same_domain[i, j] = bool(domains[i]) and (
+                    domains[i] == domains[j] and domains[i] not in SOCIAL_DOMAINS
+                )
+                compared += 1
+        if compared:
+            matrices.compare_seconds = (time.perf_counter() - started) / compared
+        return matrices
+
+
+def load_labeled_posts(
+    path: str, singletons: Sequence[str] = ("unrelated",)
+) -> Tuple[List[Dict], List[str]]:
+    """Posts in created_utc order and the story label of each"""
+    with open(path) as labeled:
+        groups = json.load(labeled)
+    rows = []
+    for name, posts in groups.items():
+        for post in posts:
+            label = f"{name}/{post['id']}" if name in singletons else name
+            rows.append((post.get("created_utc") or 0, post["id"], post, label))
+    rows.sort(key=lambda row: row[:2])
+    return [row[2] for row in rows], [row[3] for row in rows]
+
+
+def cached_matrices(
+    path: str, singletons: Sequence[str], cache_path: Optional[str] = None
+) -> SimilarityMatrices:
+    """Matrices for a labeled file, reused from cache_path while it is unchanged"""
+    if cache_path is None:
+        return SimilarityMatrices.compute(*load_labeled_posts(path, singletons))
+
+    with open(path, "rb") as labeled:
+        digest = hashlib.sha256(labeled.read()).hexdigest()
+    key = (MATRIX_VERSION, digest, tuple(singletons))
+    if os.path.exists(cache_path):
+        with open(cache_path, "rb") as cache:
+            cached_key, matrices = pickle.load(cache)
+        if cached_key == key:
+            return matrices
+
+    matrices = SimilarityMatrices.compute(*load_labeled_posts(path, singletons))
+    with open(cache_path, "wb") as cache:
+        pickle.dump((key, matrices), cache, protocol=pickle.HIGHEST_PROTOCOL)
+    return matrices
+
+
+def simulate(
+    matrices: SimilarityMatrices,
+    threshold: float,
+    event_boost: float,
+    keyword_prefilter: float,
+) -> Tuple[np.ndarray, int]:
+    """Cluster index of every post and the title comparisons made
+
+    Mirrors PostClusterer.best_match: fingerprint shortcuts, then candidates
+    in creation order, where the first one passing the prefilter with the
+    same domain wins outright and otherwise the best title score plus event
+    boost must beat the threshold.
+    """
+    n = len(matrices)
+    assigned = np.empty(n, dtype=np.int64)
+    representatives: List[int] = []
+    fingerprint_index: Dict[bytes, int] = {}
+    comparisons = 0
+
+    for i in range(n):
+        cluster = fingerprint_match(matrices, i, fingerprint_index, threshold)
+        if cluster is None and representatives:
+            reps = np.asarray(representatives)
+            passed = matrices.overlap[i, reps] >= keyword_prefilter
+            domain_hits = np.flatnonzero(passed & matrices.same_domain[i, reps])
+            if len(domain_hits):
+                cluster = int(domain_hits[0])
+                comparisons += int(passed[:cluster].sum())
+            else:
+                comparisons += int(passed.sum())
+                scores = np.where(
+                    passed,
+                    matrices.title[i, reps] + event_boost * matrices.event[i, reps],
+                    0.0,
+                )
+                best = int(np.argmax(scores))
+                if scores[best] > 0 and scores[best] > threshold:
+                    cluster = best
+        if cluster is None:
+            cluster = len(representatives)
+            representatives.append(i)
+        assigned[i] = cluster
+        for fingerprint in (
+            *matrices.link_fingerprints[i],
+            matrices.title_fingerprints[i],
+        ):
+            if fingerprint is not None:
+                fingerprint_index[fingerprint] = cluster
+    return assigned, comparisons
+
+
+def fingerprint_match(
+    matrices: SimilarityMatrices,
+    i: int,
+    index: Dict[bytes, int],
+    threshold: float,
+) -> Optional[int]:
+    for fingerprint in matrices.link_fingerprints[i]:
+        if fingerprint in index:
+            return index[fingerprint]
+    title = matrices.title_fingerprints[i]
+    if title in index and EXACT_TITLE_MATCH > threshold:
+        return index[title]
+    return None
+
+
+def pairwise_scores(predicted: Sequence, labels: Sequence) -> Tuple[float, float]:
+    """Precision and recall over pairs of posts placed in the same cluster"""
+
+    def pairs(counts) -> int:
+        return sum(count * (count - 1) // 2 for count in counts)
+
+    predicted_pairs = pairs(_counts(predicted))
+    label_pairs = pairs(_counts(labels))
+    together = pairs(_counts(zip(predicted, labels)))
+    precision = together / predicted_pairs if predicted_pairs else 1.0
+    recall = together / label_pairs if label_pairs else 1.0
+    return precision, recall
+
+
+def _counts(values) -> List[int]:
+    counts: Dict = {}
+    for value in values:
+        counts[value] = counts.get(value, 0) + 1
+    return list(counts.values())
+
+
+def evaluate(matrices: SimilarityMatrices, setting: Tuple[float, float, float]) -> Dict:
+    threshold, event_boost, keyword_prefilter = setting
+    started = time.perf_counter()
+    assigned, comparisons = simulate(
+        matrices, threshold, event_boost, keyword_prefilter
+    )
+    elapsed = time.perf_counter() - started
+    precision, recall = pairwise_scores(assigned.tolist(), matrices.labels)
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    per_post = comparisons / max(len(matrices), 1)
+    scoring_seconds = per_post * matrices.compare_seconds
+    return {
+        "threshold": threshold,
+        "event_boost": event_boost,
+        "keyword_prefilter": keyword_prefilter,
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+        "clusters": int(assigned.max()) + 1 if len(assigned) else 0,
+        "comparisons_per_post": per_post,
+        # Title scoring alone, what the prefilter trades against recall
+        "posts_per_second": 1 / scoring_seconds if scoring_seconds else float("inf"),
+        "replay_ms": elapsed * 1000,
+    }
+
+
+_worker_matrices: Optional[SimilarityMatrices] = None
+
+
+def _init_worker(matrices: SimilarityMatrices):
+    global _worker_matrices
+    _worker_matrices = matrices
+
+
+def _evaluate_in_worker(setting: Tuple[float, float, float]) -> Dict:
+    return evaluate(_worker_matrices, setting)
+
+
+def sweep(
+    matrices: SimilarityMatrices,
+    thresholds: Sequence[float],
+    boosts: Sequence[float],
+    prefilters: Sequence[float],
+    workers: int = 1,
+) -> List[Dict]:
+    """Evaluate every setting of the grid, best F1 first"""
+    settings = list(itertools.product(thresholds, boosts, prefilters))
+    if workers > 1:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(matrices,)
+        ) as pool:
+            chunksize = max(1, len(settings) // (workers * 4))
+            results = list(pool.map(_evaluate_in_worker, settings, chunksize=chunksize))
+    else:
+        results = [evaluate(matrices, setting) for setting in settings]
+    results.sort(key=lambda r: (-r["f1"], -r["posts_per_second"], r["threshold"]))
+    return results
+
+
+def parse_grid(value: str) -> List[float]:
+    """ "start:stop:step" (stop included) or a comma separated list"""
+    if ":" in value:
+        start, stop, step = (float(part) for part in value.split(":"))
+        count = int(round((stop - start) / step)) + 1
+        return [round(start + k * step, 6) for k in range(count)]
+    return [float(part) for part in value.split(",") if part.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate clustering parameters")
+    parser.add_argument("labels", help="JSON file of {label: [posts]}")
+    parser.add_argument("--thresholds", default=DEFAULT_THRESHOLDS)
+    parser.add_argument("--boosts", default=DEFAULT_BOOSTS)
+    parser.add_argument("--prefilters", default=DEFAULT_PREFILTERS)
+    parser.add_argument(
+        "--singletons",
+        default="unrelated",
+        help="Comma separated groups whose posts are each their own story",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--cache", help="Keep the matrices in this file between runs")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--csv", help="Write every setting's results here")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    singletons = [name for name in args.singletons.split(",") if name]
+    matrices = cached_matrices(args.labels, singletons, args.cache)
+    print(
+        f"📊 {len(matrices)} posts, {len(set(matrices.labels))} stories, "
+        f"matrices ready in {time.perf_counter() - started:.2f}s"
+    )
+
+    started = time.perf_counter()
+    results = sweep(
+        matrices,
+        parse_grid(args.thresholds),
+        parse_grid(args.boosts),
+        parse_grid(args.prefilters),
+        args.workers,
+    )
+    elapsed = time.perf_counter() - started
+    print(f"🔍 {len(results)} settings swept in {elapsed:.2f}s\n")
+
+    print("threshold  boost  prefilter  precision  recall     F1  cmp/post  posts/s")
+    for r in results[: args.top]:
+        print(
+            f"{r['threshold']:9.2f}  {r['event_boost']:5.2f}  "
+            f"{r['keyword_prefilter']:9.2f}  {r['precision']:9.3f}  "
+            f"{r['recall']:6.3f}  {r['f1']:5.3f}  "
+            f"{r['comparisons_per_post']:8.1f}  {r['posts_per_second']:7,.0f}"
+        )
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as output:
+            writer = csv.DictWriter(output, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+
+    best = results[0]
+    print(
+        f"\n✅ Best: SIMILARITY_THRESHOLD={best['threshold']:g} "
+        f"event_boost={best['event_boost']:g} "
+        f"keyword_prefilter={best['keyword_prefilter']:g} (F1 {best['f1']:.3f})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""Second scoring stage for posts the title score can't decide
+
+The clusterer's cheap stage (keyword prefilter, title TF-IDF, event boost)
+settles most posts: far above the threshold they join, far below they
+start a new cluster. Only when the best cheap score lands within `band`
+of the threshold does CascadeScorer compare richer context, the selftext
+and top comments of the post and of the cluster's representative post,
+and blend that into the score. Context is fetched on first use and cached,
+so a representative post is loaded once however many posts it decides.
+
+Comments come over the network, so a caller holding a lock turns
+fetch_inline off: gray-zone posts without cached context keep their cheap
+score and are deferred, and the caller can prefetch their comments once
+the lock is released and rescore them.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from .config import get_settings
+
+if TYPE_CHECKING:
+    from .clustering import PostClusterer
+
+CommentLoader = Callable[[str], List[Dict]]
+
+# Characters of selftext and of each comment used as context
+CONTEXT_CHARS = 1000
+
+
+class Deferred(NamedTuple):
+    """Gray-zone match left at its cheap score until comments are fetched"""
+
+    post: Dict
+    representative: Dict
+    cluster_id: int
+    score: float
+
+
+class CascadeScorer:
+    """Rescores gray-zone matches from selftext and top comments"""
+
+    def __init__(
+        self,
+        band: float = 0.1,
+        context_weight: float = 0.5,
+        comment_loader: Optional[CommentLoader] = None,
+        comment_limit: int = 5,
+        cache_size: int = 5000,
+        fetch_timeout: float = 2.0,
+        max_fetches: int = 20,
+    ):
+        self.band = band  # Half-width of the gray zone around the threshold
+        self.context_weight = context_weight  # Share of the context score
+        self.comment_loader = comment_loader  # e.g. RedditClient.fetch_comments
+        self.comment_limit = comment_limit
+        self.cache_size = cache_size
+        self.fetch_timeout = fetch_timeout  # Seconds prefetch waits per batch
+        self.max_fetches = max_fetches  # Comment fetches per prefetch
+        # Load missing comments while scoring; when off, gray-zone posts
+        # without context keep their cheap score and are noted in `deferred`
+        self.fetch_inline = True
+        self.deferred: List[Deferred] = []
+        self._contexts: "OrderedDict[str, str]" = OrderedDict()
+        # Counters: posts seen, posts rescored, decisions changed, deferred
+        # posts whose context never arrived
+        self.checked = 0
+        self.refined = 0
+        self.flipped = 0
+        self.skipped = 0
+
+    def in_gray_zone(self, score: float, threshold: float) -> bool:
+        return abs(score - threshold) <= self.band
+
+    def refine(
+        self, clusterer: "PostClusterer", post: Dict, cluster_id: int, score: float
+    ) -> float:
+        """Score of the best cheap match, rescored if it is in the gray zone"""
+        self.checked += 1
+        threshold = clusterer.similarity_threshold
+        if not self.in_gray_zone(score, threshold):
+            return score
+        representative = clusterer.get_representative_post(cluster_id)
+        if representative is None:
+            return score
+        context, cluster_context = self.context(post), self.context(representative)
+        if context is None or cluster_context is None:
+            self.deferred.append(Deferred(post, representative, cluster_id, score))
+            return score
+
+        refined = self._blend(score, context, cluster_context, threshold)
+        if clusterer.verbose:
+            print(
+                f"   Cluster {cluster_id}: gray zone {score:.3f}, "
+                f"context -> {refined:.3f}"
+            )
+        return refined
+
+    def rescore(self, deferred: Deferred, threshold: float) -> Optional[float]:
+        """Refined score of a deferred match from cached context, if it arrived"""
+        context = self._contexts.get(deferred.post["id"])
+        cluster_context = self._contexts.get(deferred.representative["id"])
+        if context is None or cluster_context is None:
+            self.skipped += 1
+            return None
+        return self._blend(deferred.score, context, cluster_context, threshold)
+
+    def take_deferred(self) -> List[Deferred]:
+        deferred, self.deferred = self.deferred, []
+        return deferred
+
+    def _blend(
+        self, score: float, context: str, cluster_context: str, threshold: float
+    ) -> float:
+        self.refined += 1
+        similarity = context_similarity(context, cluster_context)
+        refined = (1 - self.context_weight) * score + self.context_weight * similarity
+        if (refined > threshold) != (score > threshold):
+            self.flipped += 1
+        return refined
+
+    def context(self, post: Dict) -> Optional[str]:
+        """Title, selftext and top comments of a post, cached by post ID
+
+        None if comments weren't prefetched and fetch_inline is off.
+        """
+        cached = self._contexts.get(post["id"])
+        if cached is not None:
+            self._contexts.move_to_end(post["id"])
+            return cached
+        if self.comment_loader is None:
+            return self._remember(post, [])
+        if not self.fetch_inline:
+            return None
+        return self._remember(post, self.comment_loader(post["id"]))
+
+    def prefetch(self, posts: Iterable[Dict]) -> int:
+        """Fetch comments for up to max_fetches posts at once, returns how many
+
+        Waits at most fetch_timeout; fetches still running then are left to
+        finish in the background and their posts are not rescored.
+        """
+        missing = {}
+        for post in posts:
+            if post["id"] not in self._contexts and len(missing) < self.max_fetches:
+                missing[post["id"]] = post
+        if self.comment_loader is None or not missing:
+            return 0
+
+        pool = ThreadPoolExecutor(max_workers=len(missing))
+        try:
+            futures = {
+                pool.submit(self.comment_loader, post_id): post
+                for post_id, post in missing.items()
+            }
+            done, _ = wait(futures, timeout=self.fetch_timeout)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+        fetched = 0
+        for future in done:
+            if future.exception() is None:
+                self._remember(futures[future], future.result())
+                fetched += 1
+        return fetched
+
+    def _remember(self, post: Dict, comments: List[Dict]) -> str:
+        parts = [post["title"], (post.get("selftext") or "")[:CONTEXT_CHARS]]
+        parts.extend(
+            comment["body"][:CONTEXT_CHARS]
+            for comment in comments[: self.comment_limit]
+        )
+        text = " ".join(part for part in parts if part)
+
+        self._contexts[post["id"]] = text
+        while len(self._contexts) > self.cache_size:
+            self._contexts.popitem(last=False)
+        return text
+
+
+def context_similarity(text1: str, text2: str) -> float:
+    """TF-IDF cosine similarity of two context documents"""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    try:
+        vectors = TfidfVectorizer(stop_words="english").fit_transform([text1, text2])
+    except ValueError:  # Nothing but stop words
+        return 0.0
+    return float(cosine_similarity(vectors[0:1], vectors[1:2])[0][0])
+
+
+def reddit_comment_loader(limit: int = 5) -> CommentLoader:
+    """Comment loader on one RedditClient, created on the first fetch"""
+    clients = []
+
+    def load(post_id: str) -> List[Dict]:
+        if not clients:
+            from .reddit_client import RedditClient
+
+            clients.append(RedditClient())
+        return clients[0].fetch_comments(post_id, limit=limit)
+
+    return load
+
+
+def cascade_from_env() -> Optional[CascadeScorer]:
+    """CascadeScorer configured by CASCADE_BAND, None when it is unset"""
+    settings = get_settings()
+    if not settings.cascade_band:
+        return None
+    comment_loader = None
+    if settings.cascade_comments:
+        comment_loader = reddit_comment_loader()
+    return CascadeScorer(
+        band=settings.cascade_band,
+        context_weight=settings.cascade_context_weight,
+        comment_loader=comment_loader,
+        fetch_timeout=settings.cascade_fetch_timeout,
+        max_fetches=settings.cascade_max_fetches,
+    )
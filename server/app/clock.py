@@ -0,0 +1,51 @@
+from datetime import datetime, timezone
+from typing import Dict
+
+
+class Clock:
+    """Source of the current time, as a UTC timestamp"""
+
+    def now(self) -> float:
+        raise NotImplementedError
+
+    def observe_post(self, post: Dict):
+        """Called with each post before it is clustered"""
+
+    def datetime(self) -> datetime:
+        return datetime.fromtimestamp(self.now(), timezone.utc)
+
+
+class SystemClock(Clock):
+    """Wall clock time, for live ingestion"""
+
+    def now(self) -> float:
+        return datetime.now(timezone.utc).timestamp()
+
+
+class VirtualClock(Clock):
+    """Replay time that follows the posts being clustered
+
+    Each observed post moves the clock to its created_utc, so cluster ages
+    and the 24 hour window are measured in post time however fast a capture
+    is fed through. The clock never moves backwards.
+    """
+
+    def __init__(self, start: float = 0.0):
+        self._now = float(start)
+
+    def now(self) -> float:
+        return self._now
+
+    def advance_to(self, timestamp: float):
+        self._now = max(self._now, float(timestamp))
+
+    def advance(self, seconds: float):
+        self.advance_to(self._now + seconds)
+
+    def observe_post(self, post: Dict):
+        created_utc = post.get("created_utc")
+        if created_utc is not None:
+            self.advance_to(created_utc)
+
+
+SYSTEM_CLOCK = SystemClock()
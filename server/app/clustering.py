@@ -1,24 +1,132 @@
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from typing import List, Dict, Tuple, Optional
-import numpy as np
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    FrozenSet,
+    Iterable,
+    List,
+    Dict,
+    Tuple,
+    Optional,
+    Set,
+)
 import re
-import os
-from datetime import datetime, timedelta, timezone
+import sys
+from datetime import timedelta
+
+from .cascade import CascadeScorer, cascade_from_env
+from .clock import SYSTEM_CLOCK, Clock
+from .config import get_settings, override
+from .features import extract_event_features
+from .fingerprints import FingerprintIndex, PostFingerprints, post_fingerprints
+from .gazetteer import LOCATION, Gazetteer, get_gazetteer
+from .records import ClusterRecord
+from .spill import ShelveSpillStore, SpillStore
+from .topics import bump_top_terms, build_top_terms, headline_score, is_topic_term
+
+if TYPE_CHECKING:
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+CLUSTER_MAX_AGE = timedelta(hours=24)
+# Score reported for a same-domain match, which always wins
+DOMAIN_MATCH = float("inf")
+# Sites hosting unrelated content, sharing one says nothing about the story
+SOCIAL_DOMAINS = frozenset(
+    {"twitter.com", "youtube.com", "facebook.com", "instagram.com", "reddit.com"}
+)
+# Score of a title identical to one already in a cluster, after normalizing
+EXACT_TITLE_MATCH = 1.0
+# Most spilled clusters faulted back in to score a single post
+MAX_FAULT_IN = 16
+# Share of the budget freed each time it is exceeded, so victims are sorted
+# once per many new clusters instead of on every one
+SPILL_BATCH = 0.1
+
+
+def low_water(limit: Optional[int]) -> Optional[int]:
+    """Level a budget is spilled down to once exceeded"""
+    return limit and limit - int(limit * SPILL_BATCH)
+
+
+def title_vectorizer() -> "HashingVectorizer":
+    """Title term counter, scikit-learn is only imported here
+
+    Hashing keeps no vocabulary, so one instance is safe to share between
+    clusterers and threads without fitting it to every pair of titles.
+    """
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+    return HashingVectorizer(
+        n_features=2**20,
+        stop_words="english",
+        ngram_range=(1, 2),
+        lowercase=True,
+        alternate_sign=False,
+        norm=None,
+    )
 
 
 class PostClusterer:
     def __init__(
-        self, similarity_threshold: float = 0.25
-    ):  # Threshold that should capture all similar posts
+        self,
+        similarity_threshold: float = 0.25,  # Captures all similar posts
+        verbose: bool = True,
+        post_loader: Optional[Callable[[str], Optional[Dict]]] = None,
+        max_active_clusters: Optional[int] = None,
+        max_active_bytes: Optional[int] = None,
+        spill_store: Optional[SpillStore] = None,
+        gazetteer: Optional[Gazetteer] = None,
+        vectorizer: Optional["HashingVectorizer"] = None,
+        id_allocator: Optional[Callable[[], int]] = None,
+        id_releaser: Optional[Callable[[int], None]] = None,
+        clock: Optional[Clock] = None,
+        cascade: Optional[CascadeScorer] = None,
+    ):
+        settings = get_settings()
         self.similarity_threshold = float(
-            os.getenv("SIMILARITY_THRESHOLD", similarity_threshold)
-        )
-        self.vectorizer = TfidfVectorizer(
-            max_features=1000, stop_words="english", ngram_range=(1, 2), lowercase=True
+            override(settings.similarity_threshold, similarity_threshold)
         )
+        # Cheap stage: candidates under keyword_prefilter overlap are skipped,
+        # matching event features add event_boost to the title score
+        self.keyword_prefilter = 0.2
+        self.event_boost = 0.15
+        # Expensive stage for scores near the threshold, off unless given
+        self.cascade = cascade if cascade is not None else cascade_from_env()
+        self.verbose = verbose  # Print per-cluster debug scores
+        self.post_loader = post_loader  # Fetches full posts by ID from storage
+        self.clock = clock or SYSTEM_CLOCK  # VirtualClock when replaying captures
+        self.gazetteer = gazetteer or get_gazetteer()
+        self._vectorizer = vectorizer  # Built on first use
         self.post_vectors = {}
-        self.active_clusters = {}
+        self._keyword_cache: Tuple[Optional[str], FrozenSet[str]] = (None, frozenset())
+        # Same link, crosspost parent or title -> cluster, checked before scoring
+        self.fingerprints = FingerprintIndex()
+        self._fingerprint_cache: Tuple[Optional[str], Optional[PostFingerprints]]
+        self._fingerprint_cache = (None, None)
+        self.active_clusters: Dict[int, ClusterRecord] = {}
+        # Topic keyword of a representative -> active clusters, for merges
+        self._keyword_index: Dict[str, Set[int]] = {}
+        self.next_cluster_id = 1  # IDs are never reused once handed out
+        self.id_allocator = id_allocator  # Shared ID source, e.g. across partitions
+        self.id_releaser = id_releaser  # Told of each cluster ID that stops existing
+
+        # Memory budget for active_clusters, evicted clusters spill to storage
+        self.max_active_clusters = override(
+            settings.max_active_clusters, max_active_clusters
+        )
+        max_mb = settings.max_cluster_memory_mb
+        self.max_active_bytes = (
+            int(max_mb * 1024 * 1024) if max_mb else max_active_bytes
+        )
+        if spill_store is None and (self.max_active_clusters or self.max_active_bytes):
+            spill_store = ShelveSpillStore(settings.cluster_spill_path)
+        self.spill_store = spill_store
+        self._active_bytes = 0
+
+    @property
+    def vectorizer(self) -> "HashingVectorizer":
+        if self._vectorizer is None:
+            self._vectorizer = title_vectorizer()
+        return self._vectorizer
 
     def preprocess_text(self, title: str, content: str = "") -> str:
         """Clean and prepare text for similarity comparison - TITLE FOCUSED"""
@@ -44,14 +152,14 @@ class PostClusterer:
 
         # Extract and preserve key info: locations, numbers, disaster types
         numbers = re.findall(r"\d+(?:\.\d+)?", text)  # Extract numbers like 7.2
-        locations = re.findall(
-            r"\b(?:japan|tokyo|honshu|osaka|kyoto|sendai|fukushima|hokkaido|okinawa)\b",
-            text.lower(),
-        )  # Common locations
-        disaster_terms = re.findall(
-            r"\b(?:earthquake|tsunami|aftershock|tremor|damage|evacuat(?:e|ion)|warning)\b",
-            text.lower(),
-        )  # Key disaster terms
+        locations = []
+        disaster_terms = []
+        # One gazetteer pass finds places and disaster terms together
+        for match in self.gazetteer.find(text.lower()):
+            if match.kind == LOCATION:
+                locations.append(match.canonical)
+            else:
+                disaster_terms.append(match.canonical)
 
         # Remove Reddit-specific formatting and noise
         text = re.sub(r"\[.*?\]", "", text)  # Remove [brackets]
@@ -95,12 +203,18 @@ class PostClusterer:
 
     def calculate_title_similarity(self, post1: Dict, post2: Dict) -> float:
         """Calculate similarity focusing primarily on titles"""
-        title1 = self.preprocess_text(post1["title"], "")  # Title only
-        title2 = self.preprocess_text(post2["title"], "")  # Title only
+        return self._title_similarity(post1["title"], post2["title"])
+
+    def _title_similarity(self, raw_title1: str, raw_title2: str) -> float:
+        title1 = self.preprocess_text(raw_title1, "")  # Title only
+        title2 = self.preprocess_text(raw_title2, "")  # Title only
+        from sklearn.feature_extraction.text import TfidfTransformer
+        from sklearn.metrics.pairwise import cosine_similarity
 
         try:
-            combined_texts = [title1, title2]
-            vectors = self.vectorizer.fit_transform(combined_texts)
+            counts = self.vectorizer.transform([title1, title2])
+            # Terms only one title uses weigh more, as TF-IDF over the pair
+            vectors = TfidfTransformer().fit_transform(counts)
             similarity = cosine_similarity(vectors[0:1], vectors[1:2])[0][0]
             return similarity
         except:
@@ -108,12 +222,31 @@ class PostClusterer:
 
     def find_similar_cluster(self, post: Dict) -> Optional[int]:
         """Find if post belongs to existing cluster"""
-        if not self.active_clusters:
-            return None
+        cluster_id, similarity = self.best_match(post)
+        if cluster_id is not None and self.cascade is not None:
+            similarity = self.cascade.refine(self, post, cluster_id, similarity)
+        if cluster_id is not None and similarity > self.similarity_threshold:
+            return cluster_id
+        return None
+
+    def best_match(self, post: Dict) -> Tuple[Optional[int], float]:
+        """Best scoring active cluster for a post and its score, unthresholded
+
+        A same-domain or same-link match scores DOMAIN_MATCH, a repeated
+        title EXACT_TITLE_MATCH.
+        """
+        if self._is_empty():
+            return None, 0.0
+
+        # Reposts and crossposts skip scoring when the shortcut clears the bar
+        cluster_id, score = self._fingerprint_match(post)
+        if cluster_id is not None and score > self.similarity_threshold:
+            return cluster_id, score
 
         # Extract features from new post
         post_domain = self.extract_domain(post.get("url", ""))
-        post_text = self.preprocess_text(post["title"], post.get("selftext", ""))
+        post_keywords = self._post_keywords(post)
+        post_features = extract_event_features(post["title"], self.gazetteer)
 
         best_cluster_id = None
         best_similarity = 0
@@ -121,56 +254,42 @@ class PostClusterer:
         debug_info = []
 
         # Check against all active clusters
-        for cluster_id, cluster_data in self.active_clusters.items():
+        for cluster_id, cluster in self._candidates(post_keywords, post_domain):
             # Skip old clusters (older than 24 hours)
-            if self._is_cluster_stale(cluster_data):
+            if self._is_cluster_stale(cluster):
                 continue
 
-            representative_post = cluster_data["representative_post"]
-            rep_text = self.preprocess_text(
-                representative_post["title"], representative_post.get("selftext", "")
-            )
-
             # Quick keyword overlap pre-check - skip unlikely matches
-            keyword_overlap = self._quick_keyword_overlap(post_text, rep_text)
-            if keyword_overlap < 0.2:  # Skip detailed comparison for very low overlap
+            keyword_overlap = self._keyword_set_overlap(post_keywords, cluster.keywords)
+            if keyword_overlap < self.keyword_prefilter:  # Skip unlikely matches
                 debug_info.append(
                     f"Cluster {cluster_id}: {keyword_overlap:.2f} keyword overlap (too low)"
                 )
                 continue
 
             # URL domain matching (high priority) - only for news domains
-            if post_domain and post_domain == cluster_data.get("domain", ""):
+            if post_domain and post_domain == cluster.domain:
                 # Avoid over-clustering social media
-                if post_domain not in [
-                    "twitter.com",
-                    "youtube.com",
-                    "facebook.com",
-                    "instagram.com",
-                    "reddit.com",
-                ]:
+                if post_domain not in SOCIAL_DOMAINS:
                     debug_info.append(
                         f"Cluster {cluster_id}: Same domain {post_domain} -> MATCHED"
                     )
-                    return cluster_id
+                    return cluster_id, DOMAIN_MATCH
 
             # Title-focused similarity matching
-            title_similarity = self.calculate_title_similarity(
-                post, representative_post
-            )
+            title_similarity = self._title_similarity(post["title"], cluster.title)
 
             debug_info.append(
                 f"Cluster {cluster_id}: {title_similarity:.3f} similarity"
             )
 
             # Check for event-specific matches (keywords like earthquake, location, magnitude)
-            event_match = self._check_event_match(
-                post["title"], representative_post["title"]
-            )
+            event_match = post_features.matches(cluster.event_features)
             if event_match:
-                title_similarity += 0.15  # Boost similarity for event matches
+                title_similarity += self.event_boost  # Boost for event matches
                 debug_info.append(
-                    f"  ✓ Event match detected: +0.15 boost -> {title_similarity:.3f}"
+                    f"  ✓ Event match detected: +{self.event_boost:.2f} boost "
+                    f"-> {title_similarity:.3f}"
                 )
 
             if title_similarity > best_similarity:
@@ -178,79 +297,80 @@ class PostClusterer:
                 best_cluster_id = cluster_id
 
         # Print debug info
-        for info in debug_info:
-            print(f"   {info}")
-
-        if best_similarity > self.similarity_threshold:
-            return best_cluster_id
-        else:
-            return None
+        if self.verbose:
+            for info in debug_info:
+                print(f"   {info}")
+
+        return best_cluster_id, best_similarity
+
+    def _is_empty(self) -> bool:
+        return not self.active_clusters and not self.spill_store
+
+    def _post_fingerprints(self, post: Dict) -> PostFingerprints:
+        """Fingerprints of a post, reused between find and add for the same post"""
+        cached_id, cached = self._fingerprint_cache
+        if cached_id == post["id"] and cached is not None:
+            return cached
+        fingerprints = post_fingerprints(post)
+        self._fingerprint_cache = (post["id"], fingerprints)
+        return fingerprints
+
+    def _fingerprint_match(self, post: Dict) -> Tuple[Optional[int], float]:
+        """Live cluster already holding this link or title, and its score"""
+        fingerprints = self._post_fingerprints(post)
+        for candidates, score in (
+            (fingerprints.links, DOMAIN_MATCH),
+            ((fingerprints.title,), EXACT_TITLE_MATCH),
+        ):
+            cluster_id = self.fingerprints.lookup(candidates)
+            if cluster_id is None:
+                continue
+            # Spilled, evicted or stale clusters go through normal scoring
+            cluster = self.active_clusters.get(cluster_id)
+            if cluster is not None and not self._is_cluster_stale(cluster):
+                return cluster_id, score
+        return None, 0.0
+
+    def _candidates(
+        self, keywords: FrozenSet[str], domain: str
+    ) -> Iterable[Tuple[int, ClusterRecord]]:
+        """Clusters a post is scored against"""
+        if self.spill_store:
+            self._fault_in(keywords, domain)
+        return self.active_clusters.items()
 
     def _check_event_match(self, title1: str, title2: str) -> bool:
         """Check if titles refer to the same event based on key elements"""
-        title1_lower = title1.lower()
-        title2_lower = title2.lower()
-
-        # Check for event type match
-        event_types = [
-            "earthquake",
-            "tsunami",
-            "hurricane",
-            "typhoon",
-            "tornado",
-            "flood",
-            "wildfire",
-        ]
-        event_match = False
-        for event in event_types:
-            if event in title1_lower and event in title2_lower:
-                event_match = True
-                break
-
-        if not event_match:
-            return False
-
-        # Extract locations
-        locations = [
-            "japan",
-            "california",
-            "florida",
-            "texas",
-            "china",
-            "india",
-            "europe",
-            "australia",
-        ]
-        location_match = False
-        for location in locations:
-            if location in title1_lower and location in title2_lower:
-                location_match = True
-                break
-
-        # Extract numbers (like magnitude)
-        numbers1 = re.findall(r"\d+(?:\.\d+)?", title1)
-        numbers2 = re.findall(r"\d+(?:\.\d+)?", title2)
-        number_match = False
-
-        for n1 in numbers1:
-            for n2 in numbers2:
-                # Consider numbers within 0.5 as the same (e.g., 7.1 and 7.2 magnitude)
-                try:
-                    if abs(float(n1) - float(n2)) < 0.5:
-                        number_match = True
-                        break
-                except ValueError:
-                    continue
-
-        # Return true if at least event+location or event+number matched
-        return event_match and (location_match or number_match)
+        # Event type plus a shared location or a magnitude within 0.5
+        return extract_event_features(title1, self.gazetteer).matches(
+            extract_event_features(title2, self.gazetteer)
+        )
 
     def _quick_keyword_overlap(self, text1: str, text2: str) -> float:
         """Fast keyword overlap check to filter candidates - LOWERED THRESHOLD"""
-        # Extract key words only (at least 3 characters to avoid noise)
-        words1 = set(word for word in text1.split() if len(word) >= 3)
-        words2 = set(word for word in text2.split() if len(word) >= 3)
+        return self._keyword_set_overlap(
+            self._keyword_set(text1), self._keyword_set(text2)
+        )
 
+    @staticmethod
+    def _keyword_set(text: str) -> FrozenSet[str]:
+        """Key words only (at least 3 characters to avoid noise)"""
+        return frozenset(word for word in text.split() if len(word) >= 3)
+
+    @staticmethod
+    def _compact_keywords(text: str) -> Tuple[str, ...]:
+        """Keyword set stored on clusters, a tuple of interned words
+
+        Interning shares each word across every cluster that uses it, and a
+        tuple is a fraction of the size of a frozenset.
+        """
+        words = PostClusterer._keyword_set(text)
+        return tuple(sys.intern(word) for word in sorted(words))
+
+    def _keyword_set_overlap(
+        self, words1: FrozenSet[str], words2: Iterable[str]
+    ) -> float:
+        """Overlap of a keyword set with another set or unique-word tuple"""
         if not words1 or not words2:
             return 0
 
@@ -267,7 +387,7 @@ class PostClusterer:
 
         # Calculate weighted intersection
         intersection = words1.intersection(words2)
-        union = words1.union(words2)
+        union_size = len(words1) + len(words2) - len(intersection)
 
         # Add bonus for important keywords
         important_matches = len(
@@ -275,35 +395,298 @@ class PostClusterer:
         )
         bonus = min(0.1 * important_matches, 0.2)  # Cap bonus at 0.2
 
-        overlap_score = len(intersection) / len(union) + bonus
+        overlap_score = len(intersection) / union_size + bonus
         return min(overlap_score, 1.0)  # Cap at 1.0
 
-    def _is_cluster_stale(self, cluster_data: Dict) -> bool:
+    def _now(self) -> float:
+        return self.clock.now()
+
+    def _is_cluster_stale(self, cluster: ClusterRecord) -> bool:
         """Check if cluster is too old to accept new posts"""
-        cluster_age = datetime.now(timezone.utc) - cluster_data["created_at"]
-        return cluster_age > timedelta(hours=24)
-
-    def create_cluster(self, post: Dict) -> int:
-        """Create new cluster with post as representative"""
-        cluster_id = len(self.active_clusters) + 1
-
-        domain = self.extract_domain(post.get("url", ""))
-
-        self.active_clusters[cluster_id] = {
-            "representative_post_id": post["id"],
-            "representative_post": post,  # Store full post for similarity comparison
-            "domain": domain,
-            "created_at": datetime.now(timezone.utc),
-            "post_count": 1,
-            "title": post["title"],
-        }
+        cluster_age = self._now() - cluster.created_at
+        return cluster_age > CLUSTER_MAX_AGE.total_seconds()
+
+    def expire_stale_clusters(self) -> List[int]:
+        """Drop clusters that can no longer accept posts, returns their IDs"""
+        expired = [
+            cluster_id
+            for cluster_id, cluster in self.active_clusters.items()
+            if self._is_cluster_stale(cluster)
+        ]
+        for cluster_id in expired:
+            self._deactivate(cluster_id)
+        if self.spill_store:
+            cutoff = self._now() - CLUSTER_MAX_AGE.total_seconds()
+            expired.extend(self.spill_store.expire(cutoff))
+        for cluster_id in expired:
+            self._release(cluster_id)
+        return expired
+
+    def _release(self, cluster_id: int):
+        """Forget a cluster that stopped existing, wherever it was kept"""
+        self.fingerprints.discard(cluster_id)
+        if self.id_releaser is not None:
+            self.id_releaser(cluster_id)
+
+    def _activate(self, record: ClusterRecord):
+        self.active_clusters[record.cluster_id] = record
+        self._active_bytes += record.approx_size()
+        for word in record.keywords:
+            if is_topic_term(word):
+                self._keyword_index.setdefault(word, set()).add(record.cluster_id)
+
+    def _deactivate(self, cluster_id: int) -> ClusterRecord:
+        record = self.active_clusters.pop(cluster_id)
+        self._active_bytes -= record.approx_size()
+        for word in record.keywords:
+            cluster_ids = self._keyword_index.get(word)
+            if cluster_ids is not None:
+                cluster_ids.discard(cluster_id)
+                if not cluster_ids:
+                    del self._keyword_index[word]
+        return record
+
+    def _over_budget(self, spilling: bool = False) -> bool:
+        """Over budget, or while spilling, still above its low-water mark"""
+        max_clusters, max_bytes = self.max_active_clusters, self.max_active_bytes
+        if spilling:
+            max_clusters, max_bytes = low_water(max_clusters), low_water(max_bytes)
+        if max_clusters and len(self.active_clusters) > max_clusters:
+            return True
+        return bool(max_bytes) and self._active_bytes > max_bytes
+
+    def _enforce_budget(self, protect: Optional[int] = None):
+        """Spill least recently matched, then smallest, clusters once over budget
+
+        Spilling goes down to the low-water mark, so the sort is paid once
+        for every SPILL_BATCH share of the budget.
+        """
+        if not self._over_budget():
+            return
+        victims = sorted(
+            (cluster.last_matched_at, cluster.post_count, cluster_id)
+            for cluster_id, cluster in self.active_clusters.items()
+            if cluster_id != protect
+        )
+        for _, _, cluster_id in victims:
+            if not self._over_budget(spilling=True):
+                break
+            self.spill_cluster(cluster_id)
 
+    def spill_cluster(self, cluster_id: int):
+        """Move an active cluster to the spill store, stale ones are dropped"""
+        record = self._deactivate(cluster_id)
+        if self.spill_store is not None and not self._is_cluster_stale(record):
+            self.spill_store.put(record)
+        else:
+            self._release(cluster_id)
+
+    def _fault_in(self, keywords: FrozenSet[str], domain: str):
+        """Bring spilled clusters that could match this post back into memory"""
+        for cluster_id in self.spill_store.candidates(keywords, domain)[:MAX_FAULT_IN]:
+            record = self.spill_store.take(cluster_id)
+            if record is not None and not self._is_cluster_stale(record):
+                self._activate(record)
+            else:
+                self._release(cluster_id)
+
+    def _allocate_cluster_id(self) -> int:
+        if self.id_allocator is not None:
+            return self.id_allocator()
+        cluster_id = self.next_cluster_id
+        self.next_cluster_id += 1
         return cluster_id
 
+    def create_cluster(self, post: Dict, cluster_id: Optional[int] = None) -> int:
+        """Create new cluster with post as representative
+
+        cluster_id is one reserved earlier with _allocate_cluster_id.
+        """
+        if cluster_id is None:
+            cluster_id = self._allocate_cluster_id()
+        self._activate(self._new_record(cluster_id, post))
+        self.fingerprints.add(cluster_id, self._post_fingerprints(post))
+        self._enforce_budget(protect=cluster_id)
+
+        return cluster_id
+
+    def _new_record(self, cluster_id: int, post: Dict) -> ClusterRecord:
+        # Keep only what matching needs, the full post stays in storage
+        return ClusterRecord(
+            cluster_id=cluster_id,
+            representative_post_id=post["id"],
+            title=post["title"],
+            domain=sys.intern(self.extract_domain(post.get("url", ""))),
+            created_at=self._now(),
+            keywords=self._compact_keywords(
+                self.preprocess_text(post["title"], post.get("selftext", ""))
+            ),
+            event_features=extract_event_features(post["title"], self.gazetteer),
+        )
+
+    def _post_keywords(self, post: Dict) -> FrozenSet[str]:
+        """Keyword set of a post, reused between find and add for the same post"""
+        cached_id, cached_keywords = self._keyword_cache
+        if cached_id == post["id"]:
+            return cached_keywords
+        keywords = self._keyword_set(
+            self.preprocess_text(post["title"], post.get("selftext", ""))
+        )
+        self._keyword_cache = (post["id"], keywords)
+        return keywords
+
+    def _take_spilled(self, cluster_id: int):
+        """Bring a spilled cluster back into memory before changing it"""
+        if cluster_id not in self.active_clusters and self.spill_store:
+            record = self.spill_store.take(cluster_id)
+            if record is not None:
+                self._activate(record)
+
     def add_to_cluster(self, cluster_id: int, post: Dict):
         """Add post to existing cluster"""
+        self._take_spilled(cluster_id)
         if cluster_id in self.active_clusters:
-            self.active_clusters[cluster_id]["post_count"] += 1
+            cluster = self.active_clusters[cluster_id]
+            size_before = cluster.approx_size()
+            self._record_post(cluster, post)
+            self._active_bytes += cluster.approx_size() - size_before
+            self.fingerprints.add(cluster_id, self._post_fingerprints(post))
+        self._enforce_budget(protect=cluster_id)
+
+    def _record_post(self, cluster: ClusterRecord, post: Dict):
+        cluster.post_count += 1
+        cluster.last_matched_at = self._now()
+        term_counts = cluster.tracked_counts()
+        top_terms = cluster.top_term_heap()
+        for word in self._post_keywords(post):
+            word = sys.intern(word)
+            count = term_counts.get(word, 0) + 1
+            term_counts[word] = count
+            bump_top_terms(top_terms, word, count)
+        if post["title"] != cluster.headline and headline_score(
+            post["title"], top_terms
+        ) > headline_score(cluster.headline, top_terms):
+            cluster.headline = post["title"]
+
+    def merge_clusters(self, keep_id: int, drop_id: int) -> bool:
+        """Fold cluster drop_id into keep_id, the dropped ID stops existing"""
+        self._take_spilled(keep_id)
+        self._take_spilled(drop_id)
+        keep = self.active_clusters[keep_id]
+        drop = self._deactivate(drop_id)
+        size_before = keep.approx_size()
+        self._absorb(keep, drop)
+        self._active_bytes += keep.approx_size() - size_before
+        self.fingerprints.move(drop_id, keep_id)
+        if self.id_releaser is not None:
+            self.id_releaser(drop_id)
+        return True
+
+    @staticmethod
+    def _absorb(keep: ClusterRecord, drop: ClusterRecord):
+        keep.post_count += drop.post_count
+        keep.last_matched_at = max(keep.last_matched_at, drop.last_matched_at)
+        term_counts = keep.tracked_counts()
+        for word, count in drop.counts().items():
+            term_counts[word] = term_counts.get(word, 0) + count
+        keep.top_terms = build_top_terms(term_counts)
+        if headline_score(drop.headline, keep.top_terms) > headline_score(
+            keep.headline, keep.top_terms
+        ):
+            keep.headline = drop.headline
+
+    def split_cluster(
+        self, cluster_id: int, posts: List[Dict], new_id: Optional[int] = None
+    ) -> int:
+        """Move member posts into a new cluster led by the first of them"""
+        self._take_spilled(cluster_id)
+        source = self.active_clusters[cluster_id]
+        size_before = source.approx_size()
+        self._remove_posts(source, posts)
+        self._active_bytes += source.approx_size() - size_before
+
+        new_id = self.create_cluster(posts[0], new_id)
+        for post in posts[1:]:
+            self.add_to_cluster(new_id, post)
+        # The split-off story keeps the age of the cluster it came from
+        self.active_clusters[new_id].created_at = source.created_at
+        return new_id
+
+    def _remove_posts(self, source: ClusterRecord, posts: List[Dict]):
+        source.post_count -= len(posts)
+        term_counts = source.tracked_counts()
+        for post in posts:
+            for word in self._post_keywords(post):
+                remaining = term_counts.get(word, 0) - 1
+                if remaining > 0:
+                    term_counts[word] = remaining
+                else:
+                    term_counts.pop(word, None)
+        source.top_terms = None
+        if source.headline in {post["title"] for post in posts}:
+            source.headline = source.title
+
+    def unassign_post(self, post: Dict, cluster_id: int, created: bool):
+        """Reverse assign_post for a post whose assignment was never stored
+
+        The post's fingerprints keep pointing at the cluster, so a retry of
+        the same post still lands there.
+        """
+        if created:
+            self.discard_cluster(cluster_id)
+            return
+        self._take_spilled(cluster_id)
+        cluster = self.active_clusters.get(cluster_id)
+        if cluster is not None:
+            size_before = cluster.approx_size()
+            self._remove_posts(cluster, [post])
+            self._active_bytes += cluster.approx_size() - size_before
+
+    def discard_cluster(self, cluster_id: int):
+        """Forget a cluster, active or spilled, without expiring it"""
+        if cluster_id in self.active_clusters:
+            self._deactivate(cluster_id)
+        elif self.spill_store and cluster_id in self.spill_store:
+            self.spill_store.take(cluster_id)
+        self._release(cluster_id)
+
+    def current_clusters(self, cluster_ids: Iterable[int]) -> Dict[int, ClusterRecord]:
+        """Up to date records of those clusters that are active"""
+        active = self.active_clusters
+        return {cid: active[cid] for cid in cluster_ids if cid in active}
+
+    def changed_clusters(self, since: float) -> Dict[int, ClusterRecord]:
+        """Active clusters created or matched at or after a timestamp"""
+        return {
+            cluster_id: cluster
+            for cluster_id, cluster in self.active_clusters.items()
+            if cluster.last_matched_at >= since
+        }
+
+    def merge_candidates(self, keywords: Iterable[str]) -> Dict[int, ClusterRecord]:
+        """Active clusters sharing a topic keyword with these, oldest first"""
+        index = self._keyword_index
+        cluster_ids = set().union(*(index.get(word, ()) for word in keywords))
+        return {
+            cluster_id: self.active_clusters[cluster_id]
+            for cluster_id in sorted(cluster_ids)
+        }
+
+    def get_representative_post(self, cluster_id: int) -> Optional[Dict]:
+        """Fetch the full representative post of a cluster from storage"""
+        cluster = self.active_clusters.get(cluster_id)
+        if cluster is None or self.post_loader is None:
+            return None
+        return self.post_loader(cluster.representative_post_id)
+
+    def assign_post(self, post: Dict) -> Tuple[int, bool]:
+        """Match post to a cluster or start a new one, returns (cluster_id, created)"""
+        self.clock.observe_post(post)
+        cluster_id = self.find_similar_cluster(post)
+        if cluster_id is not None:
+            self.add_to_cluster(cluster_id, post)
+            return cluster_id, False
+        return self.create_cluster(post), True
 
 
 # Test the improved algorithm
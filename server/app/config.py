@@ -0,0 +1,98 @@
+import os
+from functools import lru_cache
+from typing import Dict, Optional
+
+
+def _flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+def _optional(name: str, convert):
+    value = os.getenv(name)
+    return convert(value) if value not in (None, "") else None
+
+
+def _partition_groups(name: str) -> Optional[Dict[str, str]]:
+    """None when unset, {} for a plain flag, else subreddit -> partition pairs"""
+    value = os.getenv(name, "").strip()
+    if value.lower() in ("", "0", "false", "no"):
+        return None
+    if value.lower() in ("1", "true", "yes"):
+        return {}
+    groups = {}
+    for pair in value.split(","):
+        subreddit, _, partition = pair.partition("=")
+        groups[subreddit.strip().lower()] = partition.strip() or subreddit.strip()
+    return groups
+
+
+class Settings:
+    """Settings from the environment and an optional .env file
+
+    Optional numbers are None when unset, so the caller's own default
+    applies.
+    """
+
+    def __init__(self):
+        # Connections
+        self.database_url: str = os.getenv(
+            "DATABASE_URL", "sqlite:///./reddit_clusters.db"
+        )
+        self.redis_url: Optional[str] = os.getenv("REDIS_URL") or None
+        self.reddit_client_id: Optional[str] = os.getenv("REDDIT_CLIENT_ID")
+        self.reddit_client_secret: Optional[str] = os.getenv("REDDIT_CLIENT_SECRET")
+        self.reddit_user_agent: str = os.getenv(
+            "REDDIT_USER_AGENT", "ClusterBot/1.0 by /u/yourusername"
+        )
+        self.reddit_requests_per_minute = float(
+            os.getenv("REDDIT_REQUESTS_PER_MINUTE", "60")
+        )
+
+        # Database pool, ignored for in-memory SQLite
+        self.db_pool_size = int(os.getenv("DB_POOL_SIZE", "5"))
+        self.db_max_overflow = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+        self.db_pool_pre_ping = _flag("DB_POOL_PRE_PING", "true")
+        # Prepared statements kept per connection by the driver
+        self.db_statement_cache_size = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+        # Milliseconds a SQLite connection waits for a lock before failing
+        self.sqlite_busy_timeout_ms = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+        # Clustering
+        self.similarity_threshold = _optional("SIMILARITY_THRESHOLD", float)
+        self.max_active_clusters = _optional("MAX_ACTIVE_CLUSTERS", int)
+        self.max_cluster_memory_mb = _optional("MAX_CLUSTER_MEMORY_MB", float)
+        self.cluster_spill_path: Optional[str] = os.getenv("CLUSTER_SPILL_PATH")
+        self.gazetteer_path: Optional[str] = os.getenv("GAZETTEER_PATH")
+        # Cluster each subreddit on its own, "japan=asia,korea=asia" groups some
+        self.cluster_partitions = _partition_groups("CLUSTER_PARTITIONS")
+        # Seconds between expiry sweeps and between maintenance passes
+        self.cluster_expire_interval = float(os.getenv("CLUSTER_EXPIRE_INTERVAL", "60"))
+        self.cluster_maintenance_interval = float(
+            os.getenv("CLUSTER_MAINTENANCE_INTERVAL", "300")
+        )
+        self.rollup_bucket_seconds = int(os.getenv("ROLLUP_BUCKET_SECONDS", "300"))
+
+        # Cascade scoring, off unless CASCADE_BAND is set
+        self.cascade_band = _optional("CASCADE_BAND", float)
+        self.cascade_comments = _flag("CASCADE_COMMENTS", "false")
+        self.cascade_context_weight = float(os.getenv("CASCADE_CONTEXT_WEIGHT", "0.5"))
+        self.cascade_fetch_timeout = float(os.getenv("CASCADE_FETCH_TIMEOUT", "2.0"))
+        self.cascade_max_fetches = int(os.getenv("CASCADE_MAX_FETCHES", "20"))
+
+
+def override(setting, default):
+    """An optional setting when it is set, else the caller's default"""
+    return default if setting is None else setting
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """Settings read once per process, after loading .env
+
+    Read them through here at the point of use, not at import time, so
+    values set only in .env are seen.
+    """
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    return Settings()
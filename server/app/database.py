@@ -1,11 +1,62 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import sessionmaker
+from .config import get_settings
 from .models import Base
-import os
 
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./reddit_clusters.db")
+DATABASE_URL = get_settings().database_url
 
-engine = create_engine(DATABASE_URL)
+
+def engine_options(url: str) -> dict:
+    """create_engine / create_async_engine arguments for a database URL"""
+    settings = get_settings()
+    parsed = make_url(url)
+    options = {"pool_pre_ping": settings.db_pool_pre_ping}
+    if parsed.get_backend_name() == "sqlite":
+        options["connect_args"] = {
+            "check_same_thread": False,
+            "cached_statements": settings.db_statement_cache_size,
+        }
+        if parsed.database in (None, "", ":memory:"):
+            return options
+    elif parsed.get_driver_name() == "asyncpg":
+        options["connect_args"] = {
+            "statement_cache_size": settings.db_statement_cache_size
+        }
+    # Connection pool, ignored for in-memory SQLite which has a single connection
+    options["pool_size"] = settings.db_pool_size
+    options["max_overflow"] = settings.db_max_overflow
+    return options
+
+
+def apply_sqlite_pragmas(engine: Engine):
+    """Let readers run alongside the writer on SQLite
+
+    WAL keeps readers on the last committed snapshot instead of blocking on
+    the writer, synchronous=NORMAL is durable under WAL with far fewer
+    fsyncs, and busy_timeout makes writers queue for the lock rather than
+    fail with "database is locked".
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    busy_timeout = get_settings().sqlite_busy_timeout_ms
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={busy_timeout}")
+        cursor.close()
+
+
+def make_engine(url: str = DATABASE_URL) -> Engine:
+    engine = create_engine(url, **engine_options(url))
+    apply_sqlite_pragmas(engine)
+    return engine
+
+
+engine = make_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
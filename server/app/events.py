@@ -0,0 +1,148 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+
+CLUSTER_CREATED = "created"
+POST_ADDED = "post_added"
+CLUSTER_EXPIRED = "expired"
+CLUSTER_MERGED = "merged"  # cluster_id was folded into merged_into
+
+
+class ClusterEvent:
+    """One change to a cluster, as delivered to subscribers"""
+
+    __slots__ = (
+        "type",
+        "cluster_id",
+        "post_count",
+        "post_id",
+        "title",
+        "merged_into",
+        "timestamp",
+    )
+
+    def __init__(
+        self,
+        type: str,
+        cluster_id: int,
+        post_count: int = 0,
+        post_id: Optional[str] = None,
+        title: Optional[str] = None,
+        merged_into: Optional[int] = None,
+    ):
+        self.type = type
+        self.cluster_id = cluster_id
+        self.post_count = post_count
+        self.post_id = post_id
+        self.title = title
+        self.merged_into = merged_into
+        self.timestamp = time.time()
+
+    def to_dict(self) -> Dict:
+        return {
+            "type": self.type,
+            "cluster_id": self.cluster_id,
+            "post_count": self.post_count,
+            "post_id": self.post_id,
+            "title": self.title,
+            "merged_into": self.merged_into,
+            "timestamp": self.timestamp,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ClusterEvent":
+        event = cls(
+            data["type"],
+            data["cluster_id"],
+            data["post_count"],
+            data["post_id"],
+            data["title"],
+            data["merged_into"],
+        )
+        event.timestamp = data["timestamp"]
+        return event
+
+
+class Subscription:
+    """Bounded, coalescing event buffer owned by one subscriber
+
+    Pending post_added events for the same cluster collapse into the latest
+    one, so a fast-growing story costs a single slot. When the buffer is full
+    the oldest event is dropped and counted in `dropped`.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_buffer: int = 256):
+        self.loop = loop
+        self.max_buffer = max_buffer
+        self.dropped = 0
+        self._pending: "OrderedDict[tuple, ClusterEvent]" = OrderedDict()
+        self._ready = asyncio.Event()
+
+    def push(self, event: ClusterEvent):
+        """Buffer an event, must run on the subscriber's loop"""
+        key = (event.type, event.cluster_id)
+        if key in self._pending:
+            # Coalesce in place so the cluster keeps its position in line
+            self._pending[key] = event
+        else:
+            if len(self._pending) >= self.max_buffer:
+                self._pending.popitem(last=False)
+                self.dropped += 1
+            self._pending[key] = event
+        self._ready.set()
+
+    async def get(self) -> ClusterEvent:
+        """Wait for the next buffered event"""
+        while not self._pending:
+            self._ready.clear()
+            await self._ready.wait()
+        _, event = self._pending.popitem(last=False)
+        return event
+
+    def __len__(self):
+        return len(self._pending)
+
+
+class ClusterEventBus:
+    """Fan cluster events out to subscribers on any event loop
+
+    `publish` is safe to call from worker threads; each event is handed to
+    the subscriber's own loop.
+    """
+
+    def __init__(self, max_buffer: int = 256):
+        self.max_buffer = max_buffer
+        self._subscribers: Set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, max_buffer: Optional[int] = None) -> Subscription:
+        """Register a subscriber on the running event loop"""
+        subscription = Subscription(
+            asyncio.get_running_loop(), max_buffer or self.max_buffer
+        )
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event: ClusterEvent):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, event)
+            except RuntimeError:
+                # Loop already closed, the subscriber is gone
+                self.unsubscribe(subscription)
+
+    def close(self):
+        """Release what the bus holds, nothing for an in-process bus"""
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""Export posts and clusters to partitioned Parquet for analytics
+
+Rows are streamed from the database in chunks through a server-side
+cursor and written as Arrow record batches, so memory stays bounded by
+--chunk-size whatever the table size. Posts land in
+posts/date=YYYY-MM-DD/subreddit=NAME/ and clusters in
+clusters/date=YYYY-MM-DD/, by Reddit creation and cluster creation date.
+
+A watermark file records the newest row exported. The next run rewrites
+every partition from the watermark's day minus CLUSTER_MAX_AGE onward:
+clusters only change while they are young, so merges, splits and late
+posts inside that window are picked up, and older partitions are left
+alone. Posts without created_utc go to date=unknown on --full runs only.
+
+    python -m app.export exports/          # incremental after the first run
+    python -m app.export exports/ --full   # rewrite everything
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from sqlalchemy import select
+from sqlalchemy.engine import Connection, Engine
+
+from .clustering import CLUSTER_MAX_AGE
+from .models import Cluster, Post
+
+WATERMARK_FILE = "_watermark.json"
+UNKNOWN_DATE = "unknown"
+
+POST_SCHEMA = pa.schema(
+    [
+        ("id", pa.string()),
+        ("title", pa.string()),
+        ("content", pa.string()),
+        ("url", pa.string()),
+        ("author", pa.string()),
+        ("created_utc", pa.timestamp("ms", tz="UTC")),
+        ("score", pa.int64()),
+        ("num_comments", pa.int64()),
+        ("cluster_id", pa.int64()),
+        ("date", pa.string()),
+        ("subreddit", pa.string()),
+    ]
+)
+POST_QUERY_COLUMNS = [
+    Post.id,
+    Post.title,
+    Post.content,
+    Post.url,
+    Post.author,
+    Post.reddit_created_utc,
+    Post.score,
+    Post.num_comments,
+    Post.cluster_id,
+    Post.subreddit,
+]
+
+CLUSTER_SCHEMA = pa.schema(
+    [
+        ("id", pa.int64()),
+        ("title", pa.string()),
+        ("post_count", pa.int64()),
+        ("keywords", pa.string()),
+        ("representative_post_id", pa.string()),
+        ("created_at", pa.timestamp("us", tz="UTC")),
+        ("updated_at", pa.timestamp("us", tz="UTC")),
+        ("date", pa.string()),
+    ]
+)
+CLUSTER_QUERY_COLUMNS = [
+    Cluster.id,
+    Cluster.title,
+    Cluster.post_count,
+    Cluster.keywords,
+    Cluster.representative_post_id,
+    Cluster.created_at,
+    Cluster.updated_at,
+]
+
+
+def read_watermark(out_dir: str) -> Dict[str, float]:
+    """Newest exported timestamp per table, empty before the first export"""
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as watermark:
+        return json.load(watermark)
+
+
+def write_watermark(out_dir: str, marks: Dict[str, float]):
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    with open(path + ".tmp", "w") as watermark:
+        json.dump(marks, watermark)
+    # Replace atomically, a crash never leaves a half-written watermark
+    os.replace(path + ".tmp", path)
+
+
+def rewrite_from(mark: Optional[float]) -> Optional[float]:
+    """Start of the first day to rewrite after a run that ended at mark"""
+    if mark is None:
+        return None
+    start = datetime.fromtimestamp(mark, timezone.utc) - CLUSTER_MAX_AGE
+    return start.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+
+def _stream(connection: Connection, query, chunk_size: int) -> Iterator[List[Tuple]]:
+    """Query results chunk by chunk, from a server-side cursor"""
+    result = connection.execution_options(
+        stream_results=True, yield_per=chunk_size
+    ).execute(query)
+    for rows in result.partitions(chunk_size):
+        yield rows
+
+
+def _utc(values: pa.Array, unit: str) -> pa.Array:
+    """Naive datetimes stored as UTC, tagged as such"""
+    return pc.assume_timezone(values.cast(pa.timestamp(unit)), "UTC")
+
+
+def _dates(timestamps: pa.Array) -> pa.Array:
+    dates = pc.strftime(timestamps, format="%Y-%m-%d")
+    return pc.fill_null(dates, UNKNOWN_DATE)
+
+
+def post_batches(rows_chunks: Iterator[List[Tuple]], stats: Dict) -> Iterator:
+    for rows in rows_chunks:
+        columns = list(zip(*rows))
+        seconds = pa.array(columns[5], pa.float64())
+        created = pc.cast(
+            pc.cast(pc.floor(pc.multiply(seconds, 1000)), pa.int64()),
+            pa.timestamp("ms", tz="UTC"),
+        )
+        newest = pc.max(seconds).as_py()
+        if newest is not None:
+            stats["newest"] = max(stats.get("newest", newest), newest)
+        stats["rows"] = stats.get("rows", 0) + len(rows)
+        yield pa.RecordBatch.from_arrays(
+            [
+                pa.array(columns[0], pa.string()),
+                pa.array(columns[1], pa.string()),
+                pa.array(columns[2], pa.string()),
+                pa.array(columns[3], pa.string()),
+                pa.array(columns[4], pa.string()),
+                created,
+                pa.array(columns[6], pa.int64()),
+                pa.array(columns[7], pa.int64()),
+                pa.array(columns[8], pa.int64()),
+                _dates(created),
+                pa.array(columns[9], pa.string()),
+            ],
+            schema=POST_SCHEMA,
+        )
+
+
+def cluster_batches(rows_chunks: Iterator[List[Tuple]], stats: Dict) -> Iterator:
+    for rows in rows_chunks:
+        columns = list(zip(*rows))
+        created = _utc(pa.array(columns[5]), "us")
+        newest = pc.max(created).as_py()
+        if newest is not None:
+            newest = newest.timestamp()
+            stats["newest"] = max(stats.get("newest", newest), newest)
+        stats["rows"] = stats.get("rows", 0) + len(rows)
+        yield pa.RecordBatch.from_arrays(
+            [
+                pa.array(columns[0], pa.int64()),
+                pa.array(columns[1], pa.string()),
+                pa.array(columns[2], pa.int64()),
+                pa.array(columns[3], pa.string()),
+                pa.array(columns[4], pa.string()),
+                created,
+                _utc(pa.array(columns[6]), "us"),
+                _dates(created),
+            ],
+            schema=CLUSTER_SCHEMA,
+        )
+
+
+def _write(batches: Iterator, schema: pa.Schema, base_dir: str, keys: List[str]):
+    ds.write_dataset(
+        batches,
+        base_dir,
+        schema=schema,
+        format="parquet",
+        partitioning=ds.partitioning(
+            pa.schema([schema.field(key) for key in keys]), flavor="hive"
+        ),
+        basename_template=f"part-{time.time_ns()}-{{i}}.parquet",
+        # Partitions written to are replaced whole, the rest stay as they are
+        existing_data_behavior="delete_matching",
+    )
+
+
+def export(
+    engine: Engine, out_dir: str, chunk_size: int = 100_000, full: bool = False
+) -> Dict[str, int]:
+    """Export posts and clusters into out_dir, returns rows written per table"""
+    os.makedirs(out_dir, exist_ok=True)
+    marks = {} if full else read_watermark(out_dir)
+    post_query = select(*POST_QUERY_COLUMNS).order_by(Post.reddit_created_utc)
+    cluster_query = select(*CLUSTER_QUERY_COLUMNS).order_by(Cluster.created_at)
+
+    since = rewrite_from(marks.get("posts"))
+    if since is not None:
+        post_query = post_query.where(Post.reddit_created_utc >= since)
+    since = rewrite_from(marks.get("clusters"))
+    if since is not None:
+        cluster_query = cluster_query.where(
+            Cluster.created_at
+            >= datetime.fromtimestamp(since, timezone.utc).replace(tzinfo=None)
+        )
+
+    if full:
+        for table in ("posts", "clusters"):
+            shutil.rmtree(os.path.join(out_dir, table), ignore_errors=True)
+
+    post_stats: Dict = {}
+    cluster_stats: Dict = {}
+    with engine.connect() as connection:
+        _write(
+            post_batches(_stream(connection, post_query, chunk_size), post_stats),
+            POST_SCHEMA,
+            os.path.join(out_dir, "posts"),
+            ["date", "subreddit"],
+        )
+        _write(
+            cluster_batches(
+                _stream(connection, cluster_query, chunk_size), cluster_stats
+            ),
+            CLUSTER_SCHEMA,
+            os.path.join(out_dir, "clusters"),
+            ["date"],
+        )
+
+    for table, stats in (("posts", post_stats), ("clusters", cluster_stats)):
+        if "newest" in stats:
+            marks[table] = max(marks.get(table, stats["newest"]), stats["newest"])
+    write_watermark(out_dir, marks)
+    return {
+        "posts": post_stats.get("rows", 0),
+        "clusters": cluster_stats.get("rows", 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export posts and clusters to Parquet")
+    parser.add_argument("output", help="Directory for the Parquet dataset")
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument(
+        "--full", action="store_true", help="Ignore the watermark, rewrite all"
+    )
+    args = parser.parse_args()
+
+    from .database import engine
+
+    started = time.perf_counter()
+    written = export(engine, args.output, args.chunk_size, args.full)
+    print(
+        f"✅ {written['posts']} posts and {written['clusters']} clusters exported "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import re
+from bisect import bisect_right
+from typing import FrozenSet, Optional, Tuple
+
+from .gazetteer import EVENT, LOCATION, Gazetteer, get_gazetteer
+
+# Numbers within this distance count as the same (e.g. 7.1 and 7.2 magnitude)
+NUMBER_TOLERANCE = 0.5
+
+NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+
+
+class EventFeatures:
+    """Event type, location and number features of one title"""
+
+    __slots__ = ("event_types", "locations", "numbers")
+
+    def __init__(
+        self,
+        event_types: FrozenSet[str] = frozenset(),
+        locations: FrozenSet[str] = frozenset(),
+        numbers: Tuple[float, ...] = (),
+    ):
+        self.event_types = event_types
+        self.locations = locations
+        self.numbers = numbers  # Sorted ascending
+
+    def matches(self, other: "EventFeatures") -> bool:
+        """Same event type plus a shared location or a close number"""
+        if self.event_types.isdisjoint(other.event_types):
+            return False
+        if not self.locations.isdisjoint(other.locations):
+            return True
+        return _numbers_close(self.numbers, other.numbers)
+
+
+# Shared by every title without an event type, which can never match
+NO_EVENT = EventFeatures()
+
+
+def extract_event_features(
+    title: str, gazetteer: Optional[Gazetteer] = None
+) -> EventFeatures:
+    """Extract event features once so matching is set and bisect work only"""
+    matches = (gazetteer or get_gazetteer()).find(title.lower())
+    event_types = frozenset(m.canonical for m in matches if m.kind == EVENT)
+    if not event_types:
+        return NO_EVENT
+    return EventFeatures(
+        event_types=event_types,
+        locations=frozenset(m.canonical for m in matches if m.kind == LOCATION),
+        numbers=tuple(sorted(float(n) for n in NUMBER_PATTERN.findall(title))),
+    )
+
+
+def _numbers_close(numbers1: Tuple[float, ...], numbers2: Tuple[float, ...]) -> bool:
+    if len(numbers1) > len(numbers2):
+        numbers1, numbers2 = numbers2, numbers1
+    for number in numbers1:
+        # First candidate strictly above the lower edge of the window
+        i = bisect_right(numbers2, number - NUMBER_TOLERANCE)
+        if i < len(numbers2) and numbers2[i] < number + NUMBER_TOLERANCE:
+            return True
+    return False
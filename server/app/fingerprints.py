@@ -0,0 +1,111 @@
+"""Exact-duplicate detection by content hashes
+
+Reposts and crossposts carry the same link, the same crosspost parent or a
+title that only differs in case, punctuation or a [tag]. Hashing those
+into fingerprints lets the clusterer send them straight to the cluster
+that already holds them, with one dictionary lookup instead of scoring.
+"""
+
+import hashlib
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+# Shorter normalized titles ("Update", "Live thread") are too generic to trust
+MIN_TITLE_WORDS = 4
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = frozenset({"fbclid", "gclid", "ref", "ref_src", "share", "si"})
+
+_TAG = re.compile(r"\[[^\]]*\]")
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+class PostFingerprints(NamedTuple):
+    links: Tuple[bytes, ...]  # Canonical URL, own and crosspost parent fullnames
+    title: Optional[bytes]
+
+
+def _digest(kind: str, value: str) -> bytes:
+    return hashlib.blake2b(f"{kind}:{value}".encode(), digest_size=8).digest()
+
+
+def normalize_title(title: str) -> str:
+    """Lowercase words of a title without [tags] or punctuation"""
+    return " ".join(_NON_WORD.sub(" ", _TAG.sub(" ", title.lower())).split())
+
+
+def canonical_url(url: str) -> Optional[str]:
+    """Host, path and meaningful query of a link, None if there is none"""
+    if not url:
+        return None
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if not host:
+        return None
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query)
+        if key not in TRACKING_PARAMS and not key.startswith("utm_")
+    )
+    path = parts.path.rstrip("/")
+    return f"{host}{path}?{urlencode(query)}" if query else f"{host}{path}"
+
+
+def post_fingerprints(post: Dict) -> PostFingerprints:
+    links = [_digest("post", f"t3_{post['id']}")]
+    parent = post.get("crosspost_parent")
+    if parent:
+        links.append(_digest("post", parent))
+    url = canonical_url(post.get("url") or "")
+    if url:
+        links.append(_digest("url", url))
+
+    title = normalize_title(post["title"])
+    if len(title.split()) < MIN_TITLE_WORDS:
+        return PostFingerprints(tuple(links), None)
+    return PostFingerprints(tuple(links), _digest("title", title))
+
+
+class FingerprintIndex:
+    """Fingerprint -> cluster ID, entries live as long as their cluster"""
+
+    def __init__(self):
+        self._clusters: Dict[bytes, int] = {}
+        self._by_cluster: Dict[int, List[bytes]] = {}
+
+    def lookup(self, fingerprints: Iterable[Optional[bytes]]) -> Optional[int]:
+        """Cluster of the first known fingerprint"""
+        for fingerprint in fingerprints:
+            cluster_id = self._clusters.get(fingerprint)
+            if cluster_id is not None:
+                return cluster_id
+        return None
+
+    def add(self, cluster_id: int, fingerprints: PostFingerprints):
+        """Point a post's fingerprints at its cluster, the latest post wins"""
+        owned = self._by_cluster.setdefault(cluster_id, [])
+        for fingerprint in (*fingerprints.links, fingerprints.title):
+            if fingerprint is not None:
+                if self._clusters.get(fingerprint) != cluster_id:
+                    owned.append(fingerprint)
+                self._clusters[fingerprint] = cluster_id
+
+    def discard(self, cluster_id: int):
+        """Forget an expired cluster's fingerprints"""
+        for fingerprint in self._by_cluster.pop(cluster_id, ()):
+            if self._clusters.get(fingerprint) == cluster_id:
+                del self._clusters[fingerprint]
+
+    def move(self, from_id: int, to_id: int):
+        """Repoint a merged cluster's fingerprints at the surviving cluster"""
+        owned = self._by_cluster.setdefault(to_id, [])
+        for fingerprint in self._by_cluster.pop(from_id, ()):
+            if self._clusters.get(fingerprint) == from_id:
+                self._clusters[fingerprint] = to_id
+                owned.append(fingerprint)
+
+    def __len__(self) -> int:
+        return len(self._clusters)
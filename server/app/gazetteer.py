@@ -0,0 +1,158 @@
+import os
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .config import get_settings
+
+LOCATION = "location"
+EVENT = "event"  # Disaster types used for event matching
+TERM = "term"  # Other disaster vocabulary boosted by preprocess_text
+
+DEFAULT_GAZETTEER_PATH = os.path.join(
+    os.path.dirname(__file__), "data", "gazetteer.tsv"
+)
+
+
+class GazetteerMatch:
+    __slots__ = ("start", "end", "canonical", "kind")
+
+    def __init__(self, start: int, end: int, canonical: str, kind: str):
+        self.start = start
+        self.end = end  # Exclusive
+        self.canonical = canonical
+        self.kind = kind
+
+    def __repr__(self):
+        return (
+            f"GazetteerMatch({self.canonical!r}, {self.kind}, {self.start}:{self.end})"
+        )
+
+
+class Gazetteer:
+    """Aho-Corasick automaton over place names, aliases and event terms
+
+    Every term is found in one left-to-right pass over the text, so the cost
+    per title depends on its length, not on how many entries are loaded.
+    Matches must sit on word boundaries; overlapping matches resolve to the
+    leftmost longest one ("new york city" wins over "york").
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, str, str]] = ()):
+        # Node 0 is the root. Outputs are (length, canonical, kind)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[int, str, str]]] = [[]]
+        self._built = False
+        self.size = 0
+        for term, canonical, kind in entries:
+            self.add(term, canonical, kind)
+
+    def add(self, term: str, canonical: str, kind: str):
+        """Register a surface form for a canonical name"""
+        term = term.strip().lower()
+        if not term:
+            return
+        node = 0
+        for char in term:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+        self._output[node].append((len(term), canonical, kind))
+        self.size += 1
+        self._built = False
+
+    def build(self):
+        """Compute failure links, breadth first from the root"""
+        queue = deque()
+        for child in self._goto[0].values():
+            self._fail[child] = 0
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                # Inherit matches that end at the same position
+                self._output[child] = (
+                    self._output[child] + self._output[self._fail[child]]
+                )
+        self._built = True
+
+    def find(self, text: str) -> List[GazetteerMatch]:
+        """All non-overlapping whole-word matches in lowercased text"""
+        if not self._built:
+            self.build()
+        goto, fail, output = self._goto, self._fail, self._output
+        candidates = []
+        node = 0
+        for i, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                end = i + 1
+                if end < len(text) and text[end].isalnum():
+                    continue
+                for length, canonical, kind in output[node]:
+                    start = end - length
+                    if start > 0 and text[start - 1].isalnum():
+                        continue
+                    candidates.append((start, -length, canonical, kind))
+
+        matches = []
+        covered = 0
+        for start, neg_length, canonical, kind in sorted(candidates):
+            if start >= covered:
+                matches.append(
+                    GazetteerMatch(start, start - neg_length, canonical, kind)
+                )
+                covered = start - neg_length
+        return matches
+
+    def extract(self, text: str, kind: Optional[str] = None) -> List[str]:
+        """Canonical names found in text, in order, duplicates kept"""
+        return [
+            match.canonical
+            for match in self.find(text.lower())
+            if kind is None or match.kind == kind
+        ]
+
+    @classmethod
+    def load(cls, path: str) -> "Gazetteer":
+        """Read `kind<TAB>canonical<TAB>alias|alias` lines, # starts a comment"""
+        gazetteer = cls()
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if not line or line.startswith("#"):
+                    continue
+                fields = line.split("\t")
+                kind, canonical = fields[0], fields[1].lower()
+                gazetteer.add(canonical, canonical, kind)
+                if len(fields) > 2 and fields[2]:
+                    for alias in fields[2].split("|"):
+                        gazetteer.add(alias, canonical, kind)
+        gazetteer.build()
+        return gazetteer
+
+
+_default_gazetteer: Optional[Gazetteer] = None
+
+
+def get_gazetteer() -> Gazetteer:
+    """Process-wide gazetteer from GAZETTEER_PATH or the bundled list"""
+    global _default_gazetteer
+    if _default_gazetteer is None:
+        _default_gazetteer = Gazetteer.load(
+            get_settings().gazetteer_path or DEFAULT_GAZETTEER_PATH
+        )
+    return _default_gazetteer
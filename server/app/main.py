@@ -0,0 +1,250 @@
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager, suppress
+from typing import Callable, List, Optional
+
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.websockets import WebSocketDisconnect
+
+from .config import get_settings
+from .schemas import (
+    BatchIn,
+    BatchOut,
+    ClusterAssignment,
+    ClusterDetailOut,
+    ClusterOut,
+    PostIn,
+    TrendingClusterOut,
+)
+from .service import ClusterService
+
+logger = logging.getLogger(__name__)
+
+# Seconds of silence before an SSE keep-alive comment is sent
+SSE_KEEPALIVE = 15.0
+
+
+def _cluster_state():
+    """Clusterer and event bus the settings ask for, None for the defaults
+
+    With REDIS_URL both live in Redis, so several workers can run and a
+    stream client connected to any of them sees every worker's events.
+    Otherwise CLUSTER_PARTITIONS picks a PartitionedClusterer.
+    """
+    settings = get_settings()
+    if settings.redis_url:
+        from .redis_state import RedisClusterer, RedisClusterState, RedisEventBus
+
+        state = RedisClusterState.from_url(settings.redis_url)
+        return RedisClusterer(state, verbose=False), RedisEventBus(state)
+    if settings.cluster_partitions is not None:
+        from .partitioned import PartitionedClusterer
+
+        clusterer = PartitionedClusterer(
+            groups=settings.cluster_partitions, verbose=False
+        )
+        return clusterer, None
+    return None, None
+
+
+def create_app(service: Optional[ClusterService] = None) -> FastAPI:
+    """Build the API around one warm ClusterService
+
+    Pass a service to share a preconfigured clusterer or test database,
+    otherwise one is created on startup from DATABASE_URL.
+    """
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        if service is None:
+            from .async_database import AsyncSessionLocal, async_engine
+            from .database import SessionLocal, create_tables
+
+            create_tables()
+            clusterer, events = _cluster_state()
+            app.state.service = ClusterService(
+                SessionLocal,
+                clusterer,
+                events,
+                async_session_factory=AsyncSessionLocal,
+            )
+        else:
+            app.state.service = service
+
+        service_ = app.state.service
+        settings = get_settings()
+        tasks = [
+            # Retires stale clusters and emits "expired" events
+            asyncio.create_task(
+                run_periodically(
+                    settings.cluster_expire_interval, service_.expire_clusters
+                )
+            ),
+            asyncio.create_task(
+                run_periodically(
+                    settings.cluster_maintenance_interval, service_.run_maintenance
+                )
+            ),
+        ]
+        yield
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+        if service is None:
+            service_.events.close()
+            await async_engine.dispose()
+
+    app = FastAPI(title="ClusterBot", lifespan=lifespan)
+
+    def get_service(request: Request) -> ClusterService:
+        return request.app.state.service
+
+    @app.get("/health")
+    async def health(request: Request):
+        return {
+            "status": "ok",
+            "active_clusters": len(get_service(request).clusterer.active_clusters),
+        }
+
+    @app.post("/cluster", response_model=ClusterAssignment)
+    async def cluster_post(post: PostIn, request: Request):
+        # Scoring is CPU bound, keep it off the event loop
+        cluster_id, created = await run_in_threadpool(
+            get_service(request).cluster_post, post.model_dump()
+        )
+        return ClusterAssignment(
+            post_id=post.id, cluster_id=cluster_id, created=created
+        )
+
+    @app.post("/cluster/batch", response_model=BatchOut)
+    async def cluster_batch(batch: BatchIn, request: Request):
+        posts = [post.model_dump() for post in batch.posts]
+        results = await run_in_threadpool(get_service(request).cluster_batch, posts)
+        return BatchOut(
+            assignments=[
+                ClusterAssignment(post_id=post["id"], cluster_id=cid, created=created)
+                for post, (cid, created) in zip(posts, results)
+            ]
+        )
+
+    @app.get("/clusters", response_model=List[ClusterOut])
+    async def list_clusters(
+        request: Request,
+        limit: int = Query(50, ge=1, le=500),
+        offset: int = Query(0, ge=0),
+    ):
+        return await get_service(request).list_clusters_async(limit, offset)
+
+    @app.get("/clusters/trending", response_model=List[TrendingClusterOut])
+    async def trending_clusters(
+        request: Request,
+        hours: float = Query(1.0, gt=0, le=24 * 7),
+        subreddit: Optional[str] = None,
+        limit: int = Query(20, ge=1, le=500),
+    ):
+        return await get_service(request).trending_clusters_async(
+            hours, subreddit, limit
+        )
+
+    @app.get("/clusters/{cluster_id}", response_model=ClusterDetailOut)
+    async def get_cluster(cluster_id: int, request: Request):
+        cluster = await get_service(request).get_cluster_async(cluster_id)
+        if cluster is None:
+            raise HTTPException(status_code=404, detail="Cluster not found")
+        return cluster
+
+    @app.get("/events")
+    async def cluster_events(request: Request):
+        """Server-Sent Events stream of cluster changes"""
+        bus = get_service(request).events
+        subscription = bus.subscribe()
+
+        async def wait_for_disconnect():
+            while (await request.receive())["type"] != "http.disconnect":
+                pass
+
+        async def stream():
+            # Raced against the next event, so an idle client that went
+            # away is noticed without waiting for the next keep-alive
+            disconnected = asyncio.ensure_future(wait_for_disconnect())
+            next_event = None
+            try:
+                while True:
+                    if next_event is None:
+                        next_event = asyncio.ensure_future(subscription.get())
+                    done, _ = await asyncio.wait(
+                        (next_event, disconnected),
+                        timeout=SSE_KEEPALIVE,
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+                    if disconnected in done:
+                        break
+                    if next_event not in done:
+                        yield ": keep-alive\n\n"
+                        continue
+                    event, next_event = next_event.result(), None
+                    payload = json.dumps(event.to_dict())
+                    yield f"event: {event.type}\ndata: {payload}\n\n"
+            finally:
+                bus.unsubscribe(subscription)
+                for task in (next_event, disconnected):
+                    if task is not None:
+                        task.cancel()
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.websocket("/ws/clusters")
+    async def cluster_events_ws(websocket: WebSocket):
+        """WebSocket stream of cluster changes, one JSON object per event"""
+        await websocket.accept()
+        bus = websocket.app.state.service.events
+        subscription = bus.subscribe()
+
+        async def send_events():
+            while True:
+                event = await subscription.get()
+                await websocket.send_json(event.to_dict())
+
+        async def wait_for_disconnect():
+            # Clients only listen, whatever else they send is ignored
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+
+        # Whichever ends first ends the connection, so an idle client that
+        # went away is noticed without waiting for the next event
+        tasks = [
+            asyncio.create_task(send_events()),
+            asyncio.create_task(wait_for_disconnect()),
+        ]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                with suppress(WebSocketDisconnect):
+                    task.result()
+        finally:
+            bus.unsubscribe(subscription)
+            for task in tasks:
+                task.cancel()
+            for task in tasks:
+                with suppress(asyncio.CancelledError, WebSocketDisconnect):
+                    await task
+
+    return app
+
+
+async def run_periodically(interval: float, job: Callable):
+    """Run a blocking service job every interval seconds in the threadpool"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(job)
+        except Exception:
+            logger.exception("Background job %s failed", job.__name__)
+
+
+app = create_app()
@@ -0,0 +1,325 @@
+import math
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from .clustering import PostClusterer
+from .partitioned import PartitionedClusterer
+from .records import ClusterRecord
+from .topics import is_topic_term
+
+
+class MaintenanceReport:
+    def __init__(self):
+        self.merged: Dict[int, int] = {}  # Dropped cluster ID -> surviving ID
+        # New cluster ID -> (source cluster ID, moved post IDs)
+        self.split: Dict[int, Tuple[int, List[str]]] = {}
+        self.moved: Dict[int, List[Dict]] = {}  # New cluster ID -> moved posts
+        # Maintainer state to keep once the report is applied
+        self.started = float("-inf")
+        self.checked: Dict[int, int] = {}
+        self.parts: List[Tuple["ClusterMaintainer", "MaintenanceReport"]] = []
+
+    def __bool__(self):
+        return bool(self.merged or self.split)
+
+
+class ClusterMaintainer:
+    """Periodic merge and split pass over the active clusters
+
+    Clusters are anchored to their first post, so one story can grow into
+    several parallel clusters, and a cluster can drift into covering two
+    stories. Each pass looks only at clusters created or matched since the
+    previous pass:
+
+    - merge: a changed cluster whose keyword centroid is close to another
+      active cluster is folded into the larger of the two
+    - split: members of a changed cluster whose keywords barely overlap the
+      representative post move out, one new cluster per group of similar
+      ones. Members come from storage, for the clusters split_candidates()
+      names
+
+    plan() decides without touching the clusterer, so the outcome can be
+    stored before apply() carries it out. run() does both.
+    """
+
+    def __init__(
+        self,
+        clusterer: PostClusterer,
+        merge_threshold: float = 0.6,
+        split_threshold: float = 0.1,
+        min_split_size: int = 4,
+        min_split_group: int = 2,
+    ):
+        self.clusterer = clusterer
+        self.merge_threshold = merge_threshold
+        self.split_threshold = split_threshold
+        self.min_split_size = min_split_size
+        self.min_split_group = min_split_group
+        self.last_pass = float("-inf")
+        # Post count of each cluster when its members were last checked
+        self._checked: Dict[int, int] = {}
+
+    def _changed(self) -> Dict[int, ClusterRecord]:
+        return self.clusterer.changed_clusters(self.last_pass)
+
+    def split_candidates(self) -> List[int]:
+        """Clusters whose members the next pass checks for a split"""
+        return [
+            cluster_id
+            for cluster_id, cluster in self._changed().items()
+            if cluster.post_count >= self.min_split_size
+            and self._checked.get(cluster_id) != cluster.post_count
+        ]
+
+    def run(self, members: Optional[Dict[int, List[Dict]]] = None) -> MaintenanceReport:
+        report = self.plan(members)
+        self.apply(report)
+        return report
+
+    def plan(
+        self, members: Optional[Dict[int, List[Dict]]] = None
+    ) -> MaintenanceReport:
+        """Merges and splits due, without changing any cluster
+
+        members maps split candidates to their stored posts, clusters left
+        out are not checked for a split this pass. Only the IDs of new
+        clusters are reserved.
+        """
+        report = MaintenanceReport()
+        report.started = self.clusterer._now()
+        changed = self._changed()
+        pending = _PendingMerges(dict(changed))
+        for cluster_id in changed:
+            if cluster_id not in pending.gone:
+                self._merge_pass(cluster_id, report, pending)
+        for cluster_id in changed:
+            if cluster_id not in pending.gone:
+                self._split_pass(cluster_id, members or {}, report, pending)
+        return report
+
+    def apply(self, report: MaintenanceReport):
+        """Carry out a planned pass
+
+        Merges and splits of clusters that are gone by then, expired or
+        merged by another worker sharing the state, leave the report.
+        """
+        for drop_id, keep_id in list(report.merged.items()):
+            if not self.clusterer.merge_clusters(keep_id, drop_id):
+                del report.merged[drop_id]
+        for new_id, (source_id, _) in list(report.split.items()):
+            moved = report.moved[new_id]
+            if self.clusterer.split_cluster(source_id, moved, new_id) is None:
+                del report.split[new_id]
+
+        self.last_pass = report.started
+        self._checked.update(report.checked)
+        active = self.clusterer.active_clusters
+        self._checked = {
+            cid: count for cid, count in self._checked.items() if cid in active
+        }
+
+    def _merge_pass(
+        self, cluster_id: int, report: MaintenanceReport, pending: "_PendingMerges"
+    ):
+        keywords = frozenset(
+            word
+            for word in pending.clusters[cluster_id].keywords
+            if is_topic_term(word)
+        )
+        if not keywords:
+            return
+        counts = pending.counts(cluster_id)
+        best_id, best_score = None, self.merge_threshold
+        candidates = self.clusterer.merge_candidates(keywords)
+        for other_id, other in candidates.items():
+            if (
+                other_id == cluster_id
+                or other_id in pending.gone
+                or keywords.isdisjoint(other.keywords)
+            ):
+                continue
+            pending.clusters.setdefault(other_id, other)
+            score = centroid_similarity(counts, pending.counts(other_id))
+            if score >= best_score:
+                best_id, best_score = other_id, score
+        if best_id is None:
+            return
+
+        # The bigger (then older) cluster survives so fewer posts move
+        if pending.rank(best_id) > pending.rank(cluster_id):
+            keep_id, drop_id = best_id, cluster_id
+        else:
+            keep_id, drop_id = cluster_id, best_id
+        pending.merge(keep_id, drop_id)
+
+        # Earlier merges into the dropped cluster now point at the survivor
+        for dropped, kept in report.merged.items():
+            if kept == drop_id:
+                report.merged[dropped] = keep_id
+        report.merged[drop_id] = keep_id
+
+    def _split_pass(
+        self,
+        cluster_id: int,
+        members: Dict[int, List[Dict]],
+        report: MaintenanceReport,
+        pending: "_PendingMerges",
+    ):
+        if cluster_id not in members:
+            return
+        cluster = pending.clusters[cluster_id]
+        posts = [
+            post
+            for member_of in (cluster_id, *pending.absorbed.get(cluster_id, ()))
+            for post in members.get(member_of, ())
+        ]
+
+        outliers = []
+        for post in posts:
+            if post["id"] == cluster.representative_post_id:
+                continue
+            keywords = self.clusterer._keyword_set(
+                self.clusterer.preprocess_text(post["title"], post.get("selftext", ""))
+            )
+            overlap = self.clusterer._keyword_set_overlap(keywords, cluster.keywords)
+            if overlap < self.split_threshold:
+                outliers.append((post, keywords))
+
+        report.checked[cluster_id] = len(posts)
+        if len(outliers) < self.min_split_group:
+            # Too few to split yet, looked at again once more posts arrive
+            return
+        report.checked[cluster_id] -= len(outliers)
+        for group in self._group(outliers):
+            new_id = self.clusterer._allocate_cluster_id()
+            report.split[new_id] = (cluster_id, [post["id"] for post in group])
+            report.moved[new_id] = group
+
+    def _group(self, outliers: List[Tuple[Dict, FrozenSet[str]]]) -> List[List[Dict]]:
+        """Outliers grouped with those similar to them, in order of arrival"""
+        groups: List[Tuple[List[Dict], Dict[str, int]]] = []
+        for post, keywords in outliers:
+            counts = dict.fromkeys(keywords, 1)
+            for posts, centroid in groups:
+                if centroid_similarity(counts, centroid) >= self.merge_threshold:
+                    posts.append(post)
+                    for word in keywords:
+                        centroid[word] = centroid.get(word, 0) + 1
+                    break
+            else:
+                groups.append(([post], counts))
+        return [posts for posts, _ in groups]
+
+
+class _PendingMerges:
+    """Topic keyword counts and sizes as they stand once planned merges are done
+
+    clusters holds the records a pass has looked at so far. Stop words are
+    left out of the counts, so shared filler doesn't make clusters look
+    alike.
+    """
+
+    def __init__(self, clusters: Dict[int, ClusterRecord]):
+        self.clusters = clusters
+        self.gone: Set[int] = set()
+        self.absorbed: Dict[int, List[int]] = {}  # Kept ID -> IDs folded in
+        self._counts: Dict[int, Dict[str, int]] = {}
+        self._sizes: Dict[int, int] = {}
+
+    def counts(self, cluster_id: int) -> Dict[str, int]:
+        counts = self._counts.get(cluster_id)
+        if counts is None:
+            counts = {
+                word: count
+                for word, count in self.clusters[cluster_id].counts().items()
+                if is_topic_term(word)
+            }
+            self._counts[cluster_id] = counts
+        return counts
+
+    def rank(self, cluster_id: int) -> Tuple[int, float]:
+        cluster = self.clusters[cluster_id]
+        return self._sizes.get(cluster_id, cluster.post_count), -cluster.created_at
+
+    def merge(self, keep_id: int, drop_id: int):
+        counts = dict(self.counts(keep_id))
+        for word, count in self.counts(drop_id).items():
+            counts[word] = counts.get(word, 0) + count
+        self._counts[keep_id] = counts
+        self._sizes[keep_id] = self.rank(keep_id)[0] + self.rank(drop_id)[0]
+        self.absorbed[keep_id] = [
+            *self.absorbed.get(keep_id, ()),
+            drop_id,
+            *self.absorbed.pop(drop_id, ()),
+        ]
+        self.gone.add(drop_id)
+
+
+class PartitionedMaintainer:
+    """Runs a ClusterMaintainer per partition of a PartitionedClusterer
+
+    Clusters only merge with clusters of the same partition.
+    """
+
+    def __init__(self, clusterer: PartitionedClusterer, **options):
+        self.clusterer = clusterer
+        self.options = options
+        self.maintainers: Dict[str, ClusterMaintainer] = {}
+
+    def _maintainers(self) -> List[ClusterMaintainer]:
+        for name, partition in list(self.clusterer.partitions.items()):
+            if name not in self.maintainers:
+                self.maintainers[name] = ClusterMaintainer(partition, **self.options)
+        return list(self.maintainers.values())
+
+    def split_candidates(self) -> List[int]:
+        return [
+            cluster_id
+            for maintainer in self._maintainers()
+            for cluster_id in maintainer.split_candidates()
+        ]
+
+    def run(self, members: Optional[Dict[int, List[Dict]]] = None) -> MaintenanceReport:
+        report = self.plan(members)
+        self.apply(report)
+        return report
+
+    def plan(
+        self, members: Optional[Dict[int, List[Dict]]] = None
+    ) -> MaintenanceReport:
+        report = MaintenanceReport()
+        for maintainer in self._maintainers():
+            partial = maintainer.plan(members)
+            report.merged.update(partial.merged)
+            report.split.update(partial.split)
+            report.parts.append((maintainer, partial))
+        return report
+
+    def apply(self, report: MaintenanceReport):
+        report.merged.clear()
+        report.split.clear()
+        for maintainer, partial in report.parts:
+            maintainer.apply(partial)
+            report.merged.update(partial.merged)
+            report.split.update(partial.split)
+        # Splits add clusters without checking the shared budget
+        self.clusterer._enforce_budget()
+
+
+def maintainer_for(clusterer, **options):
+    """Maintainer matching the kind of clusterer"""
+    if isinstance(clusterer, PartitionedClusterer):
+        return PartitionedMaintainer(clusterer, **options)
+    return ClusterMaintainer(clusterer, **options)
+
+
+def centroid_similarity(a: Dict[str, int], b: Dict[str, int]) -> float:
+    """Cosine similarity of two keyword count vectors"""
+    small, large = sorted((a, b), key=len)
+    dot = sum(count * large.get(word, 0) for word, count in small.items())
+    if not dot:
+        return 0.0
+    return dot / (_norm(a) * _norm(b))
+
+
+def _norm(counts: Dict[str, int]) -> float:
+    return math.sqrt(sum(count * count for count in counts.values()))
@@ -7,6 +7,7 @@ from sqlalchemy import (
     Float,
     ForeignKey,
     Boolean,
+    Index,
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -33,7 +34,7 @@ class Post(Base):
     cluster_id = Column(Integer, ForeignKey("clusters.id"))
     processed = Column(Boolean, default=False)
 
-    cluster = relationship("Cluster", back_populates="posts")
+    cluster = relationship("Cluster", back_populates="posts", foreign_keys=[cluster_id])
 
 
 class Cluster(Base):
@@ -47,5 +48,22 @@ class Cluster(Base):
     keywords = Column(Text)  # JSON string of important keywords
     title = Column(String)  # Generated cluster title
 
-    posts = relationship("Post", back_populates="cluster")
+    posts = relationship(
+        "Post", back_populates="cluster", foreign_keys="Post.cluster_id"
+    )
     representative_post = relationship("Post", foreign_keys=[representative_post_id])
+
+
+class ClusterRollup(Base):
+    """Per cluster, subreddit and time bucket totals, kept by the write path"""
+
+    __tablename__ = "cluster_rollups"
+
+    cluster_id = Column(Integer, ForeignKey("clusters.id"), primary_key=True)
+    subreddit = Column(String, primary_key=True)
+    bucket_start = Column(Integer, primary_key=True)  # POSIX seconds
+    post_count = Column(Integer, nullable=False, default=0)
+    total_score = Column(Integer, nullable=False, default=0)
+    total_comments = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (Index("ix_cluster_rollups_bucket", "bucket_start", "subreddit"),)
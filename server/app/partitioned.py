@@ -0,0 +1,259 @@
+from collections import ChainMap
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .cascade import CascadeScorer, cascade_from_env
+from .clock import SYSTEM_CLOCK, Clock
+from .clustering import PostClusterer, low_water, title_vectorizer
+from .config import get_settings, override
+from .gazetteer import Gazetteer, get_gazetteer
+from .records import ClusterRecord
+from .spill import ShelveSpillStore, SpillStore
+
+if TYPE_CHECKING:
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+DEFAULT_PARTITION = ""
+
+
+class PartitionedClusterer:
+    """Independent cluster sets per subreddit or topic group
+
+    A post is only compared with clusters in its own partition, so a post
+    from r/japan never scores against r/technology clusters. `groups` maps
+    subreddits to a shared partition name (subreddits not listed get their
+    own partition), and `cross_match` lists partitions whose clusters are
+    also consulted when a partition has no match of its own:
+
+        PartitionedClusterer(
+            groups={"japan": "asia", "korea": "asia"},
+            cross_match={"asia": ["worldnews"]},
+        )
+
+    Partitions are PostClusterers created on first use. They share one
+    vectorizer, one gazetteer, one cluster ID sequence and one memory budget:
+    when the pool is over budget the least recently matched clusters of any
+    partition spill to that partition's store.
+
+    Exposes the PostClusterer interface ClusterService relies on.
+    """
+
+    def __init__(
+        self,
+        groups: Optional[Dict[str, str]] = None,
+        cross_match: Optional[Dict[str, Iterable[str]]] = None,
+        similarity_threshold: float = 0.25,
+        verbose: bool = False,
+        post_loader: Optional[Callable[[str], Optional[Dict]]] = None,
+        max_active_clusters: Optional[int] = None,
+        max_active_bytes: Optional[int] = None,
+        spill_factory: Optional[Callable[[str], SpillStore]] = None,
+        gazetteer: Optional[Gazetteer] = None,
+        clock: Optional[Clock] = None,
+        cascade: Optional[CascadeScorer] = None,
+    ):
+        self.groups = {
+            subreddit.lower(): name for subreddit, name in (groups or {}).items()
+        }
+        self.cross_match = {
+            name: tuple(linked) for name, linked in (cross_match or {}).items()
+        }
+        settings = get_settings()
+        self.similarity_threshold = float(
+            override(settings.similarity_threshold, similarity_threshold)
+        )
+        self.verbose = verbose
+        self.clock = clock or SYSTEM_CLOCK
+        self.gazetteer = gazetteer or get_gazetteer()
+        self.cascade = cascade if cascade is not None else cascade_from_env()
+        self._vectorizer = None  # Shared by partitions, built on first use
+        self.partitions: Dict[str, PostClusterer] = {}
+        # Read-only view over every partition's clusters
+        self.active_clusters = ChainMap()
+        self.next_cluster_id = 1
+        self._owner: Dict[int, str] = {}  # Cluster ID -> partition name
+        self._post_loader = post_loader
+
+        # Budget for the whole pool, partitions get none of their own
+        self.max_active_clusters = override(
+            settings.max_active_clusters, max_active_clusters
+        )
+        max_mb = settings.max_cluster_memory_mb
+        self.max_active_bytes = (
+            int(max_mb * 1024 * 1024) if max_mb else max_active_bytes
+        )
+        if spill_factory is None and (
+            self.max_active_clusters or self.max_active_bytes
+        ):
+            spill_factory = _shelve_spill_factory(settings.cluster_spill_path)
+        self.spill_factory = spill_factory
+
+    @property
+    def post_loader(self) -> Optional[Callable[[str], Optional[Dict]]]:
+        return self._post_loader
+
+    @post_loader.setter
+    def post_loader(self, loader: Optional[Callable[[str], Optional[Dict]]]):
+        self._post_loader = loader
+        for partition in self.partitions.values():
+            partition.post_loader = loader
+
+    @property
+    def vectorizer(self) -> "HashingVectorizer":
+        if self._vectorizer is None:
+            self._vectorizer = title_vectorizer()
+        return self._vectorizer
+
+    def partition_name(self, post: Dict) -> str:
+        """Partition a post belongs to, from its subreddit"""
+        subreddit = (post.get("subreddit") or DEFAULT_PARTITION).lower()
+        return self.groups.get(subreddit, subreddit)
+
+    def partition(self, name: str) -> PostClusterer:
+        """The clusterer for a partition, created on first use"""
+        clusterer = self.partitions.get(name)
+        if clusterer is None:
+            clusterer = PostClusterer(
+                similarity_threshold=self.similarity_threshold,
+                verbose=self.verbose,
+                post_loader=self._post_loader,
+                spill_store=self.spill_factory(name) if self.spill_factory else None,
+                gazetteer=self.gazetteer,
+                vectorizer=self.vectorizer,
+                id_allocator=lambda: self._allocate_cluster_id(name),
+                id_releaser=self._release_cluster_id,
+                clock=self.clock,
+            )
+            # The pool enforces the budget and runs the cascade, not each partition
+            clusterer.max_active_clusters = None
+            clusterer.max_active_bytes = None
+            clusterer.cascade = None
+            self.partitions[name] = clusterer
+            self.active_clusters.maps.append(clusterer.active_clusters)
+        return clusterer
+
+    def _allocate_cluster_id(self, name: str) -> int:
+        cluster_id = self.next_cluster_id
+        self.next_cluster_id += 1
+        self._owner[cluster_id] = name
+        return cluster_id
+
+    def _release_cluster_id(self, cluster_id: int):
+        self._owner.pop(cluster_id, None)
+
+    def owner(self, cluster_id: int) -> Optional[PostClusterer]:
+        """Partition holding a cluster, active or spilled"""
+        name = self._owner.get(cluster_id)
+        return self.partitions.get(name) if name is not None else None
+
+    def best_match(self, post: Dict) -> Tuple[Optional[int], float]:
+        """Best match in the post's partition, then in its linked partitions"""
+        name = self.partition_name(post)
+        best_id, best_score = self.partition(name).best_match(post)
+        if best_id is not None and best_score > self.similarity_threshold:
+            return best_id, best_score
+        for linked in self.cross_match.get(name, ()):
+            if linked == name or linked not in self.partitions:
+                continue
+            cluster_id, score = self.partitions[linked].best_match(post)
+            if cluster_id is not None and score > best_score:
+                best_id, best_score = cluster_id, score
+        return best_id, best_score
+
+    def find_similar_cluster(self, post: Dict) -> Optional[int]:
+        """Find if post belongs to an existing cluster in reach of its partition"""
+        cluster_id, similarity = self.best_match(post)
+        if cluster_id is not None and self.cascade is not None:
+            similarity = self.cascade.refine(self, post, cluster_id, similarity)
+        if cluster_id is not None and similarity > self.similarity_threshold:
+            return cluster_id
+        return None
+
+    def create_cluster(self, post: Dict) -> int:
+        """Create a cluster in the post's partition"""
+        cluster_id = self.partition(self.partition_name(post)).create_cluster(post)
+        self._enforce_budget(protect=cluster_id)
+        return cluster_id
+
+    def add_to_cluster(self, cluster_id: int, post: Dict):
+        """Add post to a cluster, in whichever partition holds it"""
+        owner = self.owner(cluster_id)
+        if owner is not None:
+            owner.add_to_cluster(cluster_id, post)
+        self._enforce_budget(protect=cluster_id)
+
+    def unassign_post(self, post: Dict, cluster_id: int, created: bool):
+        """Reverse assign_post in whichever partition holds the cluster"""
+        owner = self.owner(cluster_id)
+        if owner is not None:
+            owner.unassign_post(post, cluster_id, created)
+
+    def assign_post(self, post: Dict) -> Tuple[int, bool]:
+        """Match post to a cluster or start a new one, returns (cluster_id, created)"""
+        self.clock.observe_post(post)
+        cluster_id = self.find_similar_cluster(post)
+        if cluster_id is not None:
+            self.add_to_cluster(cluster_id, post)
+            return cluster_id, False
+        return self.create_cluster(post), True
+
+    def current_clusters(self, cluster_ids: Iterable[int]) -> Dict[int, ClusterRecord]:
+        active = self.active_clusters
+        return {cid: active[cid] for cid in cluster_ids if cid in active}
+
+    def get_representative_post(self, cluster_id: int) -> Optional[Dict]:
+        owner = self.owner(cluster_id)
+        return owner.get_representative_post(cluster_id) if owner else None
+
+    def expire_stale_clusters(self) -> List[int]:
+        """Expire stale clusters in every partition, returns their IDs"""
+        expired = []
+        for clusterer in self.partitions.values():
+            expired.extend(clusterer.expire_stale_clusters())
+        return expired
+
+    def _active_count(self) -> int:
+        return sum(len(p.active_clusters) for p in self.partitions.values())
+
+    def _pool_bytes(self) -> int:
+        return sum(p._active_bytes for p in self.partitions.values())
+
+    def _over_budget(self, spilling: bool = False) -> bool:
+        """Pool over budget, or while spilling, still above its low-water mark"""
+        max_clusters, max_bytes = self.max_active_clusters, self.max_active_bytes
+        if spilling:
+            max_clusters, max_bytes = low_water(max_clusters), low_water(max_bytes)
+        if max_clusters and self._active_count() > max_clusters:
+            return True
+        return bool(max_bytes) and self._pool_bytes() > max_bytes
+
+    def _enforce_budget(self, protect: Optional[int] = None):
+        """Spill least recently matched clusters across all partitions
+
+        Like PostClusterer, spills down to the pool's low-water mark so the
+        sort across partitions is paid once per batch, not once per post."""
+        if not self._over_budget():
+            return
+        victims: List[Tuple[float, int, int, PostClusterer]] = sorted(
+            (
+                (cluster.last_matched_at, cluster.post_count, cluster_id, clusterer)
+                for clusterer in self.partitions.values()
+                for cluster_id, cluster in clusterer.active_clusters.items()
+                if cluster_id != protect
+            ),
+            key=lambda victim: victim[:3],
+        )
+        for _, _, cluster_id, clusterer in victims:
+            if not self._over_budget(spilling=True):
+                break
+            clusterer.spill_cluster(cluster_id)
+
+
+def _shelve_spill_factory(base_path: Optional[str]) -> Callable[[str], SpillStore]:
+    """One shelve file per partition, next to each other under base_path"""
+
+    def factory(name: str) -> SpillStore:
+        if base_path is None:
+            return ShelveSpillStore()
+        return ShelveSpillStore(f"{base_path}-{name or 'default'}")
+
+    return factory
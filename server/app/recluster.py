@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""Offline re-clustering of stored posts
+
+The online clusterer assigns greedily in arrival order, so one story can end
+up split across several clusters. This job rebuilds the assignment for a
+time range from scratch:
+
+1. stream posts with a timestamp from the database in chunks
+2. vectorize titles once (hashed TF-IDF, so no vocabulary is held),
+   preprocessing chunks in one process per CPU
+3. build a sparse similarity graph block by block, comparing each block only
+   with posts inside the time window, never forming the dense N x N matrix
+4. take connected components (single-linkage clusters at the threshold)
+5. bulk write new clusters and post cluster_ids
+
+    python -m app.recluster --start 2024-03-01 --end 2024-03-08
+
+Run it while ingestion is paused, or restart the API afterwards so the online
+clusterer resumes numbering after the new cluster IDs.
+"""
+
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+
+from .clustering import PostClusterer
+from .models import Cluster, Post
+from .rollups import rebuild_rollups
+
+DEFAULT_THRESHOLD = 0.3
+DEFAULT_MAX_GAP_HOURS = 24.0
+
+_HASHER = HashingVectorizer(
+    n_features=2**20,
+    ngram_range=(1, 2),
+    stop_words="english",
+    alternate_sign=False,
+    norm=None,
+    dtype=np.float32,
+)
+_worker_clusterer: Optional[PostClusterer] = None
+
+
+class ReclusterResult:
+    def __init__(
+        self,
+        post_ids: List[str],
+        labels: np.ndarray,
+        edges: int,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        timestamps: Optional[np.ndarray] = None,
+    ):
+        self.post_ids = post_ids
+        self.labels = labels
+        self.edges = edges
+        self.timestamps = timestamps  # reddit_created_utc, in post_ids order
+        # Time range the posts were drawn from
+        self.start = start
+        self.end = end
+
+    @property
+    def cluster_count(self) -> int:
+        return int(self.labels.max()) + 1 if len(self.labels) else 0
+
+
+def stream_posts(
+    db: Session,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    chunk_size: int = 10000,
+) -> Iterator[List[Tuple[str, str, float]]]:
+    """Yield (id, title, reddit_created_utc) rows in time order, chunk by chunk
+
+    Posts without a timestamp can't be placed in a time window, so they are
+    left out and keep their cluster.
+    """
+    query = (
+        select(Post.id, Post.title, Post.reddit_created_utc)
+        .where(Post.reddit_created_utc.is_not(None))
+        .order_by(Post.reddit_created_utc, Post.id)
+    )
+    if start is not None:
+        query = query.where(Post.reddit_created_utc >= start)
+    if end is not None:
+        query = query.where(Post.reddit_created_utc < end)
+    result = db.execute(query.execution_options(stream_results=True))
+    for chunk in result.partitions(chunk_size):
+        yield [tuple(row) for row in chunk]
+
+
+def vectorize_posts(
+    chunks: Iterator[List[Tuple[str, str, float]]],
+    clusterer: Optional[PostClusterer] = None,
+    workers: Optional[int] = None,
+) -> Tuple[List[str], np.ndarray, sparse.csr_matrix]:
+    """Hash preprocessed titles chunk by chunk, then weight by corpus IDF
+
+    preprocess_text is pure Python and takes most of the time, so chunks are
+    preprocessed in `workers` processes (default one per CPU), unless a
+    clusterer is given.
+    """
+    post_ids: List[str] = []
+    timestamps: List[float] = []
+
+    def titles() -> Iterator[List[str]]:
+        for chunk in chunks:
+            post_ids.extend(row[0] for row in chunk)
+            timestamps.extend(row[2] for row in chunk)
+            yield [row[1] for row in chunk]
+
+    workers = workers or os.cpu_count() or 1
+    if clusterer is not None or workers == 1:
+        clusterer = clusterer or PostClusterer(verbose=False)
+        blocks = [_hash_titles(chunk, clusterer) for chunk in titles()]
+    else:
+        blocks = list(_hash_in_workers(titles(), workers))
+    if not blocks:
+        return post_ids, np.array([]), sparse.csr_matrix((0, _HASHER.n_features))
+
+    counts = sparse.vstack(blocks, format="csr")
+    vectors = TfidfTransformer().fit_transform(counts).astype(np.float32)
+    return post_ids, np.asarray(timestamps, dtype=np.float64), vectors.tocsr()
+
+
+def _hash_titles(
+    titles: List[str], clusterer: Optional[PostClusterer] = None
+) -> sparse.csr_matrix:
+    clusterer = clusterer or _worker_clusterer
+    return _HASHER.transform(clusterer.preprocess_text(title, "") for title in titles)
+
+
+def _start_worker():
+    global _worker_clusterer
+    _worker_clusterer = PostClusterer(verbose=False)
+
+
+def _hash_in_workers(
+    chunks: Iterable[List[str]], workers: int
+) -> Iterator[sparse.csr_matrix]:
+    """Hashed chunks in order, with at most two chunks per worker in flight"""
+    with ProcessPoolExecutor(workers, initializer=_start_worker) as pool:
+        pending: Deque[Future] = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_hash_titles, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def similarity_graph(
+    vectors: sparse.csr_matrix,
+    timestamps: np.ndarray,
+    threshold: float = DEFAULT_THRESHOLD,
+    max_gap_seconds: Optional[float] = DEFAULT_MAX_GAP_HOURS * 3600,
+    block_size: int = 2000,
+) -> sparse.coo_matrix:
+    """Edges between posts with cosine similarity >= threshold
+
+    Rows are processed in blocks. Each block is multiplied only against the
+    later posts inside the time window, so peak memory is one sparse block
+    product, and each pair is visited once.
+    """
+    n = vectors.shape[0]
+    rows, cols = [], []
+    for block_start in range(0, n, block_size):
+        block_end = min(block_start + block_size, n)
+        window_end = n
+        if max_gap_seconds is not None:
+            window_end = int(
+                np.searchsorted(
+                    timestamps, timestamps[block_end - 1] + max_gap_seconds, "right"
+                )
+            )
+        products = (
+            vectors[block_start:block_end] @ vectors[block_start:window_end].T
+        ).tocoo()
+
+        i = products.row + block_start
+        j = products.col + block_start
+        keep = (j > i) & (products.data >= threshold)
+        if max_gap_seconds is not None:
+            keep &= timestamps[j] - timestamps[i] <= max_gap_seconds
+        rows.append(i[keep])
+        cols.append(j[keep])
+
+    rows = np.concatenate(rows) if rows else np.array([], dtype=np.int64)
+    cols = np.concatenate(cols) if cols else np.array([], dtype=np.int64)
+    data = np.ones(len(rows), dtype=np.int8)
+    return sparse.coo_matrix((data, (rows, cols)), shape=(n, n))
+
+
+def recluster(
+    db: Session,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    threshold: float = DEFAULT_THRESHOLD,
+    max_gap_hours: Optional[float] = DEFAULT_MAX_GAP_HOURS,
+    chunk_size: int = 10000,
+    block_size: int = 2000,
+    workers: Optional[int] = None,
+) -> ReclusterResult:
+    """Compute corrected clusters for posts in [start, end) without writing"""
+    post_ids, timestamps, vectors = vectorize_posts(
+        stream_posts(db, start, end, chunk_size), workers=workers
+    )
+    if not post_ids:
+        return ReclusterResult([], np.array([], dtype=np.int32), 0, start, end)
+
+    max_gap = max_gap_hours * 3600 if max_gap_hours is not None else None
+    graph = similarity_graph(vectors, timestamps, threshold, max_gap, block_size)
+    _, labels = connected_components(graph, directed=False)
+    return ReclusterResult(post_ids, labels, graph.nnz, start, end, timestamps)
+
+
+def write_clusters(db: Session, result: ReclusterResult, chunk_size: int = 10000):
+    """Bulk insert one cluster per component and repoint every post
+
+    Rollups of the re-clustered time range are rebuilt. Of the clusters the
+    posts were in, those left without posts are deleted and the rest, which
+    keep posts outside the time range, are recounted.
+    """
+    if not result.post_ids:
+        return
+
+    old_ids = set()
+    for i in range(0, len(result.post_ids), 900):
+        old_ids.update(
+            db.scalars(
+                select(Post.cluster_id)
+                .where(
+                    Post.id.in_(result.post_ids[i : i + 900]),
+                    Post.cluster_id.is_not(None),
+                )
+                .distinct()
+            )
+        )
+
+    # Posts arrive in time order, so the first member is the earliest
+    first_member: Dict[int, int] = {}
+    last_member: Dict[int, int] = {}
+    sizes = np.bincount(result.labels)
+    for index, label in enumerate(result.labels):
+        first_member.setdefault(int(label), index)
+        last_member[int(label)] = index
+
+    titles: Dict[str, str] = {}
+    representative_ids = [result.post_ids[index] for index in first_member.values()]
+    # Small IN lists keep under SQLite's bound parameter limit
+    for i in range(0, len(representative_ids), 900):
+        titles.update(
+            db.execute(
+                select(Post.id, Post.title).where(
+                    Post.id.in_(representative_ids[i : i + 900])
+                )
+            ).all()
+        )
+
+    def member_time(index: int) -> datetime:
+        if result.timestamps is None:
+            return datetime.now(timezone.utc)
+        return datetime.fromtimestamp(result.timestamps[index], timezone.utc)
+
+    base_id = (db.query(func.max(Cluster.id)).scalar() or 0) + 1
+    cluster_rows = []
+    for label, index in first_member.items():
+        post_id = result.post_ids[index]
+        cluster_rows.append(
+            {
+                "id": base_id + label,
+                "representative_post_id": post_id,
+                # As if built online: born with the first post, updated by the last
+                "created_at": member_time(index),
+                "updated_at": member_time(last_member[label]),
+                "post_count": int(sizes[label]),
+                "title": titles.get(post_id),
+            }
+        )
+    for i in range(0, len(cluster_rows), chunk_size):
+        db.execute(insert(Cluster), cluster_rows[i : i + chunk_size])
+
+    post_rows = [
+        {"id": post_id, "cluster_id": base_id + int(label), "processed": True}
+        for post_id, label in zip(result.post_ids, result.labels)
+    ]
+    for i in range(0, len(post_rows), chunk_size):
+        db.execute(update(Post), post_rows[i : i + chunk_size])
+    rebuild_rollups(db, result.start, result.end)
+
+    in_use = select(Post.cluster_id).where(Post.cluster_id.is_not(None))
+    db.query(Cluster).filter(Cluster.id.not_in(in_use)).delete(
+        synchronize_session=False
+    )
+    old_ids = sorted(old_ids)
+    for i in range(0, len(old_ids), 900):
+        db.execute(
+            update(Cluster)
+            .where(Cluster.id.in_(old_ids[i : i + 900]))
+            .values(
+                post_count=select(func.count())
+                .where(Post.cluster_id == Cluster.id)
+                .scalar_subquery()
+            )
+        )
+    db.commit()
+
+
+def _parse_date(value: Optional[str]) -> Optional[float]:
+    if value is None:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-cluster stored posts offline")
+    parser.add_argument("--start", help="ISO date or datetime, inclusive")
+    parser.add_argument("--end", help="ISO date or datetime, exclusive")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--max-gap-hours", type=float, default=DEFAULT_MAX_GAP_HOURS)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--block-size", type=int, default=2000)
+    parser.add_argument(
+        "--workers", type=int, help="Preprocessing processes, one per CPU by default"
+    )
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    from .database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        result = recluster(
+            db,
+            _parse_date(args.start),
+            _parse_date(args.end),
+            args.threshold,
+            args.max_gap_hours,
+            args.chunk_size,
+            args.block_size,
+            args.workers,
+        )
+        print(
+            f"📊 {len(result.post_ids)} posts, {result.edges} edges, "
+            f"{result.cluster_count} clusters "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+        if not args.dry_run:
+            write_clusters(db, result, args.chunk_size)
+            print("✅ Cluster assignments written")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
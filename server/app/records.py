@@ -0,0 +1,104 @@
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from .features import NO_EVENT, EventFeatures
+from .topics import TermHeap, build_top_terms, ranked_terms
+
+
+class ClusterRecord:
+    """Compact in-memory state for one active cluster
+
+    Holds only what matching needs. The full representative post lives in
+    storage and is fetched through PostClusterer.get_representative_post.
+    """
+
+    __slots__ = (
+        "cluster_id",
+        "representative_post_id",
+        "title",
+        "domain",
+        "created_at",  # POSIX timestamp, cheaper than a datetime
+        "post_count",
+        "last_matched_at",  # POSIX timestamp of the latest post added
+        "keywords",  # Unique interned words of the representative text
+        "event_features",  # Cached EventFeatures of the representative title
+        "term_counts",  # Keyword -> member posts using it, None until a post joins
+        "top_terms",  # Min-heap of the most used (count, term), or None
+        "headline",  # Member title covering the top terms best, for display
+    )
+
+    def __init__(
+        self,
+        cluster_id: int,
+        representative_post_id: str,
+        title: str,
+        domain: str,
+        created_at: float,
+        keywords: Tuple[str, ...],
+        event_features: EventFeatures = NO_EVENT,
+        post_count: int = 1,
+        last_matched_at: Optional[float] = None,
+        term_counts: Optional[Dict[str, int]] = None,
+        headline: Optional[str] = None,
+    ):
+        self.cluster_id = cluster_id
+        self.representative_post_id = representative_post_id
+        self.title = title
+        self.domain = domain
+        self.created_at = created_at
+        self.keywords = keywords
+        self.event_features = event_features
+        self.post_count = post_count
+        self.last_matched_at = (
+            created_at if last_matched_at is None else last_matched_at
+        )
+        self.term_counts = term_counts
+        self.top_terms: Optional[TermHeap] = None  # Built on first use
+        self.headline = title if headline is None else headline
+
+    def approx_size(self) -> int:
+        """Bytes held by this record, not counting interned keywords"""
+        return (
+            sys.getsizeof(self)
+            + sys.getsizeof(self.title)
+            + sys.getsizeof(self.representative_post_id)
+            + sys.getsizeof(self.keywords)
+            + (0 if self.term_counts is None else sys.getsizeof(self.term_counts))
+            + sys.getsizeof(self.top_terms)
+            + sum(sys.getsizeof(entry) for entry in self.top_terms or ())
+        )
+
+    def counts(self) -> Dict[str, int]:
+        """Keyword counts across members, read only
+
+        A cluster nobody joined counts each representative keyword once,
+        without keeping a dict for it.
+        """
+        if self.term_counts is None:
+            return dict.fromkeys(self.keywords, 1)
+        return self.term_counts
+
+    def tracked_counts(self) -> Dict[str, int]:
+        """Keyword counts to update in place, kept from the first post added"""
+        if self.term_counts is None:
+            self.term_counts = dict.fromkeys(self.keywords, 1)
+        return self.term_counts
+
+    def top_term_heap(self) -> TermHeap:
+        """Top terms heap, built lazily as most clusters never grow past one post"""
+        if self.top_terms is None:
+            self.top_terms = build_top_terms(self.counts())
+        return self.top_terms
+
+    def ranked_keywords(self) -> List[str]:
+        """Top terms, most used first"""
+        if self.top_terms is None:
+            # Don't keep a heap for a cluster nobody added to
+            return ranked_terms(build_top_terms(self.counts()))
+        return ranked_terms(self.top_terms)
+
+    def __repr__(self):
+        return (
+            f"ClusterRecord(id={self.cluster_id}, posts={self.post_count}, "
+            f"title={self.title[:40]!r})"
+        )
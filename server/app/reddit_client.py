@@ -1,20 +1,17 @@
-import praw
-import os
-from dotenv import load_dotenv
 from typing import List, Dict
-import time
 
-load_dotenv()
+from .config import get_settings
 
 
 class RedditClient:
     def __init__(self):
+        import praw  # Heavy, only needed once a client is made
+
+        settings = get_settings()
         self.reddit = praw.Reddit(
-            client_id=os.getenv("REDDIT_CLIENT_ID"),
-            client_secret=os.getenv("REDDIT_CLIENT_SECRET"),
-            user_agent=os.getenv(
-                "REDDIT_USER_AGENT", "ClusterBot/1.0 by /u/yourusername"
-            ),
+            client_id=settings.reddit_client_id,
+            client_secret=settings.reddit_client_secret,
+            user_agent=settings.reddit_user_agent,
         )
 
     def get_new_posts(self, subreddit: str, limit: int = 10) -> List[Dict]:
@@ -36,6 +33,10 @@ class RedditClient:
                         "score": submission.score,
                         "subreddit": subreddit,
                         "num_comments": submission.num_comments,
+                        # Fullname ("t3_...") of the post this crossposts, if any
+                        "crosspost_parent": getattr(
+                            submission, "crosspost_parent", None
+                        ),
                     }
                 )
         except Exception as e:
@@ -0,0 +1,523 @@
+import json
+import sys
+from collections import OrderedDict
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import redis
+from redis.exceptions import WatchError
+
+from .clustering import CLUSTER_MAX_AGE, PostClusterer
+from .events import ClusterEvent, ClusterEventBus
+from .features import NO_EVENT, EventFeatures
+from .records import ClusterRecord
+from .topics import is_topic_term
+
+
+class RedisClusterState:
+    """Cluster state shared by every clustering worker through Redis
+
+    Keys, all under one prefix:
+
+    - next_id: cluster ID counter, allocated with INCR
+    - cluster:{id}: hash of the record's metadata, event features and a
+      version bumped on every change
+    - terms:{id}: keyword counts across members (hash), from the first add
+    - kw:{word}, domain:{domain}: sets of cluster IDs for candidate lookup,
+      stop words left out as they would make nearly every cluster a candidate
+    - created: sorted set of cluster IDs by creation time, for expiry
+    - matched: sorted set of cluster IDs by last match, for maintenance
+    - events: pub/sub channel of cluster events (RedisEventBus)
+
+    Updates to an existing cluster WATCH its keys and retry when another
+    worker changed them in between, so concurrent adds are never lost and
+    nothing is written to a cluster that was expired or merged away.
+    """
+
+    def __init__(self, client: "redis.Redis", prefix: str = "clusterbot"):
+        self.client = client  # Must be created with decode_responses=True
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, prefix: str = "clusterbot") -> "RedisClusterState":
+        return cls(redis.Redis.from_url(url, decode_responses=True), prefix)
+
+    def _key(self, *parts) -> str:
+        return ":".join((self.prefix,) + tuple(str(part) for part in parts))
+
+    def _cluster_keys(self, cluster_id: int) -> Tuple[str, str]:
+        return self._key("cluster", cluster_id), self._key("terms", cluster_id)
+
+    def allocate_id(self) -> int:
+        return int(self.client.incr(self._key("next_id")))
+
+    def peek_next_id(self) -> int:
+        return int(self.client.get(self._key("next_id")) or 0) + 1
+
+    def reserve_ids_through(self, last_id: int):
+        """Make sure allocated IDs continue after last_id"""
+        key = self._key("next_id")
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    if int(pipe.get(key) or 0) >= last_id:
+                        return
+                    pipe.multi()
+                    pipe.set(key, last_id)
+                    pipe.execute()
+                    return
+                except WatchError:
+                    continue
+
+    def create(self, record: ClusterRecord):
+        with self.client.pipeline() as pipe:
+            self._write(pipe, record, version=1)
+            for word in _indexed(record.keywords):
+                pipe.sadd(self._key("kw", word), record.cluster_id)
+            if record.domain:
+                pipe.sadd(self._key("domain", record.domain), record.cluster_id)
+            pipe.execute()
+
+    def candidates(self, keywords: Iterable[str], domain: str = "") -> List[int]:
+        """Clusters sharing at least one keyword or the domain"""
+        with self.client.pipeline(transaction=False) as pipe:
+            for word in _indexed(keywords):
+                pipe.smembers(self._key("kw", word))
+            if domain:
+                pipe.smembers(self._key("domain", domain))
+            found = set()
+            for members in pipe.execute():
+                found.update(members)
+        return sorted(int(cluster_id) for cluster_id in found)
+
+    def matched_since(self, since: float) -> List[int]:
+        """Clusters created or matched at or after a timestamp"""
+        found = self.client.zrangebyscore(self._key("matched"), repr(since), "+inf")
+        return [int(cluster_id) for cluster_id in found]
+
+    def versions(self, cluster_ids: List[int]) -> List[Optional[int]]:
+        """Current version of each cluster, None once it is gone"""
+        with self.client.pipeline(transaction=False) as pipe:
+            for cluster_id in cluster_ids:
+                pipe.hget(self._key("cluster", cluster_id), "version")
+            return [int(v) if v is not None else None for v in pipe.execute()]
+
+    def load(self, cluster_ids: List[int]) -> Dict[int, Tuple[ClusterRecord, int]]:
+        """(record, version) of each cluster that still exists"""
+        with self.client.pipeline(transaction=False) as pipe:
+            for cluster_id in cluster_ids:
+                self._queue_read(pipe, cluster_id)
+            replies = pipe.execute()
+        loaded = {}
+        for index, cluster_id in enumerate(cluster_ids):
+            found = self._parse(cluster_id, *replies[index * 2 : index * 2 + 2])
+            if found is not None:
+                loaded[cluster_id] = found
+        return loaded
+
+    def add_post(
+        self, cluster_id: int, keywords: Iterable[str], now: float
+    ) -> Optional[int]:
+        """Record a new member post, returns the new version or None if gone"""
+        key, terms_key = self._cluster_keys(cluster_id)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key, terms_key)
+                    representative = pipe.hget(key, "keywords")
+                    if representative is None:
+                        return None
+                    counted = pipe.exists(terms_key)
+                    pipe.multi()
+                    if not counted:
+                        # First post to join, start from the representative's
+                        pipe.hset(
+                            terms_key,
+                            mapping=dict.fromkeys(representative.split(), 1),
+                        )
+                    pipe.hincrby(key, "post_count", 1)
+                    pipe.hset(key, "last_matched_at", repr(now))
+                    pipe.zadd(self._key("matched"), {cluster_id: now})
+                    for word in keywords:
+                        pipe.hincrby(terms_key, word, 1)
+                    pipe.hincrby(key, "version", 1)
+                    return int(pipe.execute()[-1])
+                except WatchError:
+                    continue
+
+    def update(
+        self,
+        cluster_ids: List[int],
+        change: Callable[[Dict[int, ClusterRecord]], Iterable[int]],
+    ) -> Optional[Dict[int, int]]:
+        """Rewrite clusters together, returns their new versions
+
+        `change` edits the loaded records in place and returns the IDs to
+        delete. Nothing is written, and None returned, if any of the
+        clusters no longer exists.
+        """
+        keys = [
+            key for cluster_id in cluster_ids for key in self._cluster_keys(cluster_id)
+        ]
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(*keys)
+                    records, versions = {}, {}
+                    for cluster_id in cluster_ids:
+                        key, terms_key = self._cluster_keys(cluster_id)
+                        found = self._parse(
+                            cluster_id, pipe.hgetall(key), pipe.hgetall(terms_key)
+                        )
+                        if found is None:
+                            return None
+                        records[cluster_id], versions[cluster_id] = found
+                    deleted = set(change(records))
+                    pipe.multi()
+                    written = {}
+                    for cluster_id, record in records.items():
+                        if cluster_id in deleted:
+                            self._delete(pipe, record)
+                        else:
+                            written[cluster_id] = versions[cluster_id] + 1
+                            self._write(pipe, record, written[cluster_id])
+                    pipe.execute()
+                    return written
+                except WatchError:
+                    continue
+
+    def expire(self, before: float) -> List[int]:
+        """Delete clusters created before a timestamp, returns their IDs
+
+        Each cluster is claimed by removing it from the created index, so
+        when several workers expire at once only one deletes it.
+        """
+        created_key = self._key("created")
+        stale = self.client.zrangebyscore(created_key, "-inf", f"({before!r}")
+        claimed = [int(cid) for cid in stale if self.client.zrem(created_key, cid)]
+        for cluster_id, (record, _) in self.load(claimed).items():
+            with self.client.pipeline() as pipe:
+                self._delete(pipe, record)
+                pipe.execute()
+        return claimed
+
+    def _write(self, pipe, record: ClusterRecord, version: int):
+        key, terms_key = self._cluster_keys(record.cluster_id)
+        features = record.event_features
+        pipe.hset(
+            key,
+            mapping={
+                "representative_post_id": record.representative_post_id,
+                "title": record.title,
+                "headline": record.headline,
+                "domain": record.domain,
+                "created_at": repr(record.created_at),
+                "last_matched_at": repr(record.last_matched_at),
+                "post_count": record.post_count,
+                "keywords": " ".join(record.keywords),
+                "event_features": json.dumps(
+                    [
+                        sorted(features.event_types),
+                        sorted(features.locations),
+                        list(features.numbers),
+                    ]
+                ),
+                "version": version,
+            },
+        )
+        pipe.delete(terms_key)
+        if record.term_counts:
+            pipe.hset(terms_key, mapping=record.term_counts)
+        pipe.zadd(self._key("created"), {record.cluster_id: record.created_at})
+        pipe.zadd(self._key("matched"), {record.cluster_id: record.last_matched_at})
+
+    def _delete(self, pipe, record: ClusterRecord):
+        pipe.delete(*self._cluster_keys(record.cluster_id))
+        for word in _indexed(record.keywords):
+            pipe.srem(self._key("kw", word), record.cluster_id)
+        if record.domain:
+            pipe.srem(self._key("domain", record.domain), record.cluster_id)
+        pipe.zrem(self._key("created"), record.cluster_id)
+        pipe.zrem(self._key("matched"), record.cluster_id)
+
+    def _queue_read(self, pipe, cluster_id: int):
+        key, terms_key = self._cluster_keys(cluster_id)
+        pipe.hgetall(key)
+        pipe.hgetall(terms_key)
+
+    @staticmethod
+    def _parse(
+        cluster_id: int, data: Dict, terms: Dict
+    ) -> Optional[Tuple[ClusterRecord, int]]:
+        if not data:
+            return None
+        event_types, locations, numbers = json.loads(data["event_features"])
+        features = (
+            EventFeatures(frozenset(event_types), frozenset(locations), tuple(numbers))
+            if event_types
+            else NO_EVENT
+        )
+        record = ClusterRecord(
+            cluster_id=cluster_id,
+            representative_post_id=data["representative_post_id"],
+            title=data["title"],
+            domain=sys.intern(data["domain"]),
+            created_at=float(data["created_at"]),
+            keywords=tuple(sys.intern(word) for word in data["keywords"].split()),
+            event_features=features,
+            post_count=int(data["post_count"]),
+            last_matched_at=float(data["last_matched_at"]),
+            term_counts=(
+                {sys.intern(w): int(c) for w, c in terms.items()} if terms else None
+            ),
+            headline=data.get("headline"),
+        )
+        return record, int(data["version"])
+
+
+class RedisClusterer(PostClusterer):
+    """PostClusterer whose clusters live in Redis, shared by many workers
+
+    Candidates come from the shared keyword and domain indexes, and IDs
+    from the shared counter. `active_clusters` is this worker's read cache,
+    refreshed when the version in Redis moves on and trimmed to cache_size
+    least recently used entries. Memory budgets and spilling don't apply.
+    Fingerprints of reposts are kept per worker and only short-circuit to
+    cached clusters, other workers' reposts are found by normal scoring.
+
+    Each worker can run its own instance against the same state to raise
+    throughput. Maintenance reads changed clusters and merge candidates
+    from Redis, so any one worker can run it for all of them.
+    """
+
+    def __init__(self, state: RedisClusterState, cache_size: int = 10000, **kwargs):
+        self.state = state
+        self.cache_size = cache_size
+        self._versions: Dict[int, int] = {}
+        super().__init__(id_allocator=state.allocate_id, **kwargs)
+        self.active_clusters: "OrderedDict[int, ClusterRecord]" = OrderedDict()
+        self.max_active_clusters = None
+        self.max_active_bytes = None
+        self.spill_store = None
+
+    @property
+    def next_cluster_id(self) -> int:
+        return self.state.peek_next_id()
+
+    @next_cluster_id.setter
+    def next_cluster_id(self, value: int):
+        self.state.reserve_ids_through(value - 1)
+
+    def _is_empty(self) -> bool:
+        return False
+
+    def _candidates(
+        self, keywords: FrozenSet[str], domain: str
+    ) -> Iterable[Tuple[int, ClusterRecord]]:
+        # Scored as fetched, there may be more of them than the cache holds
+        return self._sync(self.state.candidates(keywords, domain)).items()
+
+    def _sync(self, cluster_ids: List[int]) -> Dict[int, ClusterRecord]:
+        """Up to date copies of the clusters that still exist, in order
+
+        The cache is only read through: current copies come from it, the
+        rest from Redis, and both are returned even if caching them evicted
+        some of the others.
+        """
+        if not cluster_ids:
+            return {}
+        found, outdated = {}, []
+        for cluster_id, version in zip(cluster_ids, self.state.versions(cluster_ids)):
+            if version is None:
+                self._forget(cluster_id)
+            elif self._versions.get(cluster_id) != version:
+                outdated.append(cluster_id)
+            else:
+                self.active_clusters.move_to_end(cluster_id)
+                found[cluster_id] = self.active_clusters[cluster_id]
+        for record, version in self.state.load(outdated).values():
+            found[record.cluster_id] = record
+            self._cache(record, version)
+        return {
+            cluster_id: found[cluster_id]
+            for cluster_id in cluster_ids
+            if cluster_id in found
+        }
+
+    def current_clusters(self, cluster_ids: Iterable[int]) -> Dict[int, ClusterRecord]:
+        return self._sync(list(cluster_ids))
+
+    def changed_clusters(self, since: float) -> Dict[int, ClusterRecord]:
+        return self._sync(self.state.matched_since(since))
+
+    def merge_candidates(self, keywords: Iterable[str]) -> Dict[int, ClusterRecord]:
+        return self._sync(self.state.candidates(keywords))
+
+    def _cache(self, record: ClusterRecord, version: int):
+        self.active_clusters[record.cluster_id] = record
+        self.active_clusters.move_to_end(record.cluster_id)
+        self._versions[record.cluster_id] = version
+        while len(self.active_clusters) > self.cache_size:
+            cluster_id, _ = self.active_clusters.popitem(last=False)
+            self._versions.pop(cluster_id, None)
+
+    def _forget(self, cluster_id: int):
+        self.active_clusters.pop(cluster_id, None)
+        self._versions.pop(cluster_id, None)
+
+    def create_cluster(self, post: Dict, cluster_id: Optional[int] = None) -> int:
+        """Create new cluster with post as representative"""
+        if cluster_id is None:
+            cluster_id = self._allocate_cluster_id()
+        record = self._new_record(cluster_id, post)
+        self.state.create(record)
+        self._cache(record, 1)
+        self.fingerprints.add(record.cluster_id, self._post_fingerprints(post))
+        return record.cluster_id
+
+    def add_to_cluster(self, cluster_id: int, post: Dict) -> bool:
+        """Add post to a shared cluster, False if it no longer exists"""
+        version = self.state.add_post(
+            cluster_id, self._post_keywords(post), self._now()
+        )
+        if version is None:
+            self._forget(cluster_id)
+            self.fingerprints.discard(cluster_id)
+            return False
+        self.fingerprints.add(cluster_id, self._post_fingerprints(post))
+        cached = self.active_clusters.get(cluster_id)
+        if cached is not None and self._versions.get(cluster_id) == version - 1:
+            # Nobody else changed it, apply the same update locally
+            self._record_post(cached, post)
+            self._versions[cluster_id] = version
+        else:
+            self._forget(cluster_id)
+        return True
+
+    def assign_post(self, post: Dict) -> Tuple[int, bool]:
+        """Match post to a cluster or start a new one, returns (cluster_id, created)"""
+        self.clock.observe_post(post)
+        cluster_id = self.find_similar_cluster(post)
+        # The match may be expired or merged by another worker meanwhile
+        if cluster_id is not None and self.add_to_cluster(cluster_id, post):
+            return cluster_id, False
+        return self.create_cluster(post), True
+
+    def unassign_post(self, post: Dict, cluster_id: int, created: bool):
+        """Reverse assign_post for a post whose assignment was never stored"""
+
+        def change(records: Dict[int, ClusterRecord]) -> List[int]:
+            if created:
+                return [cluster_id]
+            self._remove_posts(records[cluster_id], [post])
+            return []
+
+        self.state.update([cluster_id], change)
+        self._forget(cluster_id)
+        if created:
+            self.fingerprints.discard(cluster_id)
+
+    def expire_stale_clusters(self) -> List[int]:
+        """Drop clusters that can no longer accept posts, returns their IDs"""
+        cutoff = self._now() - CLUSTER_MAX_AGE.total_seconds()
+        expired = self.state.expire(cutoff)
+        for cluster_id in expired:
+            self._forget(cluster_id)
+            self.fingerprints.discard(cluster_id)
+        for cluster_id, cluster in list(self.active_clusters.items()):
+            if self._is_cluster_stale(cluster):
+                self._forget(cluster_id)
+        return expired
+
+    def merge_clusters(self, keep_id: int, drop_id: int) -> bool:
+        """Fold cluster drop_id into keep_id, the dropped ID stops existing
+
+        False, and nothing changed, if either was expired or merged away by
+        another worker meanwhile.
+        """
+
+        def change(records: Dict[int, ClusterRecord]) -> List[int]:
+            self._absorb(records[keep_id], records[drop_id])
+            return [drop_id]
+
+        merged = self.state.update([keep_id, drop_id], change) is not None
+        if merged:
+            self.fingerprints.move(drop_id, keep_id)
+        self._forget(drop_id)
+        self._forget(keep_id)
+        self._sync([keep_id])
+        return merged
+
+    def split_cluster(
+        self, cluster_id: int, posts: List[Dict], new_id: Optional[int] = None
+    ) -> Optional[int]:
+        """Move member posts into a new cluster led by the first of them
+
+        None, and nothing changed, if the cluster no longer exists.
+        """
+        created_at = []
+
+        def change(records: Dict[int, ClusterRecord]) -> List[int]:
+            created_at.append(records[cluster_id].created_at)
+            self._remove_posts(records[cluster_id], posts)
+            return []
+
+        split = self.state.update([cluster_id], change) is not None
+        self._forget(cluster_id)
+        self._sync([cluster_id])
+        if not split:
+            return None
+
+        new_id = self.create_cluster(posts[0], new_id)
+        for post in posts[1:]:
+            self.add_to_cluster(new_id, post)
+
+        def keep_age(records: Dict[int, ClusterRecord]) -> List[int]:
+            # The split-off story keeps the age of the cluster it came from
+            records[new_id].created_at = created_at[-1]
+            return []
+
+        self.state.update([new_id], keep_age)
+        self._forget(new_id)
+        self._sync([new_id])
+        return new_id
+
+    def get_representative_post(self, cluster_id: int) -> Optional[Dict]:
+        """Fetch the full representative post of a cluster from storage"""
+        cluster = self._sync([cluster_id]).get(cluster_id)
+        if cluster is None or self.post_loader is None:
+            return None
+        return self.post_loader(cluster.representative_post_id)
+
+
+class RedisEventBus(ClusterEventBus):
+    """Event bus shared by every worker through Redis pub/sub
+
+    publish() sends an event to the channel, and a listener thread in each
+    process hands whatever arrives, its own events included, to the
+    subscribers of that process. So a client connected to any worker sees
+    the events of all of them.
+    """
+
+    def __init__(self, state: RedisClusterState, max_buffer: int = 256):
+        super().__init__(max_buffer)
+        self.client = state.client
+        self.channel = state._key("events")
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{self.channel: self._receive})
+        self._listener = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def publish(self, event: ClusterEvent):
+        self.client.publish(self.channel, json.dumps(event.to_dict()))
+
+    def _receive(self, message: Dict):
+        super().publish(ClusterEvent.from_dict(json.loads(message["data"])))
+
+    def close(self):
+        self._listener.stop()
+        self._pubsub.close()
+
+
+def _indexed(keywords: Iterable[str]) -> List[str]:
+    """Keywords worth a candidate index entry"""
+    return [word for word in keywords if is_topic_term(word)]
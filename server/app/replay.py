@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""Replay a recorded post stream through the clusterer
+
+A capture is a JSONL file with one post per line, in the shape
+RedditClient.get_new_posts produces, in arrival order. Posts are fed as
+fast as the CPU allows while a VirtualClock follows each post's
+created_utc, so the 24 hour cluster window, expiry sweeps and
+maintenance passes all happen in post time. The same capture and
+settings always produce the same assignments.
+
+    python -m app.replay capture.jsonl --output assignments.jsonl
+    python -m app.replay capture.jsonl --persist   # backfill DATABASE_URL
+"""
+
+import argparse
+import json
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .clock import VirtualClock
+from .clustering import PostClusterer
+from .config import get_settings
+from .maintenance import maintainer_for
+
+# Virtual seconds between expiry sweeps and maintenance passes, as in the API
+DEFAULT_EXPIRE_INTERVAL = 60.0
+DEFAULT_MAINTENANCE_INTERVAL = 300.0
+
+
+class Assignment:
+    __slots__ = ("post_id", "cluster_id", "created")
+
+    def __init__(self, post_id: str, cluster_id: int, created: bool):
+        self.post_id = post_id
+        self.cluster_id = cluster_id
+        self.created = created
+
+    def to_dict(self) -> Dict:
+        return {
+            "post_id": self.post_id,
+            "cluster_id": self.cluster_id,
+            "created": self.created,
+        }
+
+
+def read_capture(path: str) -> Iterator[Dict]:
+    """Posts from a JSONL capture, blank lines skipped"""
+    with open(path) as capture:
+        for line in capture:
+            if line.strip():
+                yield json.loads(line)
+
+
+class ReplayRunner:
+    """Feeds posts through a clusterer, or a ClusterService, on virtual time
+
+    Posts go through in batches; between batches, stale clusters are expired
+    and maintenance runs whenever their interval of post time has passed.
+    With a service every batch is persisted like a POST /cluster/batch call.
+    """
+
+    def __init__(
+        self,
+        clusterer=None,
+        service=None,
+        batch_size: int = 500,
+        expire_interval: Optional[float] = DEFAULT_EXPIRE_INTERVAL,
+        maintenance_interval: Optional[float] = DEFAULT_MAINTENANCE_INTERVAL,
+    ):
+        if service is not None:
+            clusterer = service.clusterer
+        elif clusterer is None:
+            clusterer = PostClusterer(verbose=False, clock=VirtualClock())
+        if not isinstance(clusterer.clock, VirtualClock):
+            raise ValueError("replay needs a clusterer running on a VirtualClock")
+        self.clusterer = clusterer
+        self.service = service
+        self.clock: VirtualClock = clusterer.clock
+        self.batch_size = batch_size
+        self.expire_interval = expire_interval
+        self.maintenance_interval = maintenance_interval
+        self.maintainer = service.maintainer if service else maintainer_for(clusterer)
+        self.posts = 0
+        self.expired = 0
+        self._last_expire: Optional[float] = None
+        self._last_maintenance: Optional[float] = None
+
+    def run(self, posts: Iterable[Dict]) -> Iterator[Assignment]:
+        """Assign every post, yielding assignments in input order"""
+        batch: List[Dict] = []
+        for post in posts:
+            batch.append(post)
+            if len(batch) >= self.batch_size:
+                yield from self._run_batch(batch)
+                batch = []
+        if batch:
+            yield from self._run_batch(batch)
+
+    def _run_batch(self, batch: List[Dict]) -> Iterator[Assignment]:
+        if self._last_expire is None:
+            # Timers start at the first post, not at the epoch
+            self.clock.observe_post(batch[0])
+            self._last_expire = self._last_maintenance = self.clock.now()
+
+        if self.service is not None:
+            results = self.service.cluster_batch(batch)
+        else:
+            results = [self.clusterer.assign_post(post) for post in batch]
+        self.posts += len(batch)
+        for post, (cluster_id, created) in zip(batch, results):
+            yield Assignment(post["id"], cluster_id, created)
+        self._run_timers()
+
+    def _run_timers(self):
+        now = self.clock.now()
+        if self._due(self._last_expire, self.expire_interval):
+            self._last_expire = now
+            if self.service is not None:
+                self.expired += len(self.service.expire_clusters())
+            else:
+                self.expired += len(self.clusterer.expire_stale_clusters())
+        if self._due(self._last_maintenance, self.maintenance_interval):
+            self._last_maintenance = now
+            if self.service is not None:
+                self.service.run_maintenance()
+            else:
+                self.maintainer.run()
+
+    def _due(self, last: float, interval: Optional[float]) -> bool:
+        return interval is not None and self.clock.now() - last >= interval
+
+
+def main():
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Replay a JSONL post capture")
+    parser.add_argument("capture", help="JSONL file, one post per line")
+    parser.add_argument("--output", help="Write assignments as JSONL here")
+    parser.add_argument("--persist", action="store_true", help="Write to the DB")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument(
+        "--expire-interval", type=float, default=settings.cluster_expire_interval
+    )
+    parser.add_argument(
+        "--maintenance-interval",
+        type=float,
+        default=settings.cluster_maintenance_interval,
+    )
+    args = parser.parse_args()
+
+    clusterer = PostClusterer(
+        similarity_threshold=args.threshold, verbose=False, clock=VirtualClock()
+    )
+    service = None
+    if args.persist:
+        from .database import SessionLocal, create_tables
+        from .service import ClusterService
+
+        create_tables()
+        service = ClusterService(SessionLocal, clusterer)
+
+    runner = ReplayRunner(
+        clusterer,
+        service,
+        batch_size=args.batch_size,
+        expire_interval=args.expire_interval,
+        maintenance_interval=args.maintenance_interval,
+    )
+    output = open(args.output, "w") if args.output else None
+    started = time.perf_counter()
+    clusters = 0
+    try:
+        for assignment in runner.run(read_capture(args.capture)):
+            clusters += assignment.created
+            if output:
+                output.write(json.dumps(assignment.to_dict()) + "\n")
+    finally:
+        if output:
+            output.close()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"📊 Replayed {runner.posts} posts into {clusters} clusters "
+        f"in {elapsed:.1f}s ({runner.posts / max(elapsed, 1e-9):.0f} posts/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""Per cluster, subreddit and time bucket totals for dashboard queries
+
+The write path adds every assigned post to its cluster's bucket, so
+questions like "fastest growing clusters in r/worldnews this hour" read a
+few rollup rows per active cluster instead of aggregating the posts table.
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Integer, case, cast, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from .config import get_settings
+from .models import Cluster, ClusterRollup, Post
+
+RollupKey = Tuple[int, str, int]  # (cluster_id, subreddit, bucket_start)
+
+
+def bucket_seconds() -> int:
+    """Width of one rollup time bucket, windows are rounded out to whole buckets"""
+    return get_settings().rollup_bucket_seconds
+
+
+def bucket_of(timestamp: float) -> int:
+    width = bucket_seconds()
+    return int(timestamp // width) * width
+
+
+def _upsert_insert(dialect: str):
+    """insert() supporting ON CONFLICT on this dialect, or None"""
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as upsert_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert_insert
+    else:
+        return None
+    return upsert_insert
+
+
+class RollupDeltas:
+    """Rollup changes collected over one transaction, written together"""
+
+    def __init__(self):
+        # Key -> [posts, score, comments]
+        self.totals: Dict[RollupKey, List[int]] = defaultdict(lambda: [0, 0, 0])
+
+    def add(
+        self,
+        cluster_id: int,
+        subreddit: str,
+        timestamp: float,
+        score: int = 0,
+        comments: int = 0,
+        posts: int = 1,
+    ):
+        totals = self.totals[(cluster_id, subreddit, bucket_of(timestamp))]
+        totals[0] += posts
+        totals[1] += score or 0
+        totals[2] += comments or 0
+
+    def add_post(self, cluster_id: int, post: Dict, now: float):
+        """Count a post, in the bucket of its Reddit creation time"""
+        self.add(
+            cluster_id,
+            post["subreddit"],
+            post.get("created_utc") or now,
+            post.get("score", 0),
+            post.get("num_comments", 0),
+        )
+
+    def write(self, db: Session):
+        """Add the collected totals onto the stored rollups"""
+        rows = [
+            {
+                "cluster_id": cluster_id,
+                "subreddit": subreddit,
+                "bucket_start": bucket_start,
+                "post_count": posts,
+                "total_score": score,
+                "total_comments": comments,
+            }
+            for (cluster_id, subreddit, bucket_start), (posts, score, comments) in (
+                self.totals.items()
+            )
+            if posts or score or comments
+        ]
+        self.totals.clear()
+        if not rows:
+            return
+
+        upsert_insert = _upsert_insert(db.get_bind().dialect.name)
+        if upsert_insert is not None:
+            statement = upsert_insert(ClusterRollup)
+            excluded = statement.excluded
+            db.execute(
+                statement.on_conflict_do_update(
+                    index_elements=["cluster_id", "subreddit", "bucket_start"],
+                    set_={
+                        "post_count": ClusterRollup.post_count + excluded.post_count,
+                        "total_score": ClusterRollup.total_score + excluded.total_score,
+                        "total_comments": ClusterRollup.total_comments
+                        + excluded.total_comments,
+                    },
+                ),
+                rows,
+            )
+            return
+
+        for row in rows:
+            updated = db.execute(
+                update(ClusterRollup)
+                .where(
+                    ClusterRollup.cluster_id == row["cluster_id"],
+                    ClusterRollup.subreddit == row["subreddit"],
+                    ClusterRollup.bucket_start == row["bucket_start"],
+                )
+                .values(
+                    post_count=ClusterRollup.post_count + row["post_count"],
+                    total_score=ClusterRollup.total_score + row["total_score"],
+                    total_comments=ClusterRollup.total_comments + row["total_comments"],
+                )
+            )
+            if not updated.rowcount:
+                db.execute(insert(ClusterRollup), [row])
+
+
+def merge_rollups(db: Session, dropped: int, kept: int):
+    """Fold a merged cluster's rollups into the surviving cluster"""
+    deltas = RollupDeltas()
+    for row in db.scalars(
+        select(ClusterRollup).where(ClusterRollup.cluster_id == dropped)
+    ):
+        deltas.add(
+            kept,
+            row.subreddit,
+            row.bucket_start,
+            row.total_score,
+            row.total_comments,
+            row.post_count,
+        )
+    db.execute(delete(ClusterRollup).where(ClusterRollup.cluster_id == dropped))
+    deltas.write(db)
+
+
+def split_rollups(db: Session, source: int, new: int, post_ids: Iterable[str]):
+    """Move stored posts' contributions from one cluster to another"""
+    deltas = RollupDeltas()
+    post_ids = list(post_ids)
+    for i in range(0, len(post_ids), 900):
+        rows = db.execute(
+            select(
+                Post.subreddit,
+                Post.reddit_created_utc,
+                Post.score,
+                Post.num_comments,
+            ).where(
+                Post.id.in_(post_ids[i : i + 900]),
+                Post.reddit_created_utc.is_not(None),
+            )
+        )
+        for subreddit, created_utc, score, comments in rows:
+            deltas.add(
+                source, subreddit, created_utc, -(score or 0), -(comments or 0), -1
+            )
+            deltas.add(new, subreddit, created_utc, score, comments)
+    deltas.write(db)
+    db.execute(
+        delete(ClusterRollup).where(
+            ClusterRollup.cluster_id == source, ClusterRollup.post_count <= 0
+        )
+    )
+
+
+def rebuild_rollups(
+    db: Session, start: Optional[float] = None, end: Optional[float] = None
+):
+    """Recompute rollups of the buckets covering [start, end) from posts
+
+    For bulk rewrites of post cluster_ids, e.g. after re-clustering.
+    """
+    low = bucket_of(start) if start is not None else None
+    high = bucket_of(end) + bucket_seconds() if end is not None else None
+
+    stale = delete(ClusterRollup)
+    if low is not None:
+        stale = stale.where(ClusterRollup.bucket_start >= low)
+    if high is not None:
+        stale = stale.where(ClusterRollup.bucket_start < high)
+    db.execute(stale)
+
+    width = bucket_seconds()
+    bucket = (cast(Post.reddit_created_utc, Integer) // width * width).label(
+        "bucket_start"
+    )
+    totals = select(
+        Post.cluster_id,
+        Post.subreddit,
+        bucket,
+        func.count(),
+        func.coalesce(func.sum(Post.score), 0),
+        func.coalesce(func.sum(Post.num_comments), 0),
+    ).where(Post.cluster_id.is_not(None), Post.reddit_created_utc.is_not(None))
+    if low is not None:
+        totals = totals.where(Post.reddit_created_utc >= low)
+    if high is not None:
+        totals = totals.where(Post.reddit_created_utc < high)
+    totals = totals.group_by(Post.cluster_id, Post.subreddit, bucket)
+    db.execute(
+        insert(ClusterRollup).from_select(
+            [
+                "cluster_id",
+                "subreddit",
+                "bucket_start",
+                "post_count",
+                "total_score",
+                "total_comments",
+            ],
+            totals,
+        )
+    )
+
+
+def trending_query(
+    since: float,
+    until: float,
+    subreddit: Optional[str] = None,
+    limit: int = 20,
+) -> Select:
+    """Clusters growing fastest in [since, until), from rollups only
+
+    Rows are (cluster_id, title, post_count, previous_post_count,
+    total_score, total_comments), where previous_post_count covers the
+    window of equal length just before. Sorted by growth, then size.
+    """
+    window = max(until - since, bucket_seconds())
+    window_start = bucket_of(since)
+    previous_start = bucket_of(since - window)
+    in_window = ClusterRollup.bucket_start >= window_start
+
+    posts = func.sum(case((in_window, ClusterRollup.post_count), else_=0))
+    previous = func.sum(case((in_window, 0), else_=ClusterRollup.post_count))
+    score = func.sum(case((in_window, ClusterRollup.total_score), else_=0))
+    comments = func.sum(case((in_window, ClusterRollup.total_comments), else_=0))
+
+    query = (
+        select(
+            ClusterRollup.cluster_id,
+            Cluster.title,
+            posts.label("post_count"),
+            previous.label("previous_post_count"),
+            score.label("total_score"),
+            comments.label("total_comments"),
+        )
+        .join(Cluster, Cluster.id == ClusterRollup.cluster_id)
+        .where(
+            ClusterRollup.bucket_start >= previous_start,
+            ClusterRollup.bucket_start < until,
+        )
+    )
+    if subreddit is not None:
+        query = query.where(ClusterRollup.subreddit == subreddit)
+    return (
+        query.group_by(ClusterRollup.cluster_id, Cluster.title)
+        .having(posts > 0)
+        .order_by((posts - previous).desc(), posts.desc(), ClusterRollup.cluster_id)
+        .limit(limit)
+    )
+
+
+def trending_to_dict(row) -> Dict:
+    return {
+        "id": row.cluster_id,
+        "title": row.title,
+        "post_count": int(row.post_count),
+        "previous_post_count": int(row.previous_post_count),
+        "total_score": int(row.total_score),
+        "total_comments": int(row.total_comments),
+    }
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""Poll subreddits for new posts, each at a pace set by its post rate
+
+Every subreddit keeps an EWMA of its observed posts per second. Intervals
+share the request budget so the expected ingest lag summed over all
+posts is smallest: polling every T seconds delays a post by T/2 on
+average, so with rate r and budget B requests per second the best
+interval is T = sum(sqrt(r_j)) / (B * sqrt(r)). Busy subreddits are polled
+more often, but less than in proportion to their rate. Intervals stay
+within [min_interval, max_interval], and the page size covers twice the
+posts expected in one interval, so a burst still fits in one request.
+
+A heap of next-poll times decides which subreddit is polled next. The
+clock and the client are injected, so tests run hours of polling on a
+VirtualClock against a fake client.
+
+    python -m app.scheduler worldnews news technology --budget 60
+"""
+
+import argparse
+import heapq
+import math
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .clock import SYSTEM_CLOCK, Clock
+from .config import get_settings
+
+# Reddit allows 100 requests a minute per OAuth client, leave some headroom
+DEFAULT_BUDGET = 60.0
+# Assumed rate of a subreddit with no posts yet, about one a day
+MIN_RATE = 1 / 86400
+
+
+class SubredditStats:
+    """Observed post rate and polling settings of one subreddit"""
+
+    def __init__(self, name: str, limit: int, history: int):
+        self.name = name
+        self.rate: Optional[float] = None  # Posts per second, EWMA
+        self.interval = 0.0
+        self.limit = limit
+        self.last_poll: Optional[float] = None
+        self.polls = 0
+        self.posts = 0
+        self.full_pages = 0  # Pages with no known post, posts may be missing
+        self.lag = 0.0  # Summed seconds from created_utc to ingestion
+        self.lagged = 0  # Posts counted in lag
+        self._seen: set = set()
+        self._seen_order: deque = deque()
+        self._history = history
+
+    def is_new(self, post_id: str) -> bool:
+        return post_id not in self._seen
+
+    def remember(self, post_id: str):
+        """Remember a post ID, forgetting the oldest past history IDs"""
+        self._seen.add(post_id)
+        self._seen_order.append(post_id)
+        while len(self._seen_order) > self._history:
+            self._seen.discard(self._seen_order.popleft())
+
+    def to_dict(self) -> Dict:
+        return {
+            "subreddit": self.name,
+            "rate_per_hour": (self.rate or 0.0) * 3600,
+            "interval": self.interval,
+            "limit": self.limit,
+            "polls": self.polls,
+            "posts": self.posts,
+            "full_pages": self.full_pages,
+            "mean_lag": self.lag / self.lagged if self.lagged else 0.0,
+        }
+
+
+def allocate_intervals(
+    rates: Dict[str, float],
+    budget: float,
+    min_interval: float,
+    max_interval: float,
+) -> Dict[str, float]:
+    """Poll interval per subreddit minimizing total lag at budget requests/s"""
+    roots = {name: math.sqrt(max(rate, MIN_RATE)) for name, rate in rates.items()}
+    intervals: Dict[str, float] = {}
+    while len(intervals) < len(roots):
+        # Subreddits capped at max_interval poll more than their share, the
+        # rest split what is left
+        remaining = budget - sum(1 / t for t in intervals.values())
+        free = {name: root for name, root in roots.items() if name not in intervals}
+        total = sum(free.values())
+        slow = [
+            name
+            for name, root in free.items()
+            if total / root > max_interval * remaining
+        ]
+        if not slow:
+            for name, root in free.items():
+                intervals[name] = max(total / (remaining * root), min_interval)
+            break
+        for name in slow:
+            intervals[name] = max_interval
+    # Clamping to min_interval can overspend, stretch everything to fit
+    requests = sum(1 / interval for interval in intervals.values())
+    if requests > budget:
+        scale = requests / budget
+        intervals = {name: t * scale for name, t in intervals.items()}
+    return intervals
+
+
+class PollScheduler:
+    """Decides when to poll each subreddit and how many posts to ask for
+
+    budget is in requests per minute, across all subreddits. The client
+    needs get_new_posts(subreddit, limit) returning posts newest first, as
+    RedditClient does.
+    """
+
+    def __init__(
+        self,
+        client,
+        subreddits: Iterable[str],
+        budget: float = DEFAULT_BUDGET,
+        clock: Clock = SYSTEM_CLOCK,
+        alpha: float = 0.3,
+        min_interval: float = 10.0,
+        max_interval: float = 900.0,
+        min_limit: int = 10,
+        max_limit: int = 100,
+    ):
+        self.client = client
+        self.budget = budget / 60
+        self.clock = clock
+        self.alpha = alpha  # Weight of the newest rate sample
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.requests = 0
+        self.stats: Dict[str, SubredditStats] = {}
+        self._queue: List[Tuple[float, int, str]] = []
+        self._sequence = 0  # Tie breaker, subreddits due together keep order
+
+        now = self.clock.now()
+        for name in subreddits:
+            self.stats[name] = SubredditStats(name, max_limit, 2 * max_limit)
+            # First round fetches a full page each, spread over the budget
+            self._schedule(name, now + len(self._queue) / self.budget)
+
+    def _schedule(self, name: str, at: float):
+        heapq.heappush(self._queue, (at, self._sequence, name))
+        self._sequence += 1
+
+    def next_due(self) -> float:
+        """Time the next subreddit is due"""
+        return self._queue[0][0]
+
+    def poll_due(self) -> List[Dict]:
+        """Poll every subreddit that is due, returning their new posts"""
+        posts = []
+        while self._queue and self._queue[0][0] <= self.clock.now():
+            _, _, name = heapq.heappop(self._queue)
+            posts.extend(self.poll(name))
+        return posts
+
+    def poll(self, name: str) -> List[Dict]:
+        """Fetch one page of a subreddit and reschedule it"""
+        stats = self.stats[name]
+        now = self.clock.now()
+        page = self.client.get_new_posts(name, limit=stats.limit)
+        self.requests += 1
+        stats.polls += 1
+
+        new_posts = [post for post in page if stats.is_new(post["id"])]
+        for post in reversed(new_posts):  # Oldest first, as they were posted
+            stats.remember(post["id"])
+        stats.posts += len(new_posts)
+        if stats.last_poll is not None:
+            # The first page is backlog, lag counts from the second poll on
+            stats.lagged += len(new_posts)
+            stats.lag += sum(
+                max(now - post.get("created_utc", now), 0.0) for post in new_posts
+            )
+            if len(new_posts) >= stats.limit:
+                stats.full_pages += 1
+
+        self._update_rate(stats, new_posts, now)
+        stats.last_poll = now
+        self._reschedule(stats, now)
+        new_posts.reverse()
+        return new_posts
+
+    def _update_rate(self, stats: SubredditStats, new_posts: List[Dict], now: float):
+        if stats.last_poll is None:
+            # First page: posts over the time it spans
+            times = [post["created_utc"] for post in new_posts if "created_utc" in post]
+            span = now - min(times) if times else 0.0
+            stats.rate = len(times) / span if span > 0 else MIN_RATE
+            return
+        elapsed = now - stats.last_poll
+        if elapsed <= 0:
+            return
+        sample = len(new_posts) / elapsed
+        if new_posts and len(new_posts) >= stats.limit:
+            # A full page undercounts, the page itself shows how fast posts came
+            oldest = min(post.get("created_utc", now) for post in new_posts)
+            if now > oldest:
+                sample = max(sample, len(new_posts) / (now - oldest))
+        stats.rate = self.alpha * sample + (1 - self.alpha) * stats.rate
+
+    def _reschedule(self, stats: SubredditStats, now: float):
+        intervals = allocate_intervals(
+            {name: s.rate or MIN_RATE for name, s in self.stats.items()},
+            self.budget,
+            self.min_interval,
+            self.max_interval,
+        )
+        stats.interval = intervals[stats.name]
+        expected = stats.rate * stats.interval
+        stats.limit = min(max(math.ceil(2 * expected), self.min_limit), self.max_limit)
+        self._schedule(stats.name, now + stats.interval)
+
+    def run(
+        self,
+        handle: Callable[[List[Dict]], object],
+        until: Optional[float] = None,
+        sleep: Callable[[float], object] = time.sleep,
+    ):
+        """Poll forever, or until the clock reaches until, handing posts on
+
+        With a VirtualClock pass sleep=clock.advance to skip the waits.
+        """
+        while until is None or self.clock.now() < until:
+            wait = self.next_due() - self.clock.now()
+            if until is not None:
+                wait = min(wait, until - self.clock.now())
+            if wait > 0:
+                sleep(wait)
+            posts = self.poll_due()
+            if posts:
+                handle(posts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Poll subreddits into the database")
+    parser.add_argument("subreddits", nargs="+")
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=get_settings().reddit_requests_per_minute,
+        help="Requests per minute",
+    )
+    args = parser.parse_args()
+
+    from .database import SessionLocal, create_tables
+    from .reddit_client import RedditClient
+    from .service import ClusterService
+
+    create_tables()
+    service = ClusterService(SessionLocal)
+    scheduler = PollScheduler(RedditClient(), args.subreddits, budget=args.budget)
+
+    def handle(posts: List[Dict]):
+        created = sum(created for _, created in service.cluster_batch(posts))
+        print(f"📥 {len(posts)} posts, {created} new clusters")
+
+    print(f"🚀 Polling {len(args.subreddits)} subreddits, {args.budget:g} req/min")
+    try:
+        scheduler.run(handle)
+    except KeyboardInterrupt:
+        for stats in scheduler.stats.values():
+            summary = stats.to_dict()
+            print(
+                f"📊 r/{stats.name}: {summary['rate_per_hour']:.0f} posts/h, "
+                f"every {stats.interval:.0f}s, limit {stats.limit}, "
+                f"mean lag {summary['mean_lag']:.0f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+
+
+class PostIn(BaseModel):
+    """Reddit post as produced by RedditClient.get_new_posts"""
+
+    id: str
+    title: str
+    selftext: str = ""
+    url: str = ""
+    author: str = "[deleted]"
+    created_utc: Optional[float] = None
+    score: int = 0
+    subreddit: str
+    num_comments: int = 0
+    crosspost_parent: Optional[str] = None  # Fullname of the crossposted post
+
+
+class BatchIn(BaseModel):
+    posts: List[PostIn] = Field(..., max_length=1000)
+
+
+class ClusterAssignment(BaseModel):
+    post_id: str
+    cluster_id: int
+    created: bool  # True when the post started a new cluster
+
+
+class BatchOut(BaseModel):
+    assignments: List[ClusterAssignment]
+
+
+class ClusterOut(BaseModel):
+    id: int
+    title: Optional[str] = None
+    post_count: int
+    representative_post_id: Optional[str] = None
+    keywords: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class ClusterDetailOut(ClusterOut):
+    post_ids: List[str] = []
+
+
+class TrendingClusterOut(BaseModel):
+    id: int
+    title: Optional[str] = None
+    post_count: int  # Posts in the requested window
+    previous_post_count: int  # Posts in the window of equal length before it
+    total_score: int
+    total_comments: int
@@ -0,0 +1,577 @@
+import json
+import threading
+from datetime import datetime
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from .cascade import Deferred
+from .clustering import PostClusterer
+from .events import (
+    CLUSTER_CREATED,
+    CLUSTER_EXPIRED,
+    CLUSTER_MERGED,
+    POST_ADDED,
+    ClusterEvent,
+    ClusterEventBus,
+)
+from .maintenance import MaintenanceReport, maintainer_for
+from .models import Cluster, Post
+from .partitioned import PartitionedClusterer
+from .records import ClusterRecord
+from .rollups import (
+    RollupDeltas,
+    _upsert_insert,
+    merge_rollups,
+    split_rollups,
+    trending_query,
+    trending_to_dict,
+)
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class ClusterService:
+    """Long-lived clustering state shared by every API request.
+
+    The clusterer is not thread safe, so assignment runs under a lock. Callers
+    on the event loop hand the blocking methods to a worker thread. Reads
+    use async sessions when an async_session_factory is given, so they never
+    wait for a worker thread held up by ingestion.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        clusterer: Optional[PostClusterer] = None,
+        events: Optional[ClusterEventBus] = None,
+        async_session_factory: Optional[Callable[[], "AsyncSession"]] = None,
+    ):
+        self.session_factory = session_factory
+        self.async_session_factory = async_session_factory
+        self.clusterer = clusterer or PostClusterer(verbose=False)
+        self.events = events or ClusterEventBus()
+        if self.clusterer.post_loader is None:
+            self.clusterer.post_loader = self.load_post
+        self.maintainer = maintainer_for(self.clusterer)
+        self._lock = threading.Lock()
+        if self.clusterer.cascade is not None:
+            # Comments are fetched after a batch, never under the lock
+            self.clusterer.cascade.fetch_inline = False
+        self._resume_cluster_ids()
+
+    def _resume_cluster_ids(self):
+        """Continue numbering after clusters persisted by earlier runs"""
+        db = self.session_factory()
+        try:
+            max_id = db.query(func.max(Cluster.id)).scalar() or 0
+        finally:
+            db.close()
+        self.clusterer.next_cluster_id = max(self.clusterer.next_cluster_id, max_id + 1)
+
+    def cluster_post(self, post: Dict) -> Tuple[int, bool]:
+        """Assign a single post and persist the result"""
+        return self.cluster_batch([post])[0]
+
+    def cluster_batch(self, posts: List[Dict]) -> List[Tuple[int, bool]]:
+        """Assign posts in order and persist them in one transaction
+
+        Posts already stored, or repeated in the batch, are not clustered
+        again and report the cluster they are in. If the transaction fails,
+        the batch's assignments are undone in the clusterer too.
+        Gray-zone posts the cascade had no comments for are decided again
+        once their comments are fetched, outside the lock.
+        """
+        results = []
+        assigned: List[Tuple[Dict, int, bool]] = []
+        rollups = RollupDeltas()
+        with self._lock:
+            db = self.session_factory()
+            try:
+                stored = _stored_clusters(db, [post["id"] for post in posts])
+                for post in posts:
+                    if post["id"] in stored:
+                        results.append((stored[post["id"]], False))
+                        continue
+                    cluster_id, created = self.clusterer.assign_post(post)
+                    assigned.append((post, cluster_id, created))
+                    stored[post["id"]] = cluster_id
+                    self._persist(db, post, cluster_id, created)
+                    rollups.add_post(cluster_id, post, self.clusterer.clock.now())
+                    results.append((cluster_id, created))
+                records = self._persist_topics(
+                    db, {cluster_id for _, cluster_id, _ in assigned}
+                )
+                events = [
+                    self._assignment_event(
+                        post, cluster_id, created, records.get(cluster_id)
+                    )
+                    for post, cluster_id, created in assigned
+                ]
+                rollups.write(db)
+                db.commit()
+            except Exception:
+                db.rollback()
+                # Newest first, so each undo sees the state it left behind
+                for post, cluster_id, created in reversed(assigned):
+                    self.clusterer.unassign_post(post, cluster_id, created)
+                raise
+            finally:
+                db.close()
+                deferred = self._take_deferred()
+        # Only announce what has been committed
+        for event in events:
+            self.events.publish(event)
+        if deferred:
+            moved = self._redecide(
+                deferred,
+                {post["id"]: (cid, created) for post, cid, created in assigned},
+            )
+            results = [
+                moved.get(post["id"], result) for post, result in zip(posts, results)
+            ]
+        return results
+
+    def _take_deferred(self) -> List[Deferred]:
+        cascade = self.clusterer.cascade
+        return cascade.take_deferred() if cascade is not None else []
+
+    def _redecide(
+        self, deferred: List[Deferred], assigned: Dict[str, Tuple[int, bool]]
+    ) -> Dict[str, Tuple[int, bool]]:
+        """Decide deferred gray-zone posts again with their comments
+
+        Comments are fetched without the lock. A post whose refined score
+        crosses the threshold moves like a maintenance pass would move it:
+        out of its match into a new cluster, or, while it is still alone in
+        the cluster it started, into its match. Returns the posts that moved.
+        """
+        cascade = self.clusterer.cascade
+        cascade.prefetch(
+            post for match in deferred for post in (match.post, match.representative)
+        )
+        threshold = self.clusterer.similarity_threshold
+        report = MaintenanceReport()
+        moved = {}
+        with self._lock:
+            active = self.clusterer.active_clusters
+            for match in deferred:
+                cluster_id, created = assigned[match.post["id"]]
+                refined = cascade.rescore(match, threshold)
+                if refined is None or (refined > threshold) != created:
+                    continue
+                holder = self._holder(cluster_id)
+                if created:
+                    if (
+                        match.cluster_id in active
+                        and cluster_id in active
+                        and active[cluster_id].post_count == 1
+                        and holder is self._holder(match.cluster_id)
+                    ):
+                        report.merged[cluster_id] = match.cluster_id
+                        moved[match.post["id"]] = (match.cluster_id, False)
+                elif cluster_id in active:
+                    new_id = holder._allocate_cluster_id()
+                    report.split[new_id] = (cluster_id, [match.post["id"]])
+                    report.moved[new_id] = [match.post]
+                    moved[match.post["id"]] = (new_id, True)
+            if not report:
+                return {}
+            self._persist_maintenance(report)
+            for drop_id, keep_id in report.merged.items():
+                self._holder(keep_id).merge_clusters(keep_id, drop_id)
+            for new_id, (source_id, _) in report.split.items():
+                self._holder(source_id).split_cluster(
+                    source_id, report.moved[new_id], new_id
+                )
+            self.clusterer._enforce_budget()
+            self._persist_maintained_topics(report)
+        self._publish_maintenance(report)
+        return moved
+
+    def _holder(self, cluster_id: int) -> Optional[PostClusterer]:
+        """Clusterer holding a cluster, its partition in a PartitionedClusterer"""
+        if isinstance(self.clusterer, PartitionedClusterer):
+            return self.clusterer.owner(cluster_id)
+        return self.clusterer
+
+    def _assignment_event(
+        self,
+        post: Dict,
+        cluster_id: int,
+        created: bool,
+        cluster: Optional[ClusterRecord],
+    ) -> ClusterEvent:
+        return ClusterEvent(
+            CLUSTER_CREATED if created else POST_ADDED,
+            cluster_id,
+            post_count=cluster.post_count if cluster else 1,
+            post_id=post["id"],
+            title=cluster.headline if cluster else post["title"],
+        )
+
+    def expire_clusters(self) -> List[int]:
+        """Retire stale clusters from memory and notify subscribers"""
+        with self._lock:
+            expired = self.clusterer.expire_stale_clusters()
+        for cluster_id in expired:
+            self.events.publish(ClusterEvent(CLUSTER_EXPIRED, cluster_id))
+        return expired
+
+    def _persist(self, db: Session, post: Dict, cluster_id: int, created: bool):
+        now = self.clusterer.clock.datetime()
+        self._count_post(db, cluster_id, post, now)
+        db.add(
+            Post(
+                id=post["id"],
+                title=post["title"],
+                content=post.get("selftext", ""),
+                url=post.get("url", ""),
+                author=post.get("author"),
+                reddit_created_utc=post.get("created_utc"),
+                score=post.get("score", 0),
+                subreddit=post["subreddit"],
+                num_comments=post.get("num_comments", 0),
+                cluster_id=cluster_id,
+                processed=True,
+            )
+        )
+        # Flush so later posts in the same batch see this cluster row
+        db.flush()
+        if created:
+            # Set once the post exists, the row may predate it (see _count_post)
+            db.execute(
+                update(Cluster)
+                .where(Cluster.id == cluster_id)
+                .values(
+                    representative_post_id=post["id"],
+                    title=post["title"],
+                    created_at=now,
+                )
+            )
+
+    def _count_post(self, db: Session, cluster_id: int, post: Dict, now: datetime):
+        """Add a post to its cluster's stored count, creating the row if missing
+
+        With shared state another worker may be adding to the same cluster,
+        or may have created it without committing yet, so the count is
+        incremented in SQL and the row upserted rather than read first.
+        """
+        upsert_insert = _upsert_insert(db.get_bind().dialect.name)
+        if upsert_insert is not None:
+            statement = upsert_insert(Cluster).values(
+                id=cluster_id,
+                created_at=now,
+                updated_at=now,
+                post_count=1,
+                title=post["title"],
+            )
+            db.execute(
+                statement.on_conflict_do_update(
+                    index_elements=["id"],
+                    set_={
+                        "post_count": Cluster.post_count + 1,
+                        "updated_at": statement.excluded.updated_at,
+                    },
+                )
+            )
+            return
+        updated = db.execute(
+            update(Cluster)
+            .where(Cluster.id == cluster_id)
+            .values(post_count=Cluster.post_count + 1, updated_at=now)
+        )
+        if not updated.rowcount:
+            db.execute(
+                insert(Cluster).values(
+                    id=cluster_id,
+                    created_at=now,
+                    updated_at=now,
+                    post_count=1,
+                    title=post["title"],
+                )
+            )
+
+    def _persist_topics(
+        self, db: Session, cluster_ids: Iterable[int]
+    ) -> Dict[int, ClusterRecord]:
+        """Write keywords and headlines of changed clusters in one statement
+
+        Records are read fresh, with shared state another worker may have
+        changed them since. Returns them.
+        """
+        records = self.clusterer.current_clusters(cluster_ids)
+        rows = [
+            {
+                "id": cluster_id,
+                "keywords": json.dumps(cluster.ranked_keywords()),
+                "title": cluster.headline,
+            }
+            for cluster_id, cluster in records.items()
+        ]
+        if rows:
+            db.execute(update(Cluster), rows)
+        return records
+
+    def run_maintenance(self) -> MaintenanceReport:
+        """Merge converged clusters, split diverged ones and persist the result
+
+        Members of split candidates are read before taking the lock, and the
+        pass is stored before the clusterer changes, so a failed write
+        leaves memory as it was.
+        """
+        with self._lock:
+            candidates = self.maintainer.split_candidates()
+        members = self._load_members(candidates)
+        with self._lock:
+            report = self.maintainer.plan(members)
+            if report:
+                self._persist_maintenance(report)
+            self.maintainer.apply(report)
+            if report:
+                self._persist_maintained_topics(report)
+        self._publish_maintenance(report)
+        return report
+
+    def _publish_maintenance(self, report: MaintenanceReport):
+        for dropped, kept in report.merged.items():
+            self.events.publish(ClusterEvent(CLUSTER_MERGED, dropped, merged_into=kept))
+        touched = self.clusterer.current_clusters(_touched(report))
+        for cluster_id, cluster in touched.items():
+            self.events.publish(
+                ClusterEvent(
+                    POST_ADDED,
+                    cluster_id,
+                    cluster.post_count,
+                    title=cluster.headline,
+                )
+            )
+        for new_id, (_, post_ids) in report.split.items():
+            self.events.publish(
+                ClusterEvent(
+                    CLUSTER_CREATED, new_id, len(post_ids), post_id=post_ids[0]
+                )
+            )
+
+    def _load_members(self, cluster_ids: List[int]) -> Dict[int, List[Dict]]:
+        """Stored posts of each cluster, oldest first"""
+        members: Dict[int, List[Dict]] = {cluster_id: [] for cluster_id in cluster_ids}
+        if not cluster_ids:
+            return members
+        db = self.session_factory()
+        try:
+            for i in range(0, len(cluster_ids), 900):
+                posts = db.scalars(
+                    select(Post)
+                    .where(Post.cluster_id.in_(cluster_ids[i : i + 900]))
+                    .order_by(Post.reddit_created_utc, Post.id)
+                )
+                for post in posts:
+                    members[post.cluster_id].append(_post_to_dict(post))
+        finally:
+            db.close()
+        return members
+
+    def _persist_maintenance(self, report: MaintenanceReport):
+        """Store planned merges and splits, before they are applied"""
+        now = self.clusterer.clock.datetime()
+        db = self.session_factory()
+        try:
+            # Merges first, the posts they bring may be split off again
+            for dropped, kept in report.merged.items():
+                db.execute(
+                    update(Post)
+                    .where(Post.cluster_id == dropped)
+                    .values(cluster_id=kept)
+                )
+                merge_rollups(db, dropped, kept)
+                db.query(Cluster).filter(Cluster.id == dropped).delete()
+            for new_id, (source_id, post_ids) in report.split.items():
+                db.add(
+                    Cluster(
+                        id=new_id,
+                        representative_post_id=post_ids[0],
+                        created_at=now,
+                        updated_at=now,
+                        post_count=len(post_ids),
+                        title=report.moved[new_id][0]["title"],
+                    )
+                )
+                db.flush()
+                db.execute(
+                    update(Post).where(Post.id.in_(post_ids)).values(cluster_id=new_id)
+                )
+                split_rollups(db, source_id, new_id, post_ids)
+
+            for cluster_id in _touched(report):
+                db.execute(
+                    update(Cluster)
+                    .where(Cluster.id == cluster_id)
+                    .values(
+                        post_count=select(func.count())
+                        .where(Post.cluster_id == cluster_id)
+                        .scalar_subquery(),
+                        updated_at=now,
+                    )
+                )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _persist_maintained_topics(self, report: MaintenanceReport):
+        """Keywords and headlines of the clusters a pass changed, once applied"""
+        db = self.session_factory()
+        try:
+            self._persist_topics(db, _touched(report) | set(report.split))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def load_post(self, post_id: str) -> Optional[Dict]:
+        """Read a stored post back in the shape RedditClient produces"""
+        db = self.session_factory()
+        try:
+            post = db.get(Post, post_id)
+            return _post_to_dict(post) if post is not None else None
+        finally:
+            db.close()
+
+    def get_cluster(self, cluster_id: int) -> Optional[Dict]:
+        """Load a cluster and the IDs of its posts from the database"""
+        db = self.session_factory()
+        try:
+            cluster = db.get(Cluster, cluster_id)
+            if cluster is None:
+                return None
+            data = _cluster_to_dict(cluster)
+            data["post_ids"] = list(
+                db.scalars(select(Post.id).where(Post.cluster_id == cluster_id))
+            )
+            return data
+        finally:
+            db.close()
+
+    async def get_cluster_async(self, cluster_id: int) -> Optional[Dict]:
+        if self.async_session_factory is None:
+            return await run_in_threadpool(self.get_cluster, cluster_id)
+        async with self.async_session_factory() as db:
+            cluster = await db.get(Cluster, cluster_id)
+            if cluster is None:
+                return None
+            data = _cluster_to_dict(cluster)
+            data["post_ids"] = list(
+                await db.scalars(select(Post.id).where(Post.cluster_id == cluster_id))
+            )
+            return data
+
+    def list_clusters(self, limit: int = 50, offset: int = 0) -> List[Dict]:
+        """Most recently updated clusters first"""
+        db = self.session_factory()
+        try:
+            clusters = db.scalars(_recent_clusters(limit, offset))
+            return [_cluster_to_dict(cluster) for cluster in clusters]
+        finally:
+            db.close()
+
+    async def list_clusters_async(self, limit: int = 50, offset: int = 0) -> List[Dict]:
+        if self.async_session_factory is None:
+            return await run_in_threadpool(self.list_clusters, limit, offset)
+        async with self.async_session_factory() as db:
+            clusters = await db.scalars(_recent_clusters(limit, offset))
+            return [_cluster_to_dict(cluster) for cluster in clusters]
+
+    def trending_clusters(
+        self, hours: float = 1.0, subreddit: Optional[str] = None, limit: int = 20
+    ) -> List[Dict]:
+        """Clusters with the most new posts in the last hours, from rollups"""
+        db = self.session_factory()
+        try:
+            rows = db.execute(self._trending_query(hours, subreddit, limit))
+            return [trending_to_dict(row) for row in rows]
+        finally:
+            db.close()
+
+    async def trending_clusters_async(
+        self, hours: float = 1.0, subreddit: Optional[str] = None, limit: int = 20
+    ) -> List[Dict]:
+        if self.async_session_factory is None:
+            return await run_in_threadpool(
+                self.trending_clusters, hours, subreddit, limit
+            )
+        async with self.async_session_factory() as db:
+            rows = await db.execute(self._trending_query(hours, subreddit, limit))
+            return [trending_to_dict(row) for row in rows]
+
+    def _trending_query(self, hours: float, subreddit: Optional[str], limit: int):
+        now = self.clusterer.clock.now()
+        return trending_query(now - hours * 3600, now, subreddit, limit)
+
+
+def _stored_clusters(db: Session, post_ids: List[str]) -> Dict[str, int]:
+    """Cluster of each of these posts that is already stored"""
+    stored = {}
+    for i in range(0, len(post_ids), 900):
+        rows = db.execute(
+            select(Post.id, Post.cluster_id).where(Post.id.in_(post_ids[i : i + 900]))
+        )
+        stored.update(rows.all())
+    return stored
+
+
+def _touched(report: MaintenanceReport) -> Set[int]:
+    """Clusters that lost or gained posts in a maintenance pass"""
+    return set(report.merged.values()) | {source for source, _ in report.split.values()}
+
+
+def _recent_clusters(limit: int, offset: int):
+    """Most recently updated clusters first"""
+    return (
+        select(Cluster)
+        .order_by(Cluster.updated_at.desc(), Cluster.id.desc())
+        .offset(offset)
+        .limit(limit)
+    )
+
+
+def _post_to_dict(post: Post) -> Dict:
+    return {
+        "id": post.id,
+        "title": post.title,
+        "selftext": post.content or "",
+        "url": post.url or "",
+        "author": post.author,
+        "created_utc": post.reddit_created_utc,
+        "score": post.score,
+        "subreddit": post.subreddit,
+        "num_comments": post.num_comments,
+    }
+
+
+def _cluster_to_dict(cluster: Cluster) -> Dict:
+    return {
+        "id": cluster.id,
+        "title": cluster.title,
+        "post_count": cluster.post_count,
+        "representative_post_id": cluster.representative_post_id,
+        "keywords": cluster.keywords,
+        "created_at": cluster.created_at,
+        "updated_at": cluster.updated_at,
+    }
@@ -0,0 +1,140 @@
+import os
+import pickle
+import shelve
+import sys
+import tempfile
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set
+
+from .records import ClusterRecord
+from .topics import is_topic_term
+
+
+class SpillStore:
+    """Clusters evicted from memory, with an index to fault them back in
+
+    The index keeps only keyword and domain postings plus creation times,
+    so finding candidates never touches the records themselves. Stop words
+    are left out, nearly every cluster would share them. Subclasses provide
+    the record storage.
+    """
+
+    def __init__(self):
+        self._by_keyword: Dict[str, Set[int]] = {}
+        self._by_domain: Dict[str, Set[int]] = {}
+        self._created_at: Dict[int, float] = {}
+
+    def put(self, record: ClusterRecord):
+        self._write(record)
+        self._created_at[record.cluster_id] = record.created_at
+        for word in _indexed(record.keywords):
+            self._by_keyword.setdefault(word, set()).add(record.cluster_id)
+        if record.domain:
+            self._by_domain.setdefault(record.domain, set()).add(record.cluster_id)
+
+    def take(self, cluster_id: int) -> Optional[ClusterRecord]:
+        """Remove a record from the store and return it"""
+        if cluster_id not in self._created_at:
+            return None
+        record = self._read(cluster_id)
+        self._unindex(record)
+        self._delete(cluster_id)
+        return record
+
+    def candidates(
+        self, keywords: Iterable[str], domain: str = "", min_shared: int = 2
+    ) -> List[int]:
+        """Spilled clusters sharing the domain or enough keywords, best first"""
+        shared = Counter()
+        for word in _indexed(keywords):
+            for cluster_id in self._by_keyword.get(word, ()):
+                shared[cluster_id] += 1
+        matches = {cid for cid, count in shared.items() if count >= min_shared}
+        if domain:
+            matches.update(self._by_domain.get(domain, ()))
+        return sorted(matches, key=lambda cid: -shared[cid])
+
+    def expire(self, before: float) -> List[int]:
+        """Drop records created before a timestamp, returns their IDs"""
+        expired = [cid for cid, created in self._created_at.items() if created < before]
+        for cluster_id in expired:
+            self.take(cluster_id)
+        return expired
+
+    def _unindex(self, record: ClusterRecord):
+        del self._created_at[record.cluster_id]
+        for word in _indexed(record.keywords):
+            postings = self._by_keyword.get(word)
+            if postings is not None:
+                postings.discard(record.cluster_id)
+                if not postings:
+                    del self._by_keyword[word]
+        postings = self._by_domain.get(record.domain)
+        if postings is not None:
+            postings.discard(record.cluster_id)
+            if not postings:
+                del self._by_domain[record.domain]
+
+    def __contains__(self, cluster_id: int) -> bool:
+        return cluster_id in self._created_at
+
+    def __len__(self) -> int:
+        return len(self._created_at)
+
+    def _write(self, record: ClusterRecord):
+        raise NotImplementedError
+
+    def _read(self, cluster_id: int) -> ClusterRecord:
+        raise NotImplementedError
+
+    def _delete(self, cluster_id: int):
+        raise NotImplementedError
+
+
+def _indexed(keywords: Iterable[str]) -> List[str]:
+    """Keywords worth a posting in the candidate index"""
+    return [word for word in keywords if is_topic_term(word)]
+
+
+class MemorySpillStore(SpillStore):
+    """Keeps spilled records in a dict, for tests and small deployments"""
+
+    def __init__(self):
+        super().__init__()
+        self._records: Dict[int, ClusterRecord] = {}
+
+    def _write(self, record: ClusterRecord):
+        self._records[record.cluster_id] = record
+
+    def _read(self, cluster_id: int) -> ClusterRecord:
+        return self._records[cluster_id]
+
+    def _delete(self, cluster_id: int):
+        del self._records[cluster_id]
+
+
+class ShelveSpillStore(SpillStore):
+    """Pickles spilled records to a shelve file on local disk"""
+
+    def __init__(self, path: Optional[str] = None):
+        super().__init__()
+        if path is None:
+            path = os.path.join(tempfile.mkdtemp(prefix="clusterbot-"), "spill")
+        self.path = path
+        self._shelf = shelve.open(path, flag="n", protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _write(self, record: ClusterRecord):
+        self._shelf[str(record.cluster_id)] = record
+
+    def _read(self, cluster_id: int) -> ClusterRecord:
+        record = self._shelf[str(cluster_id)]
+        # Unpickled strings are fresh copies, share them again
+        record.keywords = tuple(sys.intern(word) for word in record.keywords)
+        record.domain = sys.intern(record.domain)
+        return record
+
+    def _delete(self, cluster_id: int):
+        del self._shelf[str(cluster_id)]
+
+    def close(self):
+        self._shelf.close()
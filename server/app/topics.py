@@ -0,0 +1,71 @@
+import heapq
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Tuple
+
+# Terms tracked per cluster for its keywords and headline
+TOP_TERMS = 8
+
+TITLE_WORD = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+# Min-heap of (count, word) holding a cluster's most used terms
+TermHeap = List[Tuple[int, str]]
+
+
+@lru_cache(maxsize=None)
+def stop_words() -> FrozenSet[str]:
+    """scikit-learn's English stop words, imported on first use"""
+    from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+    return ENGLISH_STOP_WORDS
+
+
+def is_topic_term(word: str) -> bool:
+    return word not in stop_words()
+
+
+def build_top_terms(term_counts: Dict[str, int], k: int = TOP_TERMS) -> TermHeap:
+    """Top-k heap from scratch, after counts went down (splits) or merged"""
+    heap = heapq.nlargest(
+        k,
+        ((count, word) for word, count in term_counts.items() if is_topic_term(word)),
+    )
+    heapq.heapify(heap)
+    return heap
+
+
+def bump_top_terms(heap: TermHeap, word: str, count: int, k: int = TOP_TERMS):
+    """Account for a term whose count just went up to `count`
+
+    Entries hold exact counts, so heap[0] is the real minimum: a term not
+    above it can't be in the top-k and is rejected in O(1), which is what
+    almost every term of an added post hits.
+    """
+    if len(heap) >= k and (count, word) <= heap[0]:
+        return
+    if not is_topic_term(word):
+        return
+    for index, (_, top_word) in enumerate(heap):
+        if top_word == word:
+            heap[index] = (count, word)
+            heapq.heapify(heap)
+            return
+    if len(heap) < k:
+        heapq.heappush(heap, (count, word))
+    else:
+        heapq.heapreplace(heap, (count, word))
+
+
+def ranked_terms(heap: TermHeap) -> List[str]:
+    """Top terms, most used first"""
+    return [word for _, word in sorted(heap, key=lambda entry: (-entry[0], entry[1]))]
+
+
+def title_words(title: str) -> FrozenSet[str]:
+    return frozenset(TITLE_WORD.findall(title.lower()))
+
+
+def headline_score(title: str, heap: TermHeap) -> int:
+    """How much of the cluster's top terms a title covers"""
+    words = title_words(title)
+    return sum(count for count, word in heap if word in words)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Compare bytes per active cluster for dict and ClusterRecord storage
+
+The "before" layout mirrors the original create_cluster, which kept a dict
+per cluster holding the whole representative post and a datetime.
+
+    python benchmarks/cluster_memory.py --clusters 20000
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+from datetime import datetime, timezone
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.clustering import PostClusterer  # noqa: E402
+from tests.sample_data.test_posts import get_all_posts  # noqa: E402
+
+
+def make_post(sample, i):
+    # Fresh strings per post, as if each were decoded from an API response
+    return {
+        "id": f"post_{i}",
+        "title": f"{sample['title']} #{i}",
+        "selftext": f"{sample['selftext']} {i}",
+        "url": f"{sample['url']}?v={i}",
+        "author": sample["author"],
+        "created_utc": sample["created_utc"] + i,
+        "score": sample["score"],
+        "subreddit": sample["subreddit"],
+        "num_comments": sample["num_comments"],
+    }
+
+
+def dict_clusters(samples, count):
+    clusterer = PostClusterer(verbose=False)
+    clusters = {}
+    for i in range(count):
+        post = make_post(samples[i % len(samples)], i)
+        clusters[i + 1] = {
+            "representative_post_id": post["id"],
+            "representative_post": post,
+            "domain": clusterer.extract_domain(post.get("url", "")),
+            "created_at": datetime.now(timezone.utc),
+            "post_count": 1,
+            "title": post["title"],
+        }
+    return clusters
+
+
+def record_clusters(samples, count):
+    clusterer = PostClusterer(verbose=False)
+    for i in range(count):
+        clusterer.create_cluster(make_post(samples[i % len(samples)], i))
+    return clusterer.active_clusters
+
+
+def measure(builder, samples, count) -> float:
+    gc.collect()
+    tracemalloc.start()
+    clusters = builder(samples, count)
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del clusters
+    return size / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clusters", type=int, default=20000)
+    args = parser.parse_args()
+
+    samples = get_all_posts()
+    before = measure(dict_clusters, samples, args.clusters)
+    after = measure(record_clusters, samples, args.clusters)
+
+    print(f"📊 {args.clusters} clusters")
+    print(f"   dict + full post: {before:,.0f} bytes/cluster")
+    print(f"   ClusterRecord:    {after:,.0f} bytes/cluster")
+    print(f"   saved {1 - after / before:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""Reader latency on SQLite while an ingest writer keeps the database busy
+
+A writer process commits batches of posts, keeping the database locked for
+--hold-ms per commit with BEGIN EXCLUSIVE, the lock SQLite takes to write
+pages back. A deferred transaction would only hold a RESERVED lock, which
+readers ignore, until a commit or a large write needs the exclusive one.
+It runs in its own process, like a second API worker or the recluster
+job, so readers only ever wait on database locks, not on the GIL. It
+rests --idle-ms between commits, as ingest does while it scores the
+next batch. Meanwhile --readers
+async tasks list clusters through ClusterService. Two setups are compared
+on scratch databases:
+
+- baseline: SQLite defaults (rollback journal, synchronous=FULL)
+- tuned: WAL + synchronous=NORMAL + busy_timeout, as the app configures
+
+    python benchmarks/db_concurrency.py --seconds 5 --readers 4
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import multiprocessing
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine, insert  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.ext.asyncio import (  # noqa: E402
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.async_database import async_url, make_async_engine  # noqa: E402
+from app.database import make_engine  # noqa: E402
+from app.models import Base, Cluster, Post  # noqa: E402
+from app.service import ClusterService  # noqa: E402
+
+
+def seed(engine, clusters: int):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(
+            insert(Cluster),
+            [
+                {"id": i, "post_count": 1, "title": f"cluster {i}"}
+                for i in range(1, clusters + 1)
+            ],
+        )
+
+
+def write_loop(
+    url: str, tuned: bool, stop, commits, batch: int, hold: float, idle: float
+):
+    engine = make_engine(url) if tuned else create_engine(url)
+    n = 0
+    while not stop.is_set():
+        with engine.connect() as connection:
+            connection.exec_driver_sql("BEGIN EXCLUSIVE")
+            connection.execute(
+                insert(Post),
+                [
+                    {
+                        "id": f"bench_{n + i}",
+                        "title": "Benchmark post",
+                        "subreddit": "bench",
+                        "cluster_id": 1,
+                    }
+                    for i in range(batch)
+                ],
+            )
+            time.sleep(hold)
+            connection.commit()
+        n += batch
+        with commits.get_lock():
+            commits.value += 1
+        time.sleep(idle)
+
+
+async def read_loop(service: ClusterService, deadline: float, latencies, failed):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            await service.list_clusters_async(limit=50)
+        except OperationalError:
+            # Gave up waiting for the writer's lock ("database is locked")
+            failed.append(time.perf_counter() - started)
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+async def run_readers(service, readers: int, seconds: float):
+    latencies, failed = [], []
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(
+        *(read_loop(service, deadline, latencies, failed) for _ in range(readers))
+    )
+    return latencies, failed
+
+
+def measure(name: str, url: str, tuned: bool, args) -> float:
+    engine = make_engine(url) if tuned else create_engine(url)
+    seed(engine, 500)
+    async_engine = (
+        make_async_engine(url) if tuned else create_async_engine(async_url(url))
+    )
+    service = ClusterService(
+        sessionmaker(bind=engine),
+        async_session_factory=async_sessionmaker(async_engine),
+    )
+    stop = multiprocessing.Event()
+    commits = multiprocessing.Value("i", 0)
+    writer = multiprocessing.Process(
+        target=write_loop,
+        args=(
+            url,
+            tuned,
+            stop,
+            commits,
+            args.batch,
+            args.hold_ms / 1000,
+            args.idle_ms / 1000,
+        ),
+    )
+    writer.start()
+    try:
+        latencies, failed = asyncio.run(
+            run_readers(service, args.readers, args.seconds)
+        )
+    finally:
+        stop.set()
+        writer.join()
+        asyncio.run(async_engine.dispose())
+        engine.dispose()
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(f"\n📊 {name}")
+    print(f"   reads:   {len(latencies) / args.seconds:,.0f}/s")
+    print(
+        f"   latency: p50 {statistics.median(latencies) * 1000:.1f} ms, "
+        f"p95 {p95:.1f} ms, max {latencies[-1] * 1000:.1f} ms"
+    )
+    print(f"   failed:  {len(failed)} reads timed out on the lock")
+    print(f"   writer:  {commits.value / args.seconds:.1f} commits/s")
+    return p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=2000, help="Posts per commit")
+    parser.add_argument("--hold-ms", type=float, default=20.0)
+    parser.add_argument("--idle-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="clusterbot-db-")
+    baseline_p95 = measure(
+        "baseline (rollback journal)",
+        f"sqlite:///{os.path.join(workdir, 'baseline.db')}",
+        False,
+        args,
+    )
+    tuned_p95 = measure(
+        "tuned (WAL)", f"sqlite:///{os.path.join(workdir, 'tuned.db')}", True, args
+    )
+
+    ratio = baseline_p95 / max(tuned_p95, 1e-9)
+    if ratio >= 1:
+        print(f"\n✅ WAL p95 read latency {ratio:.1f}x lower")
+    else:
+        print(f"\n⚠️  WAL p95 read latency {1 / ratio:.1f}x higher")
+
+
+if __name__ == "__main__":
+    main()
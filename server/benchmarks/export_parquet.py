@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Time and peak memory of the Parquet export on a synthetic database
+
+Seeds --posts posts over --days days and --subreddits subreddits, one
+cluster per 20 posts, into a scratch SQLite file, then runs a full export
+and an incremental one after a day of new posts.
+
+    python benchmarks/export_parquet.py --posts 1000000
+"""
+
+import argparse
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine, insert  # noqa: E402
+
+from app.export import export  # noqa: E402
+from app.models import Base, Cluster, Post  # noqa: E402
+
+POSTS_PER_CLUSTER = 20
+
+
+def seed(engine, count: int, days: float, subreddits: int, first: int = 0):
+    rng = random.Random(first)
+    end = time.time()
+    step = days * 86400 / count
+    with engine.begin() as connection:
+        for start in range(first, first + count, 50000):
+            stop = min(start + 50000, first + count)
+            clusters = []
+            for i in range(start, stop, POSTS_PER_CLUSTER):
+                created = datetime.fromtimestamp(
+                    end - (first + count - i) * step, timezone.utc
+                ).replace(tzinfo=None)
+                clusters.append(
+                    {
+                        "id": i // POSTS_PER_CLUSTER + 1,
+                        "title": f"Cluster {i}",
+                        "post_count": POSTS_PER_CLUSTER,
+                        "created_at": created,
+                        "updated_at": created,
+                    }
+                )
+            connection.execute(insert(Cluster), clusters)
+            connection.execute(
+                insert(Post),
+                [
+                    {
+                        "id": f"p{i}",
+                        "title": f"Synthetic post {i}",
+                        "content": "",
+                        "url": f"https://example.org/{i}",
+                        "author": f"user{rng.randrange(10000)}",
+                        "reddit_created_utc": end - (first + count - i) * step,
+                        "score": rng.randrange(1000),
+                        "num_comments": rng.randrange(200),
+                        "subreddit": f"sub{rng.randrange(subreddits)}",
+                        "cluster_id": i // POSTS_PER_CLUSTER + 1,
+                    }
+                    for i in range(start, stop)
+                ],
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=1000000)
+    parser.add_argument("--days", type=float, default=30.0)
+    parser.add_argument("--subreddits", type=int, default=10)
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp()
+    try:
+        engine = create_engine(f"sqlite:///{os.path.join(scratch, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        started = time.perf_counter()
+        seed(engine, args.posts, args.days, args.subreddits)
+        print(f"🌱 Seeded {args.posts} posts in {time.perf_counter() - started:.1f}s")
+
+        out_dir = os.path.join(scratch, "export")
+        started = time.perf_counter()
+        written = export(engine, out_dir, args.chunk_size, full=True)
+        full = time.perf_counter() - started
+
+        daily = int(args.posts / args.days)
+        seed(engine, daily, 1.0, args.subreddits, first=args.posts)
+        started = time.perf_counter()
+        incremental = export(engine, out_dir, args.chunk_size)
+        done = time.perf_counter() - started
+
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(
+            f"📊 Full: {written['posts']} posts, {written['clusters']} clusters "
+            f"in {full:.1f}s"
+        )
+        print(
+            f"   Incremental: {incremental['posts']} posts, "
+            f"{incremental['clusters']} clusters in {done:.1f}s"
+        )
+        print(f"   peak RSS {peak_mb:.0f} MB")
+    finally:
+        shutil.rmtree(scratch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Load test the clustering API with concurrent httpx clients
+
+Starts a local uvicorn server on a scratch SQLite database (unless --url is
+given), replays the sample posts with unique IDs and reports throughput and
+latency. Exits non-zero when throughput falls below the target.
+
+    python benchmarks/load_test.py --requests 2000 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from tests.sample_data.test_posts import get_all_posts  # noqa: E402
+
+# Minimum acceptable throughput on a single worker
+TARGET_SINGLE_RPS = 50.0
+TARGET_BATCH_POSTS_PER_SEC = 100.0
+
+
+def make_posts(count: int):
+    samples = get_all_posts()
+    posts = []
+    for i in range(count):
+        post = dict(samples[i % len(samples)])
+        post["id"] = f"load_{i}"
+        posts.append(post)
+    return posts
+
+
+def start_server(port: int, db_path: str) -> subprocess.Popen:
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}")
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=os.path.join(os.path.dirname(__file__), ".."),
+        env=env,
+    )
+
+
+def wait_for_server(url: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{url}/health").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not become healthy")
+
+
+async def run_single(url: str, posts, concurrency: int):
+    latencies = []
+    queue = asyncio.Queue()
+    for post in posts:
+        queue.put_nowait(post)
+
+    async def worker(client: httpx.AsyncClient):
+        while not queue.empty():
+            post = queue.get_nowait()
+            start = time.perf_counter()
+            response = await client.post(f"{url}/cluster", json=post)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    async with httpx.AsyncClient(timeout=60) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies
+
+
+async def run_batch(url: str, posts, batch_size: int, concurrency: int):
+    batches = [posts[i : i + batch_size] for i in range(0, len(posts), batch_size)]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(client: httpx.AsyncClient, batch):
+        async with semaphore:
+            response = await client.post(f"{url}/cluster/batch", json={"posts": batch})
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    async with httpx.AsyncClient(timeout=120) as client:
+        await asyncio.gather(*(send(client, batch) for batch in batches))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Existing server, e.g. http://127.0.0.1:8000")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--target-rps", type=float, default=TARGET_SINGLE_RPS)
+    parser.add_argument(
+        "--target-batch-rate", type=float, default=TARGET_BATCH_POSTS_PER_SEC
+    )
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    with tempfile.TemporaryDirectory() as tmp:
+        if url is None:
+            url = f"http://127.0.0.1:{args.port}"
+            server = start_server(args.port, os.path.join(tmp, "load.db"))
+        try:
+            wait_for_server(url)
+
+            posts = make_posts(args.requests)
+            elapsed, latencies = asyncio.run(run_single(url, posts, args.concurrency))
+            single_rps = len(posts) / elapsed
+            latencies.sort()
+            p95 = latencies[int(len(latencies) * 0.95) - 1]
+            print(f"📈 /cluster: {single_rps:.0f} req/s")
+            print(
+                f"   p50 {statistics.median(latencies) * 1000:.1f} ms,"
+                f" p95 {p95 * 1000:.1f} ms"
+            )
+
+            batch_posts = make_posts(args.requests * 2)[args.requests :]
+            elapsed = asyncio.run(
+                run_batch(url, batch_posts, args.batch_size, args.concurrency)
+            )
+            batch_rate = len(batch_posts) / elapsed
+            print(f"📈 /cluster/batch: {batch_rate:.0f} posts/s")
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    ok = single_rps >= args.target_rps and batch_rate >= args.target_batch_rate
+    print("✅ Throughput targets met" if ok else "❌ Below throughput targets")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
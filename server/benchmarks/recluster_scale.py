@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Time and peak memory of the offline re-clustering graph on synthetic posts
+
+Posts are sample titles with random filler words, spread evenly over
+--days days, fed through the same vectorize and graph steps as the job.
+
+    python benchmarks/recluster_scale.py --posts 1000000
+"""
+
+import argparse
+import os
+import random
+import resource
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from scipy.sparse.csgraph import connected_components  # noqa: E402
+
+from app.recluster import similarity_graph, vectorize_posts  # noqa: E402
+from tests.sample_data.test_posts import get_all_posts  # noqa: E402
+
+FILLER = "alpha bravo charlie delta echo foxtrot golf hotel india juliet kilo".split()
+
+
+def synthetic_chunks(count: int, days: float, chunk_size: int = 10000):
+    rng = random.Random(0)
+    titles = [post["title"] for post in get_all_posts()]
+    step = days * 86400 / count
+    for start in range(0, count, chunk_size):
+        chunk = []
+        for i in range(start, min(start + chunk_size, count)):
+            words = " ".join(rng.sample(FILLER, 3))
+            chunk.append((f"p{i}", f"{rng.choice(titles)} {words} {i}", i * step))
+        yield chunk
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=100000)
+    parser.add_argument("--days", type=float, default=30.0)
+    parser.add_argument("--threshold", type=float, default=0.3)
+    parser.add_argument("--workers", type=int, help="One per CPU by default")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    post_ids, timestamps, vectors = vectorize_posts(
+        synthetic_chunks(args.posts, args.days), workers=args.workers
+    )
+    vectorized = time.perf_counter()
+    graph = similarity_graph(vectors, timestamps, args.threshold)
+    count, _ = connected_components(graph, directed=False)
+    done = time.perf_counter()
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"📊 {len(post_ids)} posts -> {count} clusters, {graph.nnz} edges")
+    print(f"   vectorize {vectorized - start:.1f}s, graph {done - vectorized:.1f}s")
+    print(f"   peak RSS {peak_mb:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
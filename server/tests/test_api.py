@@ -0,0 +1,101 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.service import ClusterService
+from tests.sample_data.test_posts import get_earthquake_posts, get_tech_posts
+
+
+@pytest.fixture
+def client(session_factory):
+    service = ClusterService(session_factory)
+    with TestClient(create_app(service)) as test_client:
+        yield test_client
+
+
+def test_single_post_endpoint(client):
+    eq_posts = get_earthquake_posts()
+
+    first = client.post("/cluster", json=eq_posts[0]).json()
+    assert first == {"post_id": eq_posts[0]["id"], "cluster_id": 1, "created": True}
+
+    second = client.post("/cluster", json=eq_posts[1]).json()
+    assert second["cluster_id"] == 1
+    assert second["created"] is False
+
+
+def test_batch_and_lookup(client):
+    posts = get_earthquake_posts() + get_tech_posts()
+    response = client.post("/cluster/batch", json={"posts": posts})
+    assert response.status_code == 200
+
+    assignments = response.json()["assignments"]
+    assert [a["post_id"] for a in assignments] == [p["id"] for p in posts]
+
+    eq_cluster = assignments[0]["cluster_id"]
+    detail = client.get(f"/clusters/{eq_cluster}").json()
+    assert detail["post_count"] == len(detail["post_ids"])
+    assert posts[0]["id"] in detail["post_ids"]
+
+    listed = client.get("/clusters").json()
+    assert {c["id"] for c in listed} == {a["cluster_id"] for a in assignments}
+
+    assert client.get("/clusters/9999").status_code == 404
+    # Sample posts are years old, so nothing is trending now
+    assert client.get("/clusters/trending", params={"hours": 2}).json() == []
+
+
+def test_cluster_ids_resume_after_restart(session_factory):
+    eq_posts = get_earthquake_posts()
+    ClusterService(session_factory).cluster_post(eq_posts[0])
+
+    # A fresh service must not hand out IDs already stored in the database
+    cluster_id, created = ClusterService(session_factory).cluster_post(
+        get_tech_posts()[0]
+    )
+    assert created
+    assert cluster_id == 2
+
+
+def test_representative_post_loaded_from_storage(session_factory):
+    service = ClusterService(session_factory)
+    post = get_earthquake_posts()[0]
+    cluster_id, _ = service.cluster_post(post)
+
+    # Only the compact record stays in memory
+    assert not hasattr(service.clusterer.active_clusters[cluster_id], "__dict__")
+    loaded = service.clusterer.get_representative_post(cluster_id)
+    assert loaded["selftext"] == post["selftext"]
+
+
+def test_resubmitted_posts_are_not_counted_twice(session_factory):
+    posts = get_earthquake_posts()
+    first = ClusterService(session_factory).cluster_batch(posts)
+
+    # A restarted poller sends the same posts again, one of them twice
+    service = ClusterService(session_factory)
+    again = service.cluster_batch(posts + posts[:1])
+    assert again == [(cluster_id, False) for cluster_id, _ in first + first[:1]]
+    assert not service.clusterer.active_clusters
+
+    detail = service.get_cluster(first[0][0])
+    assert detail["post_count"] == len(detail["post_ids"])
+
+
+def test_failed_batch_is_undone_in_memory(session_factory):
+    service = ClusterService(session_factory)
+    eq_posts = get_earthquake_posts()
+    (cluster_id, _), *_ = service.cluster_batch(eq_posts[:2])
+
+    broken = dict(get_tech_posts()[0], subreddit=None)  # Violates NOT NULL
+    with pytest.raises(Exception):
+        service.cluster_batch([eq_posts[2], broken])
+    assert list(service.clusterer.active_clusters) == [cluster_id]
+    assert service.clusterer.active_clusters[cluster_id].post_count == 2
+
+    service.cluster_batch(eq_posts[2:])
+    detail = service.get_cluster(cluster_id)
+    assert service.clusterer.active_clusters[cluster_id].post_count == (
+        detail["post_count"]
+    )
+    assert detail["post_count"] == len(detail["post_ids"])
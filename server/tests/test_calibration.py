@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from app.calibration import (
+    SimilarityMatrices,
+    load_labeled_posts,
+    pairwise_scores,
+    parse_grid,
+    simulate,
+    sweep,
+)
+from app.clustering import PostClusterer
+
+SAMPLE_POSTS = os.path.join(
+    os.path.dirname(__file__), "sample_data", "sample_posts.json"
+)
+
+
+@pytest.fixture(scope="module")
+def matrices():
+    return SimilarityMatrices.compute(*load_labeled_posts(SAMPLE_POSTS))
+
+
+def same_partition(a, b):
+    pairs = set(zip(a, b))
+    return len(pairs) == len(set(a)) == len(set(b))
+
+
+@pytest.mark.parametrize(
+    "threshold, boost, prefilter", [(0.25, 0.15, 0.2), (0.1, 0.0, 0.0), (0.6, 0.3, 0.3)]
+)
+def test_replay_matches_clusterer(matrices, threshold, boost, prefilter):
+    posts, _ = load_labeled_posts(SAMPLE_POSTS)
+    clusterer = PostClusterer(verbose=False)
+    clusterer.similarity_threshold = threshold
+    clusterer.event_boost = boost
+    clusterer.keyword_prefilter = prefilter
+    actual = [clusterer.assign_post(post)[0] for post in posts]
+
+    replayed, _ = simulate(matrices, threshold, boost, prefilter)
+    assert same_partition(actual, replayed.tolist())
+
+
+def test_pairwise_scores():
+    assert pairwise_scores([0, 0, 1, 1], ["a", "a", "b", "b"]) == (1.0, 1.0)
+    # One wrong merge: 1 of 3 predicted pairs is right, the 1 true pair is found
+    assert pairwise_scores([0, 0, 0], ["a", "a", "b"]) == (1 / 3, 1.0)
+    assert pairwise_scores([0, 1, 2], ["a", "a", "b"]) == (1.0, 0.0)
+
+
+def test_sweep_in_parallel(matrices):
+    assert parse_grid("0.1:0.3:0.1") == [0.1, 0.2, 0.3]
+    grid = ([0.1, 0.25, 0.6], [0.0, 0.15], [0.0, 0.2])
+    results = sweep(matrices, *grid, workers=2)
+    assert len(results) == 12
+
+    def settings(rows):
+        return [(r["threshold"], r["event_boost"], r["f1"]) for r in rows]
+
+    assert settings(results) == settings(sweep(matrices, *grid, workers=1))
+    assert results[0]["f1"] == max(result["f1"] for result in results)
+    loose = [r for r in results if r["keyword_prefilter"] == 0.0]
+    strict = [r for r in results if r["keyword_prefilter"] == 0.2]
+    # A stricter prefilter never makes more title comparisons
+    assert max(r["comparisons_per_post"] for r in strict) <= min(
+        r["comparisons_per_post"] for r in loose
+    )
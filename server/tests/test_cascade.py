@@ -0,0 +1,147 @@
+import threading
+
+from app.cascade import CascadeScorer
+from app.clustering import PostClusterer
+from app.models import Cluster, Post
+from app.service import ClusterService
+from tests.sample_data.test_posts import get_earthquake_posts, get_tech_posts
+
+
+class CountingLoader:
+    def __init__(self, comments):
+        self.comments = comments
+        self.calls = []
+
+    def __call__(self, post_id):
+        self.calls.append(post_id)
+        return self.comments.get(post_id, [])
+
+
+def setup(comments=None, **options):
+    loader = CountingLoader(comments or {})
+    cascade = CascadeScorer(comment_loader=loader, **options)
+    posts = {}
+    clusterer = PostClusterer(verbose=False, post_loader=posts.get, cascade=cascade)
+    return clusterer, cascade, loader, posts
+
+
+def test_clear_scores_skip_the_expensive_stage():
+    clusterer, cascade, loader, posts = setup()
+    eq_post = get_earthquake_posts()[0]
+    posts[eq_post["id"]] = eq_post
+    cluster_id = clusterer.create_cluster(eq_post)
+
+    tech_post = get_tech_posts()[0]
+    assert cascade.refine(clusterer, tech_post, cluster_id, 0.9) == 0.9
+    assert cascade.refine(clusterer, tech_post, cluster_id, 0.01) == 0.01
+    assert loader.calls == []
+    assert (cascade.checked, cascade.refined) == (2, 0)
+
+
+def test_gray_zone_decided_by_context():
+    eq_posts = get_earthquake_posts()
+    comments = {
+        eq_posts[0]["id"]: [{"body": "Tsunami sirens going off in Sendai right now"}],
+        "related": [{"body": "Sendai tsunami sirens are deafening"}],
+    }
+    clusterer, cascade, loader, posts = setup(comments)
+    posts[eq_posts[0]["id"]] = eq_posts[0]
+    cluster_id = clusterer.create_cluster(eq_posts[0])
+
+    # Worded differently, but quoting the same report
+    related = dict(eq_posts[0], id="related", title=eq_posts[1]["title"])
+    unrelated = dict(get_tech_posts()[0], id="unrelated")
+    threshold = clusterer.similarity_threshold
+    assert cascade.refine(clusterer, related, cluster_id, threshold - 0.05) > threshold
+    assert cascade.refine(clusterer, unrelated, cluster_id, threshold + 0.05) < (
+        threshold
+    )
+    assert cascade.flipped == 2
+
+    # The representative's context is fetched once and reused
+    assert loader.calls == ["related", eq_posts[0]["id"], "unrelated"]
+
+
+def test_cascade_runs_inside_assignment():
+    clusterer, cascade, _, posts = setup(band=1.0)
+    eq_posts = get_earthquake_posts()
+    for post in eq_posts:
+        posts[post["id"]] = post
+        clusterer.assign_post(post)
+    # Every match was in the (very wide) gray zone and rescored
+    assert cascade.refined == cascade.checked > 0
+
+
+def test_context_cache_is_bounded():
+    _, cascade, loader, _ = setup(cache_size=2)
+    posts = get_earthquake_posts()[:3]
+    for post in posts:
+        cascade.context(post)
+    cascade.context(posts[0])
+    assert len(cascade._contexts) == 2
+    assert loader.calls.count(posts[0]["id"]) == 2
+
+
+def test_prefetch_is_capped_and_waits_for_no_slow_fetch():
+    release = threading.Event()
+
+    def slow_loader(post_id):
+        release.wait(5)
+        return []
+
+    cascade = CascadeScorer(comment_loader=slow_loader, fetch_timeout=0.05)
+    cascade.fetch_inline = False
+    posts = {}
+    clusterer = PostClusterer(verbose=False, post_loader=posts.get, cascade=cascade)
+    eq_posts = get_earthquake_posts()
+    posts[eq_posts[0]["id"]] = eq_posts[0]
+    cluster_id = clusterer.create_cluster(eq_posts[0])
+
+    # Without its context the post keeps the cheap score, for now
+    threshold = clusterer.similarity_threshold
+    assert cascade.refine(clusterer, eq_posts[1], cluster_id, threshold) == threshold
+    (deferred,) = cascade.take_deferred()
+    assert cascade.prefetch([deferred.post, deferred.representative]) == 0
+    release.set()
+    assert cascade.rescore(deferred, threshold) is None
+    assert (cascade.refined, cascade.skipped) == (0, 1)
+
+    _, cascade, loader, _ = setup(max_fetches=2)
+    assert cascade.prefetch(eq_posts) == 2
+    assert len(loader.calls) == 2
+
+
+def test_service_decides_gray_zone_again_outside_the_lock(session_factory):
+    eq_posts = get_earthquake_posts()
+    loader = CountingLoader(
+        {
+            eq_posts[0]["id"]: [
+                {"body": "Tsunami sirens going off in Sendai right now"}
+            ],
+            "related": [{"body": "Sendai tsunami sirens are deafening"}],
+        }
+    )
+    cascade = CascadeScorer(band=1.0)
+    clusterer = PostClusterer(similarity_threshold=0.45, verbose=False, cascade=cascade)
+    service = ClusterService(session_factory, clusterer)
+    held = []
+
+    def loader_outside_lock(post_id):
+        held.append(service._lock.locked())
+        return loader(post_id)
+
+    cascade.comment_loader = loader_outside_lock
+    ((cluster_id, _),) = service.cluster_batch(eq_posts[:1])
+
+    # Its title alone falls short, the comments it shares carry it over
+    related = dict(eq_posts[0], id="related", title=eq_posts[1]["title"])
+    related["url"] = "https://example.org/sendai"
+    assert service.cluster_batch([related]) == [(cluster_id, False)]
+
+    assert held and not any(held)
+    assert cascade.flipped == 1
+    assert list(clusterer.active_clusters) == [cluster_id]
+    db = session_factory()
+    assert db.get(Post, "related").cluster_id == cluster_id
+    assert [(c.id, c.post_count) for c in db.query(Cluster)] == [(cluster_id, 2)]
+    db.close()
@@ -129,9 +129,9 @@ def test_clustering_with_sample_data():
     print(f"Similarity threshold: {clusterer.similarity_threshold}")
 
     # Show cluster distribution
-    for cluster_id, cluster_data in clusterer.active_clusters.items():
+    for cluster_id, cluster in clusterer.active_clusters.items():
         print(
-            f"Cluster {cluster_id}: {cluster_data['post_count']} posts - '{cluster_data['title'][:40]}...'"
+            f"Cluster {cluster_id}: {cluster.post_count} posts - '{cluster.title[:40]}...'"
         )
 
 
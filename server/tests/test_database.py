@@ -0,0 +1,93 @@
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from app.async_database import async_url, make_async_engine
+from app.clustering import PostClusterer
+from app.database import engine_options, make_engine
+from app.models import Base, Cluster
+from app.service import ClusterService
+from tests.sample_data.test_posts import get_earthquake_posts, get_tech_posts
+
+
+def pragmas(connection):
+    return [
+        connection.execute(text(f"PRAGMA {name}")).scalar()
+        for name in ("journal_mode", "synchronous", "busy_timeout")
+    ]
+
+
+def test_sqlite_connections_use_wal(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'clusters.db'}")
+    with engine.connect() as connection:
+        assert pragmas(connection) == ["wal", 1, 5000]
+
+    async def async_pragmas():
+        async_engine = make_async_engine(f"sqlite:///{tmp_path / 'clusters.db'}")
+        async with async_engine.connect() as connection:
+            result = await connection.run_sync(pragmas)
+        await async_engine.dispose()
+        return result
+
+    assert asyncio.run(async_pragmas()) == ["wal", 1, 5000]
+
+
+def test_engine_options():
+    assert "pool_size" not in engine_options("sqlite://")
+    assert engine_options("sqlite:///clusters.db")["pool_size"] == 5
+    assert engine_options("postgresql+asyncpg://db/clusters")["connect_args"] == {
+        "statement_cache_size": 256
+    }
+    assert async_url("sqlite:///./clusters.db") == "sqlite+aiosqlite:///./clusters.db"
+    assert async_url("postgresql://u:p@db/c") == "postgresql+asyncpg://u:p@db/c"
+
+
+def test_async_reads_match_sync_reads(tmp_path):
+    url = f"sqlite:///{tmp_path / 'clusters.db'}"
+    engine = make_engine(url)
+    Base.metadata.create_all(bind=engine)
+    async_engine = make_async_engine(url)
+    service = ClusterService(
+        sessionmaker(bind=engine),
+        PostClusterer(verbose=False),
+        async_session_factory=async_sessionmaker(async_engine),
+    )
+    results = service.cluster_batch(get_earthquake_posts() + get_tech_posts())
+    cluster_id = results[0][0]
+
+    async def reads():
+        try:
+            return (
+                await service.list_clusters_async(limit=10),
+                await service.get_cluster_async(cluster_id),
+                await service.get_cluster_async(9999),
+            )
+        finally:
+            await async_engine.dispose()
+
+    clusters, detail, missing = asyncio.run(reads())
+    assert clusters == service.list_clusters(limit=10)
+    assert detail == service.get_cluster(cluster_id)
+    assert missing is None
+
+
+def test_join_before_the_creating_worker_commits(session_factory):
+    # Two workers on shared state, the first has not stored its new cluster
+    clusterer = PostClusterer(verbose=False)
+    creator = ClusterService(session_factory, clusterer)
+    joiner = ClusterService(session_factory, clusterer)
+    eq_posts = get_earthquake_posts()
+    cluster_id = clusterer.create_cluster(eq_posts[0])
+
+    assert joiner.cluster_batch(eq_posts[1:2]) == [(cluster_id, False)]
+    db = session_factory()
+    creator._persist(db, eq_posts[0], cluster_id, True)
+    db.commit()
+
+    cluster = db.get(Cluster, cluster_id)
+    assert cluster.post_count == 2
+    assert cluster.representative_post_id == eq_posts[0]["id"]
+    assert cluster.title == eq_posts[0]["title"]
+    db.close()
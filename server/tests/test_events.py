@@ -0,0 +1,142 @@
+import asyncio
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app.events import (
+    CLUSTER_CREATED,
+    POST_ADDED,
+    ClusterEvent,
+    ClusterEventBus,
+)
+from app.main import create_app
+from app.service import ClusterService
+from tests.sample_data.test_posts import get_earthquake_posts
+
+
+def test_rapid_updates_coalesce():
+    async def scenario():
+        bus = ClusterEventBus()
+        subscription = bus.subscribe()
+        bus.publish(ClusterEvent(CLUSTER_CREATED, 1, post_count=1))
+        for count in range(2, 6):
+            bus.publish(ClusterEvent(POST_ADDED, 1, post_count=count))
+        bus.publish(ClusterEvent(POST_ADDED, 2, post_count=7))
+        await asyncio.sleep(0)
+
+        received = [await subscription.get() for _ in range(len(subscription))]
+        return [(e.type, e.cluster_id, e.post_count) for e in received]
+
+    assert asyncio.run(scenario()) == [
+        (CLUSTER_CREATED, 1, 1),
+        (POST_ADDED, 1, 5),
+        (POST_ADDED, 2, 7),
+    ]
+
+
+def test_buffer_is_bounded():
+    async def scenario():
+        bus = ClusterEventBus(max_buffer=3)
+        subscription = bus.subscribe()
+        for cluster_id in range(1, 11):
+            bus.publish(ClusterEvent(CLUSTER_CREATED, cluster_id))
+        await asyncio.sleep(0)
+        return subscription
+
+    subscription = asyncio.run(scenario())
+    assert len(subscription) == 3
+    assert subscription.dropped == 7
+
+
+def test_publish_from_worker_thread():
+    async def scenario():
+        bus = ClusterEventBus()
+        subscription = bus.subscribe()
+        threading.Thread(
+            target=bus.publish, args=(ClusterEvent(CLUSTER_CREATED, 42),)
+        ).start()
+        return await asyncio.wait_for(subscription.get(), 5)
+
+    assert asyncio.run(scenario()).cluster_id == 42
+
+
+def test_websocket_receives_cluster_events(session_factory):
+    service = ClusterService(session_factory)
+    eq_posts = get_earthquake_posts()
+
+    with TestClient(create_app(service)) as client:
+        with client.websocket_connect("/ws/clusters") as websocket:
+            deadline = time.time() + 5
+            while service.events.subscriber_count == 0 and time.time() < deadline:
+                time.sleep(0.01)
+
+            client.post("/cluster", json=eq_posts[0])
+            event = websocket.receive_json()
+            assert event["type"] == CLUSTER_CREATED
+            assert event["post_id"] == eq_posts[0]["id"]
+
+            client.post("/cluster", json=eq_posts[1])
+            event = websocket.receive_json()
+            assert event["type"] == POST_ADDED
+            assert event["post_count"] == 2
+
+
+def test_idle_websocket_unsubscribes_on_disconnect(session_factory):
+    service = ClusterService(session_factory)
+    app = create_app(service)
+    app.state.service = service
+
+    async def scenario():
+        incoming = asyncio.Queue()
+        incoming.put_nowait({"type": "websocket.connect"})
+
+        async def send(message):
+            if message["type"] == "websocket.accept":
+                # The client goes away before any event is published
+                incoming.put_nowait({"type": "websocket.disconnect", "code": 1000})
+
+        scope = {
+            "type": "websocket",
+            "path": "/ws/clusters",
+            "root_path": "",
+            "scheme": "ws",
+            "query_string": b"",
+            "headers": [],
+            "subprotocols": [],
+        }
+        await asyncio.wait_for(app(scope, incoming.get, send), 5)
+
+    asyncio.run(scenario())
+    assert service.events.subscriber_count == 0
+
+
+def test_idle_event_stream_unsubscribes_on_disconnect(session_factory):
+    service = ClusterService(session_factory)
+    app = create_app(service)
+    app.state.service = service
+
+    async def scenario():
+        incoming = asyncio.Queue()
+        incoming.put_nowait({"type": "http.request", "body": b"", "more_body": False})
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                # The client goes away before any event or keep-alive is sent
+                incoming.put_nowait({"type": "http.disconnect"})
+
+        scope = {
+            "type": "http",
+            # Servers on ASGI 2.4 leave noticing disconnects to the app
+            "asgi": {"version": "3.0", "spec_version": "2.4"},
+            "method": "GET",
+            "path": "/events",
+            "root_path": "",
+            "scheme": "http",
+            "query_string": b"",
+            "headers": [],
+        }
+        await asyncio.wait_for(app(scope, incoming.get, send), 5)
+
+    asyncio.run(scenario())
+    assert service.events.subscriber_count == 0
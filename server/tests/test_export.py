@@ -0,0 +1,102 @@
+import os
+from datetime import datetime
+
+import pyarrow.dataset as ds
+
+from app.export import export, read_watermark
+from app.models import Cluster, Post
+
+DAY = 86400
+# 2024-03-01 00:00 UTC
+START = 1709251200.0
+
+
+def add_posts(session, ids, day, subreddit="news", cluster_id=None):
+    for post_id in ids:
+        session.add(
+            Post(
+                id=post_id,
+                title=f"Title {post_id}",
+                subreddit=subreddit,
+                reddit_created_utc=START + day * DAY + 60,
+                score=1,
+                num_comments=2,
+                cluster_id=cluster_id,
+            )
+        )
+
+
+def add_cluster(session, day, title="Cluster"):
+    cluster = Cluster(
+        title=title,
+        created_at=datetime.utcfromtimestamp(START + day * DAY + 60),
+        updated_at=datetime.utcfromtimestamp(START + day * DAY + 60),
+    )
+    session.add(cluster)
+    session.flush()
+    return cluster.id
+
+
+def read(out_dir, table):
+    return ds.dataset(
+        os.path.join(out_dir, table), format="parquet", partitioning="hive"
+    ).to_table()
+
+
+def test_full_export_is_partitioned(session_factory, tmp_path):
+    with session_factory() as session:
+        cluster_id = add_cluster(session, 0)
+        add_posts(session, ["a", "b"], 0, cluster_id=cluster_id)
+        add_posts(session, ["c"], 1, subreddit="worldnews")
+        session.commit()
+
+    out_dir = str(tmp_path)
+    written = export(session_factory.kw["bind"], out_dir, chunk_size=2)
+    assert written == {"posts": 3, "clusters": 1}
+
+    assert os.path.isdir(tmp_path / "posts" / "date=2024-03-01" / "subreddit=news")
+    assert os.path.isdir(tmp_path / "posts" / "date=2024-03-02" / "subreddit=worldnews")
+    posts = read(out_dir, "posts").to_pandas().sort_values("id")
+    assert list(posts["id"]) == ["a", "b", "c"]
+    assert list(posts["cluster_id"].fillna(-1)) == [cluster_id, cluster_id, -1]
+    assert posts["created_utc"].iloc[0].timestamp() == START + 60
+
+    clusters = read(out_dir, "clusters").to_pydict()
+    assert clusters["id"] == [cluster_id]
+    assert clusters["date"] == ["2024-03-01"]
+    assert read_watermark(out_dir)["posts"] == START + DAY + 60
+
+
+def test_incremental_export_rewrites_recent_days_only(session_factory, tmp_path):
+    out_dir = str(tmp_path)
+    with session_factory() as session:
+        add_posts(session, ["old1", "old2"], 0)
+        add_posts(session, ["recent"], 5)
+        cluster_id = add_cluster(session, 5)
+        session.commit()
+    export(session_factory.kw["bind"], out_dir)
+    old_files = os.listdir(tmp_path / "posts" / "date=2024-03-01" / "subreddit=news")
+
+    with session_factory() as session:
+        add_posts(session, ["late"], 5)
+        add_posts(session, ["new"], 6)
+        session.get(Post, "recent").cluster_id = cluster_id
+        session.commit()
+    written = export(session_factory.kw["bind"], out_dir)
+
+    # Days 4 to 6 are re-read, day 0 is left as it was
+    assert written["posts"] == 3
+    assert os.listdir(tmp_path / "posts" / "date=2024-03-01" / "subreddit=news") == (
+        old_files
+    )
+    posts = read(out_dir, "posts").to_pandas().set_index("id")
+    assert sorted(posts.index) == ["late", "new", "old1", "old2", "recent"]
+    assert posts.loc["recent", "cluster_id"] == cluster_id
+    assert read(out_dir, "clusters").num_rows == 1
+
+    # A full export starts over and gives the same rows
+    assert export(session_factory.kw["bind"], out_dir, full=True) == {
+        "posts": 5,
+        "clusters": 1,
+    }
+    assert read(out_dir, "posts").num_rows == 5
@@ -0,0 +1,60 @@
+import itertools
+import re
+
+from app.clustering import PostClusterer
+from app.features import NO_EVENT, extract_event_features
+from tests.sample_data.test_posts import get_all_posts
+
+
+def legacy_event_match(title1: str, title2: str) -> bool:
+    """The nested-loop check the feature matcher replaced"""
+    t1, t2 = title1.lower(), title2.lower()
+    events = ["earthquake", "tsunami", "hurricane", "typhoon", "tornado", "flood"]
+    events.append("wildfire")
+    if not any(e in t1 and e in t2 for e in events):
+        return False
+    places = ["japan", "california", "florida", "texas", "china", "india"]
+    places += ["europe", "australia"]
+    if any(p in t1 and p in t2 for p in places):
+        return True
+    numbers1 = re.findall(r"\d+(?:\.\d+)?", title1)
+    numbers2 = re.findall(r"\d+(?:\.\d+)?", title2)
+    return any(abs(float(a) - float(b)) < 0.5 for a in numbers1 for b in numbers2)
+
+
+def test_matches_legacy_on_sample_titles():
+    titles = [post["title"] for post in get_all_posts()]
+    titles += [
+        "Typhoon approaching Okinawa",
+        "Okinawa typhoon: schools closed",
+        "Texas flood waters rise 3.9 feet",
+        "Flood in Texas",
+        "Flood warning 4.3 inches expected",
+    ]
+    for title1, title2 in itertools.combinations(titles, 2):
+        features1 = extract_event_features(title1)
+        features2 = extract_event_features(title2)
+        expected = legacy_event_match(title1, title2)
+        # Japanese cities are now locations too, which can only add matches
+        if expected:
+            assert features1.matches(features2), (title1, title2)
+
+
+def test_number_window():
+    quake = extract_event_features("Magnitude 7.2 earthquake")
+    assert quake.matches(extract_event_features("7.6 earthquake felt offshore"))
+    assert not quake.matches(extract_event_features("7.7 earthquake felt offshore"))
+    assert quake.matches(extract_event_features("earthquake: 3 dead, 6.8 magnitude"))
+
+
+def test_titles_without_event_share_features():
+    assert extract_event_features("Tesla announces new Model Y") is NO_EVENT
+
+
+def test_preprocess_uses_same_locations():
+    clusterer = PostClusterer()
+    # California is an event-match location, so preprocessing boosts it too
+    assert (
+        clusterer.preprocess_text("Wildfire spreads in California").count("california")
+        > 1
+    )
@@ -0,0 +1,76 @@
+from app.clock import VirtualClock
+from app.clustering import DOMAIN_MATCH, EXACT_TITLE_MATCH, PostClusterer
+from app.fingerprints import canonical_url, normalize_title, post_fingerprints
+from tests.sample_data.test_posts import get_earthquake_posts, get_tech_posts
+
+
+def repost(post, post_id, **changes):
+    copy = dict(post, id=post_id, url=f"https://example.org/{post_id}")
+    copy.update(changes)
+    return copy
+
+
+def unscored_clusterer(**kwargs) -> PostClusterer:
+    """Clusterer that fails the test if a post reaches title scoring"""
+    clusterer = PostClusterer(verbose=False, **kwargs)
+
+    def fail(*args):
+        raise AssertionError("post was scored")
+
+    clusterer._title_similarity = fail
+    return clusterer
+
+
+def test_normalization():
+    assert normalize_title("[Breaking] Quake hits Japan!!") == "quake hits japan"
+    assert canonical_url("https://www.CNN.com/story/?utm_source=x&id=2&ref=t") == (
+        "cnn.com/story?id=2"
+    )
+    assert canonical_url("https://youtube.com/watch?v=abc") != canonical_url(
+        "https://youtube.com/watch?v=xyz"
+    )
+    assert canonical_url("") is None
+    # Too short to tell one story from another
+    assert post_fingerprints({"id": "a", "title": "Live update"}).title is None
+
+
+def test_reposts_and_crossposts_skip_scoring():
+    eq_post = get_earthquake_posts()[0]
+    clusterer = unscored_clusterer()
+    cluster_id, _ = clusterer.assign_post(eq_post)
+
+    retitled = repost(eq_post, "r1", title=eq_post["title"].upper() + " [video]")
+    crosspost = repost(
+        get_tech_posts()[0], "x1", crosspost_parent=f"t3_{eq_post['id']}"
+    )
+    same_link = repost(get_tech_posts()[1], "l1", url=eq_post["url"] + "?utm_id=1")
+
+    assert clusterer.best_match(retitled) == (cluster_id, EXACT_TITLE_MATCH)
+    for post in (retitled, crosspost, same_link):
+        assert clusterer.assign_post(post) == (cluster_id, False)
+    assert clusterer.best_match(same_link) == (cluster_id, DOMAIN_MATCH)
+    assert clusterer.active_clusters[cluster_id].post_count == 4
+
+
+def test_title_shortcut_respects_threshold():
+    eq_post = get_earthquake_posts()[0]
+    clusterer = PostClusterer(similarity_threshold=10, verbose=False)
+    first, _ = clusterer.assign_post(eq_post)
+    second, created = clusterer.assign_post(repost(eq_post, "eq_copy"))
+    assert created and second != first
+
+
+def test_fingerprints_follow_cluster_lifetime():
+    clock = VirtualClock()
+    clusterer = PostClusterer(verbose=False, clock=clock)
+    eq_post = get_earthquake_posts()[0]
+    first = clusterer.create_cluster(eq_post)
+    second = clusterer.create_cluster(repost(eq_post, "eq_copy", title="Other"))
+
+    clusterer.merge_clusters(second, first)
+    assert clusterer.best_match(repost(eq_post, "r1"))[0] == second
+
+    clock.advance(25 * 3600)
+    assert clusterer.expire_stale_clusters() == [second]
+    assert len(clusterer.fingerprints) == 0
+    assert clusterer.assign_post(repost(eq_post, "r2"))[1] is True
@@ -0,0 +1,59 @@
+import random
+import string
+import time
+
+from app.gazetteer import EVENT, LOCATION, Gazetteer, get_gazetteer
+
+
+def test_word_boundaries_and_longest_match():
+    gazetteer = Gazetteer(
+        [
+            ("york", "york", LOCATION),
+            ("new york", "new york", LOCATION),
+            ("new york city", "new york city", LOCATION),
+            ("flood", "flood", EVENT),
+        ]
+    )
+    assert gazetteer.extract("Flood hits New York City") == ["flood", "new york city"]
+    assert gazetteer.extract("Floodgates open in Yorkshire") == []
+    assert gazetteer.extract("york, new york") == ["york", "new york"]
+
+
+def test_bundled_list_aliases():
+    gazetteer = get_gazetteer()
+    matches = gazetteer.find("quake shakes japanese coast near tokyo; u.s. sends aid")
+    assert [(m.canonical, m.kind) for m in matches] == [
+        ("earthquake", EVENT),
+        ("japan", LOCATION),
+        ("tokyo", LOCATION),
+        ("united states", LOCATION),
+    ]
+
+
+def test_load_from_file(tmp_path):
+    path = tmp_path / "places.tsv"
+    path.write_text("# comment\nlocation\tReykjavik\treykjavík|rvk\nterm\tlava\t\n")
+    gazetteer = Gazetteer.load(str(path))
+    assert gazetteer.extract("Lava reaches Reykjavík") == ["lava", "reykjavik"]
+
+
+def test_large_gazetteer_stays_sub_millisecond():
+    rng = random.Random(7)
+    names = {
+        "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 12)))
+        for _ in range(50000)
+    }
+    gazetteer = Gazetteer((name, name, LOCATION) for name in names)
+    gazetteer.build()
+    assert gazetteer.size == len(names)
+
+    place = sorted(names)[0]
+    titles = [
+        f"Breaking: magnitude 6.{i} earthquake strikes near {place}, tsunami warning"
+        for i in range(500)
+    ]
+    start = time.perf_counter()
+    for title in titles:
+        assert place in gazetteer.extract(title)
+    per_title = (time.perf_counter() - start) / len(titles)
+    assert per_title < 0.001
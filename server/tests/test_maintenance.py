@@ -0,0 +1,146 @@
+import pytest
+
+from app.clustering import PostClusterer
+from app.maintenance import ClusterMaintainer
+from app.models import Cluster, Post
+from app.service import ClusterService
+from tests.sample_data.test_posts import get_earthquake_posts, get_tech_posts
+
+
+def repost(post, post_id):
+    copy = dict(post, id=post_id)
+    copy["url"] = f"https://example{post_id}.org/story"
+    return copy
+
+
+def test_converged_clusters_merge():
+    clusterer = PostClusterer(verbose=False)
+    eq_post = get_earthquake_posts()[0]
+    first = clusterer.create_cluster(eq_post)
+    second = clusterer.create_cluster(repost(eq_post, "eq_copy"))
+    clusterer.add_to_cluster(second, repost(eq_post, "eq_copy2"))
+    tech = clusterer.create_cluster(get_tech_posts()[0])
+
+    report = ClusterMaintainer(clusterer).run()
+
+    # The larger cluster survives
+    assert report.merged == {first: second}
+    assert set(clusterer.active_clusters) == {second, tech}
+    merged = clusterer.active_clusters[second]
+    assert merged.post_count == 3
+    assert merged.term_counts[next(iter(merged.keywords))] == 3
+
+
+def test_diverged_members_split_by_group():
+    eq_posts = get_earthquake_posts()
+    tech_posts = get_tech_posts()
+    # Two copies of one story and an unrelated one
+    outliers = [tech_posts[0], repost(tech_posts[0], "tech_copy"), tech_posts[2]]
+    clusterer = PostClusterer(verbose=False)
+    cluster_id = clusterer.create_cluster(eq_posts[0])
+    for post in eq_posts[1:] + outliers:
+        clusterer.add_to_cluster(cluster_id, post)
+
+    maintainer = ClusterMaintainer(clusterer)
+    assert maintainer.split_candidates() == [cluster_id]
+    report = maintainer.run({cluster_id: eq_posts + outliers})
+
+    assert [moved for source, moved in report.split.values()] == [
+        [tech_posts[0]["id"], "tech_copy"],
+        [tech_posts[2]["id"]],
+    ]
+    assert {source for source, _ in report.split.values()} == {cluster_id}
+    assert clusterer.active_clusters[cluster_id].post_count == len(eq_posts)
+    sizes = [clusterer.active_clusters[new_id].post_count for new_id in report.split]
+    assert sizes == [2, 1]
+    # Nothing changed since, so the next pass loads no members
+    assert maintainer.split_candidates() == []
+
+
+def test_plan_leaves_clusters_alone():
+    clusterer = PostClusterer(verbose=False)
+    eq_post = get_earthquake_posts()[0]
+    first = clusterer.create_cluster(eq_post)
+    second = clusterer.create_cluster(repost(eq_post, "eq_copy"))
+    maintainer = ClusterMaintainer(clusterer)
+
+    report = maintainer.plan()
+    assert report.merged
+    assert set(clusterer.active_clusters) == {first, second}
+    # Not applied, so the next plan finds the same merge
+    assert maintainer.plan().merged == report.merged
+    maintainer.apply(report)
+    assert len(clusterer.active_clusters) == 1
+
+
+def test_stop_words_alone_merge_nothing():
+    clusterer = PostClusterer(verbose=False)
+    eq_post = get_earthquake_posts()[0]
+    filler = [
+        dict(eq_post, id="filler1", title="Why would anyone ever do this", selftext=""),
+        dict(eq_post, id="filler2", title="Why would anyone ever do that", selftext=""),
+    ]
+    for post in filler:
+        clusterer.create_cluster(repost(post, post["id"]))
+    eq_id = clusterer.create_cluster(eq_post)
+    tech_id = clusterer.create_cluster(get_tech_posts()[0])
+
+    assert not ClusterMaintainer(clusterer).run()
+    # Candidates come from the keyword index, only clusters sharing a topic term
+    eq_keywords = clusterer.active_clusters[eq_id].keywords
+    assert list(clusterer.merge_candidates(eq_keywords)) == [eq_id]
+    clusterer.spill_cluster(eq_id)
+    assert tech_id in clusterer.active_clusters
+    assert not clusterer.merge_candidates(eq_keywords)
+
+
+def test_only_changed_clusters_are_revisited():
+    clusterer = PostClusterer(verbose=False)
+    eq_post = get_earthquake_posts()[0]
+    clusterer.create_cluster(eq_post)
+    maintainer = ClusterMaintainer(clusterer)
+    assert not maintainer.run()
+
+    # A duplicate appearing later is still caught on the next pass
+    clusterer.create_cluster(repost(eq_post, "eq_copy"))
+    assert maintainer.run().merged
+    assert not maintainer.run()
+
+
+def test_service_persists_merges(session_factory):
+    clusterer = PostClusterer(similarity_threshold=10, verbose=False)
+    service = ClusterService(session_factory, clusterer)
+    eq_post = get_earthquake_posts()[0]
+    (first, _), (second, _) = service.cluster_batch(
+        [eq_post, repost(eq_post, "eq_copy")]
+    )
+
+    report = service.run_maintenance()
+    assert report.merged
+
+    db = session_factory()
+    kept = report.merged.get(second, report.merged.get(first))
+    assert {post.cluster_id for post in db.query(Post)} == {kept}
+    assert [cluster.id for cluster in db.query(Cluster)] == [kept]
+    assert db.get(Cluster, kept).post_count == 2
+    db.close()
+
+
+def test_failed_maintenance_write_changes_nothing(session_factory):
+    clusterer = PostClusterer(similarity_threshold=10, verbose=False)
+    service = ClusterService(session_factory, clusterer)
+    eq_post = get_earthquake_posts()[0]
+    service.cluster_batch([eq_post, repost(eq_post, "eq_copy")])
+    before = set(clusterer.active_clusters)
+
+    def fail(report):
+        raise RuntimeError("database went away")
+
+    service._persist_maintenance = fail
+    with pytest.raises(RuntimeError):
+        service.run_maintenance()
+    assert set(clusterer.active_clusters) == before
+
+    # The pass is planned again once storage is back
+    del service._persist_maintenance
+    assert service.run_maintenance().merged
@@ -0,0 +1,143 @@
+from app.clock import VirtualClock
+from app.config import get_settings
+from app.main import _cluster_state
+from app.maintenance import PartitionedMaintainer
+from app.partitioned import PartitionedClusterer
+from app.service import ClusterService
+from app.spill import MemorySpillStore
+from tests.sample_data.test_posts import (
+    get_earthquake_posts,
+    get_tech_posts,
+    get_unrelated_posts,
+)
+
+
+def in_subreddit(post, subreddit, post_id=None):
+    return dict(post, subreddit=subreddit, id=post_id or post["id"])
+
+
+def test_partitions_keep_separate_clusters():
+    clusterer = PartitionedClusterer()
+    eq_post = get_earthquake_posts()[0]
+    world, _ = clusterer.assign_post(in_subreddit(eq_post, "worldnews"))
+    japan, created = clusterer.assign_post(
+        in_subreddit(get_earthquake_posts()[1], "japan")
+    )
+
+    # Same story, but r/japan never sees r/worldnews clusters
+    assert created and japan != world
+    assert set(clusterer.partitions) == {"worldnews", "japan"}
+    assert set(clusterer.active_clusters) == {world, japan}
+    assert clusterer.partitions["japan"].vectorizer is clusterer.vectorizer
+
+
+def test_grouped_subreddits_share_a_partition():
+    clusterer = PartitionedClusterer(groups={"WorldNews": "news", "news": "news"})
+    eq_posts = get_earthquake_posts()
+    cluster_id, _ = clusterer.assign_post(eq_posts[0])
+    assert clusterer.assign_post(eq_posts[2]) == (cluster_id, False)
+    assert set(clusterer.partitions) == {"news"}
+
+
+def test_cross_match_consults_linked_partitions():
+    clusterer = PartitionedClusterer(cross_match={"japan": ["worldnews"]})
+    eq_posts = get_earthquake_posts()
+    world, _ = clusterer.assign_post(eq_posts[0])
+
+    cluster_id, created = clusterer.assign_post(in_subreddit(eq_posts[1], "japan"))
+    assert (cluster_id, created) == (world, False)
+    assert clusterer.active_clusters[world].post_count == 2
+    # Unlinked partitions still start their own cluster
+    assert clusterer.assign_post(in_subreddit(eq_posts[3], "news"))[1]
+
+
+def test_memory_budget_is_shared_across_partitions():
+    stores = {}
+
+    def spill_factory(name):
+        stores[name] = MemorySpillStore()
+        return stores[name]
+
+    clusterer = PartitionedClusterer(max_active_clusters=2, spill_factory=spill_factory)
+    eq_posts = get_earthquake_posts()
+    eq_cluster, _ = clusterer.assign_post(eq_posts[0])
+    for post in get_unrelated_posts():
+        clusterer.assign_post(post)
+
+    assert len(clusterer.active_clusters) == 2
+    assert eq_cluster in stores["worldnews"]
+
+    # Faults back into its own partition
+    assert clusterer.assign_post(eq_posts[1]) == (eq_cluster, False)
+    assert eq_cluster in clusterer.partitions["worldnews"].active_clusters
+
+
+def test_budget_spills_a_batch_across_partitions():
+    stores = {}
+
+    def spill_factory(name):
+        stores[name] = MemorySpillStore()
+        return stores[name]
+
+    clusterer = PartitionedClusterer(
+        max_active_clusters=20, spill_factory=spill_factory
+    )
+    posts = [
+        dict(post, id=f"p{i}", title=f"{post['title']} {i}", url=f"https://e{i}.org")
+        for i, post in enumerate(get_unrelated_posts() * 8)
+    ]
+    created = [
+        clusterer.create_cluster(in_subreddit(post, f"sub{i % 2}"))
+        for i, post in enumerate(posts[:21])
+    ]
+    # Down to the low-water mark, oldest first whichever partition holds them
+    assert len(clusterer.active_clusters) == 18
+    assert sum(len(store) for store in stores.values()) == 3
+    assert all(
+        cluster_id in stores[f"sub{i % 2}"] for i, cluster_id in enumerate(created[:3])
+    )
+
+
+def test_service_uses_partitioned_clusterer(session_factory):
+    clusterer = PartitionedClusterer()
+    service = ClusterService(session_factory, clusterer)
+    assert isinstance(service.maintainer, PartitionedMaintainer)
+
+    eq_posts = get_earthquake_posts()
+    results = service.cluster_batch(eq_posts[:2] + get_tech_posts()[:1])
+    assert results[1] == (results[0][0], False)
+    assert len({cluster_id for cluster_id, _ in results}) == 2
+    assert clusterer.get_representative_post(results[0][0])["id"] == eq_posts[0]["id"]
+    assert not service.run_maintenance()
+
+
+def test_owners_are_forgotten_with_their_clusters():
+    eq_posts = get_earthquake_posts()
+    clock = VirtualClock(eq_posts[0]["created_utc"])
+    clusterer = PartitionedClusterer(similarity_threshold=10, clock=clock)
+    first, _ = clusterer.assign_post(in_subreddit(eq_posts[0], "japan"))
+    copy = dict(in_subreddit(eq_posts[0], "japan", "eq_copy"), url="https://a.org/x")
+    second, _ = clusterer.assign_post(copy)
+    tech, _ = clusterer.assign_post(in_subreddit(get_tech_posts()[0], "technology"))
+
+    report = PartitionedMaintainer(clusterer).run()
+    (dropped,) = report.merged
+    assert clusterer.owner(dropped) is None
+    assert set(clusterer._owner) == {first, second, tech} - {dropped}
+
+    clock.advance(2 * 86400)
+    expired = clusterer.expire_stale_clusters()
+    assert sorted(expired) == sorted({first, second, tech} - {dropped})
+    assert not clusterer._owner
+
+
+def test_partitions_setting_picks_the_clusterer(monkeypatch):
+    monkeypatch.setenv("CLUSTER_PARTITIONS", "Japan=asia, korea=asia")
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    get_settings.cache_clear()
+    try:
+        clusterer, events = _cluster_state()
+    finally:
+        get_settings.cache_clear()
+    assert isinstance(clusterer, PartitionedClusterer) and events is None
+    assert clusterer.groups == {"japan": "asia", "korea": "asia"}
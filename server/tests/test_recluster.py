@@ -0,0 +1,118 @@
+from datetime import timezone
+
+import numpy as np
+from scipy import sparse
+
+from app.models import Cluster, Post
+from app.recluster import recluster, similarity_graph, write_clusters
+from tests.sample_data.test_posts import (
+    get_earthquake_posts,
+    get_tech_posts,
+    get_unrelated_posts,
+)
+
+
+def store_posts(db, posts):
+    for post in posts:
+        db.add(
+            Post(
+                id=post["id"],
+                title=post["title"],
+                content=post["selftext"],
+                url=post["url"],
+                reddit_created_utc=post["created_utc"],
+                subreddit=post["subreddit"],
+            )
+        )
+    db.commit()
+
+
+def test_recluster_groups_stories(session_factory):
+    eq_posts = get_earthquake_posts()
+    unrelated = get_unrelated_posts()
+    db = session_factory()
+    store_posts(db, eq_posts + get_tech_posts() + unrelated)
+
+    result = recluster(db, threshold=0.2)
+    labels = dict(zip(result.post_ids, result.labels))
+    assert len({labels[p["id"]] for p in eq_posts}) == 1
+    assert len({labels[p["id"]] for p in unrelated}) == len(unrelated)
+
+    write_clusters(db, result)
+    stored = {post.id: post.cluster_id for post in db.query(Post)}
+    assert len({stored[p["id"]] for p in eq_posts}) == 1
+    assert db.query(Cluster).count() == result.cluster_count
+    eq_cluster = db.get(Cluster, stored[eq_posts[0]["id"]])
+    assert eq_cluster.post_count == len(eq_posts)
+    assert eq_cluster.representative_post_id == eq_posts[0]["id"]
+    # Dated by its members, not by when the job ran
+    created = eq_cluster.created_at.replace(tzinfo=timezone.utc).timestamp()
+    assert created == eq_posts[0]["created_utc"]
+    db.close()
+
+
+def test_posts_without_time_keep_their_cluster(session_factory):
+    eq_posts = get_earthquake_posts()
+    db = session_factory()
+    store_posts(db, eq_posts)
+    undated = db.get(Post, eq_posts[0]["id"])
+    undated.reddit_created_utc = None
+    db.commit()
+
+    result = recluster(db)
+    assert eq_posts[0]["id"] not in result.post_ids
+    assert len(result.post_ids) == len(eq_posts) - 1
+    assert list(result.timestamps) == sorted(result.timestamps)
+    db.close()
+
+
+def test_worker_processes_match_inline(session_factory):
+    db = session_factory()
+    store_posts(db, get_earthquake_posts() + get_tech_posts() + get_unrelated_posts())
+    inline = recluster(db, threshold=0.2, chunk_size=4, workers=1)
+    pooled = recluster(db, threshold=0.2, chunk_size=4, workers=2)
+    assert pooled.post_ids == inline.post_ids
+    assert list(pooled.labels) == list(inline.labels)
+    db.close()
+
+
+def test_time_range_limits_posts(session_factory):
+    eq_posts = get_earthquake_posts()
+    db = session_factory()
+    store_posts(db, eq_posts)
+    result = recluster(db, start=eq_posts[1]["created_utc"])
+    assert eq_posts[0]["id"] not in result.post_ids
+    db.close()
+
+
+def test_clusters_keeping_older_posts_are_recounted(session_factory):
+    eq_posts = get_earthquake_posts()
+    db = session_factory()
+    db.add(Cluster(id=1, post_count=len(eq_posts)))
+    store_posts(db, eq_posts)
+    db.query(Post).update({Post.cluster_id: 1})
+    db.commit()
+
+    # Only the later posts are re-clustered, the first stays where it was
+    write_clusters(db, recluster(db, start=eq_posts[1]["created_utc"]))
+    assert db.get(Cluster, 1).post_count == 1
+    assert sum(cluster.post_count for cluster in db.query(Cluster)) == len(eq_posts)
+    db.close()
+
+
+def test_blocked_graph_matches_dense_product():
+    rng = np.random.default_rng(0)
+    vectors = sparse.random(300, 50, density=0.1, random_state=1, format="csr")
+    norms = np.sqrt(vectors.multiply(vectors).sum(axis=1)).A.ravel()
+    norms[norms == 0] = 1
+    vectors = sparse.diags(1 / norms) @ vectors
+    timestamps = np.sort(rng.uniform(0, 1000, 300))
+
+    graph = similarity_graph(
+        vectors.tocsr(), timestamps, 0.3, max_gap_seconds=200, block_size=17
+    )
+
+    dense = (vectors @ vectors.T).toarray()
+    gaps = timestamps[None, :] - timestamps[:, None]
+    expected = np.triu((dense >= 0.3) & (gaps <= 200), k=1)
+    assert set(zip(graph.row, graph.col)) == set(zip(*np.nonzero(expected)))
@@ -0,0 +1,22 @@
+from app.clustering import PostClusterer
+from benchmarks.cluster_memory import dict_clusters, measure, record_clusters
+from tests.sample_data.test_posts import get_all_posts, get_earthquake_posts
+
+
+def test_records_stay_smaller_than_dicts():
+    samples = get_all_posts()
+    before = measure(dict_clusters, samples, 500)
+    after = measure(record_clusters, samples, 500)
+    assert after < before
+
+
+def test_term_counts_start_on_first_add():
+    clusterer = PostClusterer(verbose=False)
+    eq_posts = get_earthquake_posts()
+    cluster_id = clusterer.create_cluster(eq_posts[0])
+    record = clusterer.active_clusters[cluster_id]
+    assert record.term_counts is None
+    assert record.counts() == dict.fromkeys(record.keywords, 1)
+
+    clusterer.add_to_cluster(cluster_id, eq_posts[1])
+    assert record.term_counts["earthquake"] == 2
@@ -14,7 +14,7 @@ def test_reddit_connection():
 
 # Alternative test with mocking
 def test_reddit_connection_mocked():
-    with patch("app.reddit_client.praw.Reddit") as mock_reddit:
+    with patch("praw.Reddit") as mock_reddit:
         mock_reddit.return_value = MagicMock()
         client = RedditClient()
         assert client.reddit is not None
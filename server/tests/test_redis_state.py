@@ -0,0 +1,197 @@
+import asyncio
+import shutil
+import socket
+import subprocess
+import threading
+import time
+
+import pytest
+import redis
+
+from app.clock import VirtualClock
+from app.clustering import PostClusterer
+from app.events import CLUSTER_CREATED, ClusterEvent
+from app.fingerprints import post_fingerprints
+from app.maintenance import ClusterMaintainer
+from app.redis_state import RedisClusterer, RedisClusterState, RedisEventBus
+from tests.sample_data.test_posts import (
+    get_all_posts,
+    get_earthquake_posts,
+    get_tech_posts,
+)
+
+pytestmark = pytest.mark.skipif(
+    shutil.which("redis-server") is None, reason="redis-server not installed"
+)
+
+
+@pytest.fixture(scope="module")
+def redis_url():
+    """A throwaway redis-server on a free local port"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = subprocess.Popen(
+        ["redis-server", "--port", str(port), "--save", "", "--appendonly", "no"],
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"redis://127.0.0.1:{port}/0"
+    client = redis.Redis.from_url(url)
+    for _ in range(50):
+        try:
+            client.ping()
+            break
+        except redis.ConnectionError:
+            time.sleep(0.1)
+    yield url
+    server.terminate()
+    server.wait()
+
+
+@pytest.fixture
+def state(redis_url):
+    state = RedisClusterState.from_url(redis_url)
+    state.client.flushdb()
+    return state
+
+
+def worker(state, **options):
+    return RedisClusterer(state, verbose=False, **options)
+
+
+def repost(post, post_id):
+    return dict(post, id=post_id, url=f"https://example{post_id}.org/story")
+
+
+def test_matches_in_memory_clusterer(state):
+    shared = worker(state)
+    local = PostClusterer(verbose=False)
+    for post in get_all_posts():
+        assert shared.assign_post(post) == local.assign_post(post)
+
+
+def test_workers_share_clusters_and_ids(state):
+    first, second = worker(state), worker(state)
+    eq_posts = get_earthquake_posts()
+
+    eq_cluster, _ = first.assign_post(eq_posts[0])
+    assert second.assign_post(eq_posts[1]) == (eq_cluster, False)
+    tech_cluster, created = second.assign_post(get_tech_posts()[0])
+    assert created and tech_cluster == eq_cluster + 1
+
+    # The first worker's cached copy is refreshed from the newer version
+    assert first.assign_post(eq_posts[2]) == (eq_cluster, False)
+    assert first.active_clusters[eq_cluster].post_count == 3
+    assert first.active_clusters[eq_cluster].term_counts["earthquake"] == 3
+
+
+def test_concurrent_adds_are_not_lost(state):
+    cluster_id = worker(state).create_cluster(get_earthquake_posts()[0])
+    eq_post = get_earthquake_posts()[1]
+
+    def add_posts(index):
+        clusterer = worker(state)
+        for n in range(25):
+            clusterer.add_to_cluster(cluster_id, dict(eq_post, id=f"p{index}_{n}"))
+
+    threads = [threading.Thread(target=add_posts, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    record, _ = state.load([cluster_id])[cluster_id]
+    assert record.post_count == 101
+    assert record.term_counts["earthquake"] == 101
+
+
+def test_expired_clusters_leave_every_worker(state):
+    clock = VirtualClock(get_earthquake_posts()[0]["created_utc"])
+    first, second = worker(state, clock=clock), worker(state, clock=clock)
+    eq_posts = get_earthquake_posts()
+    cluster_id, _ = first.assign_post(eq_posts[0])
+
+    clock.advance(25 * 3600)
+    assert first.expire_stale_clusters() == [cluster_id]
+    assert second.expire_stale_clusters() == []
+    assert not state.candidates(["earthquake"])
+
+    # A worker holding the old cluster starts a new one instead
+    assert not first.add_to_cluster(cluster_id, eq_posts[1])
+    assert first.assign_post(eq_posts[1])[1]
+
+
+def test_merge_rewrites_shared_state(state):
+    clusterer = worker(state)
+    eq_post = get_earthquake_posts()[0]
+    keep = clusterer.create_cluster(eq_post)
+    drop = clusterer.create_cluster(dict(eq_post, id="eq_copy"))
+
+    clusterer.merge_clusters(keep, drop)
+
+    loaded = state.load([keep, drop])
+    assert list(loaded) == [keep]
+    assert loaded[keep][0].term_counts["earthquake"] == 2
+    assert state.candidates(["earthquake"]) == [keep]
+
+
+def test_merge_with_a_vanished_cluster_is_aborted(state):
+    first, second = worker(state), worker(state)
+    eq_post = get_earthquake_posts()[0]
+    keep = first.create_cluster(eq_post)
+    drop = first.create_cluster(dict(eq_post, id="eq_copy", url="https://e.org"))
+
+    # Another worker merges it away first
+    assert second.merge_clusters(keep, drop)
+    assert not first.merge_clusters(drop, keep)
+    assert list(state.load([keep, drop])) == [keep]
+    # Its fingerprints were not handed to the cluster that is gone
+    assert first.fingerprints.lookup(post_fingerprints(eq_post).links) == keep
+
+
+def test_candidates_beyond_the_cache_are_scored(state):
+    posts = get_all_posts()
+    roomy, tight = worker(state), worker(state, cache_size=2)
+    for post in posts[1:]:
+        roomy.create_cluster(post)
+    assert tight.best_match(posts[0]) == roomy.best_match(posts[0])
+    assert roomy.best_match(posts[0])[0] is not None
+    assert len(tight.active_clusters) <= 2
+
+
+def test_stop_words_are_not_indexed(state):
+    clusterer = worker(state)
+    clusterer.create_cluster(get_earthquake_posts()[0])
+    assert state.candidates(["the", "and", "after"]) == []
+    assert state.candidates(["earthquake"])
+
+
+def test_maintenance_sees_other_workers_clusters(state):
+    eq_post = get_earthquake_posts()[0]
+    first, second = worker(state), worker(state)
+    keep = first.create_cluster(eq_post)
+    drop = second.create_cluster(repost(eq_post, "eq_copy"))
+
+    # The maintaining worker never cached either cluster
+    maintaining = worker(state)
+    assert maintaining.active_clusters == {}
+    report = ClusterMaintainer(maintaining).run()
+    assert report.merged == {drop: keep}
+    assert list(state.load([keep, drop])) == [keep]
+
+
+def test_events_reach_every_workers_subscribers(state):
+    first, second = RedisEventBus(state), RedisEventBus(state)
+
+    async def scenario():
+        subscription = second.subscribe()
+        await asyncio.sleep(0.1)
+        first.publish(ClusterEvent(CLUSTER_CREATED, 7, post_count=1, title="Quake"))
+        return await asyncio.wait_for(subscription.get(), 5)
+
+    try:
+        event = asyncio.run(scenario())
+    finally:
+        first.close()
+        second.close()
+    assert (event.type, event.cluster_id, event.title) == (CLUSTER_CREATED, 7, "Quake")
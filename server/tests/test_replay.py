@@ -0,0 +1,67 @@
+import json
+
+from app.clock import VirtualClock
+from app.clustering import PostClusterer
+from app.models import Cluster
+from app.replay import ReplayRunner, read_capture
+from app.service import ClusterService
+from tests.sample_data.test_posts import get_all_posts, get_earthquake_posts
+
+
+def write_capture(path, posts):
+    with open(path, "w") as capture:
+        for post in posts:
+            capture.write(json.dumps(post) + "\n")
+
+
+def replay(posts, **options):
+    clusterer = PostClusterer(verbose=False, clock=VirtualClock())
+    runner = ReplayRunner(clusterer, batch_size=3, **options)
+    return [assignment.to_dict() for assignment in runner.run(posts)]
+
+
+def test_replay_is_deterministic(tmp_path):
+    capture = tmp_path / "capture.jsonl"
+    write_capture(capture, get_all_posts())
+
+    first = replay(read_capture(capture))
+    assert len(first) == len(get_all_posts())
+    assert first == replay(read_capture(capture))
+
+
+def test_window_follows_post_time():
+    eq_posts = get_earthquake_posts()
+    day = 24 * 3600
+    later = dict(eq_posts[1], created_utc=eq_posts[0]["created_utc"] + day + 1)
+
+    clusterer = PostClusterer(verbose=False, clock=VirtualClock())
+    runner = ReplayRunner(clusterer, batch_size=3)
+    assignments = list(runner.run([eq_posts[0], eq_posts[1], later]))
+    assert [a.created for a in assignments] == [True, False, True]
+    new_cluster = clusterer.active_clusters[assignments[2].cluster_id]
+    assert new_cluster.created_at == later["created_utc"]
+
+
+def test_expiry_runs_on_virtual_time():
+    eq_posts = get_earthquake_posts()
+    clusterer = PostClusterer(verbose=False, clock=VirtualClock())
+    runner = ReplayRunner(clusterer, batch_size=1, expire_interval=3600)
+    later = dict(eq_posts[1], created_utc=eq_posts[0]["created_utc"] + 2 * 86400)
+
+    list(runner.run([eq_posts[0], later]))
+    assert runner.expired == 1
+    assert len(clusterer.active_clusters) == 1
+
+
+def test_replay_backfills_through_service(session_factory):
+    clusterer = PostClusterer(verbose=False, clock=VirtualClock())
+    service = ClusterService(session_factory, clusterer)
+    eq_posts = get_earthquake_posts()
+
+    list(ReplayRunner(service=service).run(eq_posts))
+
+    db = session_factory()
+    cluster = db.query(Cluster).first()
+    # Cluster rows carry post time, not the time of the backfill
+    assert cluster.created_at.timestamp() == eq_posts[0]["created_utc"]
+    db.close()
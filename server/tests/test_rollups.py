@@ -0,0 +1,124 @@
+from sqlalchemy import select
+
+from app.clock import VirtualClock
+from app.clustering import PostClusterer
+from app.models import ClusterRollup
+from app.rollups import bucket_of, bucket_seconds, rebuild_rollups
+from app.service import ClusterService
+from tests.sample_data.test_posts import get_earthquake_posts, get_tech_posts
+
+
+def stored_rollups(db):
+    return sorted(
+        (
+            row.cluster_id,
+            row.subreddit,
+            row.bucket_start,
+            row.post_count,
+            row.total_score,
+            row.total_comments,
+        )
+        for row in db.scalars(select(ClusterRollup))
+    )
+
+
+def assert_matches_posts(session_factory):
+    """Incrementally kept rollups equal a rebuild from the posts table"""
+    db = session_factory()
+    incremental = stored_rollups(db)
+    rebuild_rollups(db)
+    assert stored_rollups(db) == incremental
+    db.rollback()
+    db.close()
+
+
+def test_write_path_keeps_rollups(session_factory):
+    service = ClusterService(
+        session_factory, PostClusterer(verbose=False, clock=VirtualClock())
+    )
+    posts = get_earthquake_posts() + get_tech_posts()
+    results = service.cluster_batch(posts[:4])
+    results += service.cluster_batch(posts[4:])
+
+    db = session_factory()
+    rows = stored_rollups(db)
+    db.close()
+    assert sum(row[3] for row in rows) == len(posts)
+    assert sum(row[4] for row in rows) == sum(post["score"] for post in posts)
+    eq_cluster = results[0][0]
+    first = posts[0]
+    assert (
+        eq_cluster,
+        "worldnews",
+        bucket_of(first["created_utc"]),
+    ) in {row[:3] for row in rows}
+    assert_matches_posts(session_factory)
+
+
+def test_trending_compares_with_previous_window(session_factory):
+    clock = VirtualClock()
+    service = ClusterService(session_factory, PostClusterer(verbose=False, clock=clock))
+    eq_posts = get_earthquake_posts()
+    tech_posts = get_tech_posts()
+    start = eq_posts[0]["created_utc"]
+
+    # Tech was busy an hour ago, the earthquake story is busy now
+    early = [dict(post, created_utc=start - 3600) for post in tech_posts]
+    service.cluster_batch(early + eq_posts)
+    clock.advance_to(start + 1800)
+
+    trending = service.trending_clusters(hours=1)
+    assert trending[0]["post_count"] == len(eq_posts)
+    assert trending[0]["previous_post_count"] == 0
+    assert trending[0]["total_score"] == sum(post["score"] for post in eq_posts)
+    assert all(cluster["post_count"] > 0 for cluster in trending)
+
+    news = service.trending_clusters(hours=1, subreddit="news")
+    assert [cluster["post_count"] for cluster in news] == [1]
+    assert service.trending_clusters(hours=1, subreddit="technology") == []
+
+    # Two hours back the tech posts count too, and grew from nothing
+    wider = service.trending_clusters(hours=2)
+    assert sum(cluster["post_count"] for cluster in wider) == len(early + eq_posts)
+
+
+def test_maintenance_moves_rollups(session_factory):
+    clusterer = PostClusterer(similarity_threshold=10, verbose=False)
+    service = ClusterService(session_factory, clusterer)
+    eq_post = get_earthquake_posts()[0]
+    copy = dict(
+        eq_post, id="eq_copy", created_utc=eq_post["created_utc"] + bucket_seconds()
+    )
+    copy["url"] = "https://example.org/eq_copy"
+    service.cluster_batch([eq_post, copy])
+
+    report = service.run_maintenance()
+    assert report.merged
+    kept = next(iter(report.merged.values()))
+    db = session_factory()
+    assert {row[0] for row in stored_rollups(db)} == {kept}
+    db.close()
+    assert_matches_posts(session_factory)
+
+
+def test_split_moves_rollups(session_factory):
+    clusterer = PostClusterer(verbose=False)
+    service = ClusterService(session_factory, clusterer)
+    eq_posts = get_earthquake_posts()
+    tech_posts = get_tech_posts()[:2]
+    (cluster_id, _), *_ = service.cluster_batch(eq_posts)
+    # Force unrelated posts into the earthquake cluster
+    clusterer.find_similar_cluster = lambda post: cluster_id
+    service.cluster_batch(tech_posts)
+    del clusterer.find_similar_cluster
+
+    report = service.run_maintenance()
+    # Different takes on the story, too far apart to stay together
+    assert len(report.split) == len(tech_posts)
+    db = session_factory()
+    counts = {}
+    for row in stored_rollups(db):
+        counts[row[0]] = counts.get(row[0], 0) + row[3]
+    db.close()
+    assert counts == {cluster_id: len(eq_posts), **dict.fromkeys(report.split, 1)}
+    assert_matches_posts(session_factory)
@@ -0,0 +1,134 @@
+from functools import partial
+
+import pytest
+
+from app.clock import VirtualClock
+from app.scheduler import PollScheduler, allocate_intervals
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+
+class FakeReddit:
+    """Posts arriving at a steady rate per subreddit, on a virtual clock"""
+
+    def __init__(self, clock, rates):
+        self.clock = clock
+        self.rates = rates  # Posts per hour
+        self.calls = []
+
+    def post(self, subreddit, i):
+        step = HOUR / self.rates[subreddit]
+        return {"id": f"{subreddit}_{i}", "created_utc": i * step}
+
+    def posted(self, subreddit):
+        """Number of posts made so far"""
+        return int(self.clock.now() * self.rates[subreddit] / HOUR)
+
+    def get_new_posts(self, subreddit, limit=10):
+        self.calls.append((self.clock.now(), subreddit, limit))
+        newest = self.posted(subreddit)
+        return [
+            self.post(subreddit, i) for i in range(newest, max(newest - limit, 0), -1)
+        ]
+
+
+def run(rates, hours=6, **options):
+    clock = VirtualClock(DAY)
+    client = FakeReddit(clock, rates)
+    scheduler = PollScheduler(client, rates, clock=clock, **options)
+    received = []
+    scheduler.run(received.extend, until=DAY + hours * HOUR, sleep=clock.advance)
+    return scheduler, client, received
+
+
+def test_intervals_follow_square_root_of_rate():
+    intervals = allocate_intervals(
+        {"busy": 400 / HOUR, "quiet": 100 / HOUR, "dead": 0.0},
+        budget=0.05,
+        min_interval=10,
+        max_interval=HOUR,
+    )
+    assert intervals["busy"] * 2 == pytest.approx(intervals["quiet"])
+    assert intervals["dead"] > 40 * intervals["quiet"]
+    assert sum(1 / t for t in intervals.values()) == pytest.approx(0.05)
+
+    # Polling the dead subreddit at max_interval leaves less for the others
+    capped = allocate_intervals(
+        {"busy": 400 / HOUR, "quiet": 100 / HOUR, "dead": 0.0}, 0.05, 10, 600
+    )
+    assert capped["dead"] == 600
+    assert capped["busy"] * 2 == pytest.approx(capped["quiet"])
+    assert capped["busy"] > intervals["busy"]
+    assert sum(1 / t for t in capped.values()) == pytest.approx(0.05)
+
+    # A budget too tight for min_interval stretches every interval
+    tight = allocate_intervals({"a": 1.0, "b": 1.0}, 0.01, 10, HOUR)
+    assert tight == {"a": 200.0, "b": 200.0}
+
+
+def test_busy_subreddits_polled_more_within_budget():
+    rates = {"worldnews": 600, "news": 60, "quiet": 2}
+    scheduler, client, received = run(rates, budget=2)
+
+    # Never more requests than the budget allows over the run
+    assert scheduler.requests <= 2 * 6 * 60 + len(rates)
+    polls = {name: stats.polls for name, stats in scheduler.stats.items()}
+    assert polls["worldnews"] > polls["news"] > polls["quiet"]
+
+    worldnews = scheduler.stats["worldnews"]
+    assert abs(worldnews.rate * HOUR - 600) < 60
+    assert worldnews.limit > scheduler.stats["quiet"].limit
+    assert worldnews.full_pages == 0
+
+    # Every post arrives once, and after the backlog page nothing is skipped
+    ids = {post["id"] for post in received}
+    assert len(ids) == len(received)
+    for name in rates:
+        first_poll = min(at for at, subreddit, _ in client.calls if subreddit == name)
+        missing = [
+            post
+            for post in map(
+                partial(client.post, name), range(1, client.posted(name) + 1)
+            )
+            if post["created_utc"] > first_poll and post["id"] not in ids
+        ]
+        # Only posts made since the subreddit's last poll
+        assert len(missing) <= rates[name] * scheduler.stats[name].interval / HOUR + 1
+
+
+def test_adaptive_lag_beats_fixed_interval():
+    rates = {"worldnews": 600, "news": 60, "quiet": 2}
+    adaptive, _, received = run(rates, budget=2)
+
+    # Same budget spent evenly: 3 subreddits, 2 requests a minute
+    fixed_interval = 90.0
+    fixed, _, fixed_received = run(
+        rates,
+        budget=2,
+        min_interval=fixed_interval,
+        max_interval=fixed_interval,
+        min_limit=100,
+    )
+
+    def mean_lag(scheduler):
+        stats = scheduler.stats.values()
+        return sum(s.lag for s in stats) / sum(s.lagged for s in stats)
+
+    assert mean_lag(adaptive) < 0.8 * mean_lag(fixed)
+    assert len(received) >= len(fixed_received) - 20
+
+
+def test_rate_change_is_followed():
+    clock = VirtualClock()
+    client = FakeReddit(clock, {"live": 60, "other": 60})
+    scheduler = PollScheduler(client, ["live", "other"], budget=2, clock=clock)
+    scheduler.run(lambda posts: None, until=2 * HOUR, sleep=clock.advance)
+    calm = scheduler.stats["live"].interval
+
+    # A breaking story: live starts posting ten times faster
+    client.rates["live"] = 600
+    clock.advance_to(4 * HOUR)  # Shifts the fake's post numbering forward
+    scheduler.run(lambda posts: None, until=6 * HOUR, sleep=clock.advance)
+    assert scheduler.stats["live"].interval < calm
+    assert scheduler.stats["live"].interval < scheduler.stats["other"].interval
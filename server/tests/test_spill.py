@@ -0,0 +1,99 @@
+from app.clustering import PostClusterer
+from app.spill import MemorySpillStore, ShelveSpillStore
+from tests.sample_data.test_posts import (
+    get_earthquake_posts,
+    get_tech_posts,
+    get_unrelated_posts,
+)
+
+
+def test_evicted_cluster_faults_back_in():
+    store = MemorySpillStore()
+    clusterer = PostClusterer(verbose=False, max_active_clusters=2, spill_store=store)
+    eq_posts = get_earthquake_posts()
+
+    eq_cluster, _ = clusterer.assign_post(eq_posts[0])
+    for post in get_tech_posts()[:1] + get_unrelated_posts():
+        clusterer.assign_post(post)
+
+    assert len(clusterer.active_clusters) == 2
+    assert eq_cluster in store
+
+    cluster_id, created = clusterer.assign_post(eq_posts[1])
+    assert (cluster_id, created) == (eq_cluster, False)
+    assert clusterer.active_clusters[eq_cluster].post_count == 2
+    assert len(clusterer.active_clusters) <= 2
+
+
+def test_eviction_prefers_least_recently_matched():
+    clusterer = PostClusterer(
+        verbose=False, max_active_clusters=2, spill_store=MemorySpillStore()
+    )
+    eq_posts = get_earthquake_posts()
+    eq_cluster, _ = clusterer.assign_post(eq_posts[0])
+    tech_cluster, _ = clusterer.assign_post(get_tech_posts()[0])
+
+    # Matching refreshes the earthquake cluster, so the tech one goes first
+    clusterer.assign_post(eq_posts[1])
+    new_cluster, _ = clusterer.assign_post(get_unrelated_posts()[0])
+
+    assert set(clusterer.active_clusters) == {eq_cluster, new_cluster}
+    assert tech_cluster in clusterer.spill_store
+
+
+def test_byte_budget():
+    clusterer = PostClusterer(
+        verbose=False, max_active_bytes=1, spill_store=MemorySpillStore()
+    )
+    for post in get_unrelated_posts():
+        clusterer.assign_post(post)
+    # The newest cluster is always kept, everything else spills
+    assert len(clusterer.active_clusters) == 1
+    assert len(clusterer.spill_store) == len(get_unrelated_posts()) - 1
+
+
+def test_shelve_round_trip(tmp_path):
+    clusterer = PostClusterer(verbose=False)
+    cluster_id = clusterer.create_cluster(get_earthquake_posts()[0])
+    record = clusterer.active_clusters[cluster_id]
+
+    store = ShelveSpillStore(str(tmp_path / "spill"))
+    store.put(record)
+    assert store.candidates(record.keywords) == [cluster_id]
+
+    restored = store.take(cluster_id)
+    assert restored.title == record.title
+    assert restored.keywords == record.keywords
+    assert cluster_id not in store
+    assert store.candidates(record.keywords) == []
+    store.close()
+
+
+def test_spilling_frees_a_batch_at_once():
+    store = MemorySpillStore()
+    clusterer = PostClusterer(verbose=False, max_active_clusters=20, spill_store=store)
+    posts = [
+        dict(post, id=f"p{i}", title=f"{post['title']} {i}", url=f"https://e{i}.org")
+        for i, post in enumerate(get_unrelated_posts() * 8)
+    ][:23]
+    for post in posts[:21]:
+        clusterer.create_cluster(post)
+    # Down to the low-water mark, so the next creates need no spilling
+    assert (len(clusterer.active_clusters), len(store)) == (18, 3)
+    for post in posts[21:]:
+        clusterer.create_cluster(post)
+    assert (len(clusterer.active_clusters), len(store)) == (20, 3)
+
+
+def test_stop_words_make_no_candidates():
+    clusterer = PostClusterer(verbose=False)
+    store = MemorySpillStore()
+    recipes = {"id": "r1", "title": "The best recipes for the summer and all of it"}
+    quake = {"id": "q1", "title": "Earthquake hits the coast and all of the towns"}
+    store.put(clusterer._new_record(1, dict(recipes, subreddit="food")))
+    store.put(clusterer._new_record(2, dict(quake, subreddit="news")))
+
+    keywords = clusterer._post_keywords(
+        {"id": "q2", "title": "Earthquake damage for the coast towns and all"}
+    )
+    assert store.candidates(keywords) == [2]
@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+
+# Loose upper bound on `import app.main` in milliseconds, only there to catch
+# gross regressions on slow machines; LAZY_MODULES is the real check
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "5000"))
+
+# Loaded on first use, never by importing the app
+LAZY_MODULES = (
+    "sklearn",
+    "scipy",
+    "numpy",
+    "pandas",
+    "pyarrow",
+    "praw",
+    "redis",
+    "dotenv",
+)
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=SERVER_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def cumulative_import_ms(importtime: str, module: str) -> float:
+    """A module's cumulative time from `python -X importtime` output"""
+    # Lines look like "import time:   self [us] | cumulative | module"
+    for line in importtime.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1000
+    raise AssertionError(f"{module} missing from -X importtime output")
+
+
+def test_app_imports_without_heavy_dependencies():
+    loaded = run_python(
+        "-c",
+        "import sys, app.main, app.reddit_client, app.replay\n"
+        f"print(' '.join(m for m in {LAZY_MODULES!r} if m in sys.modules))",
+    )
+    assert loaded.stdout.split() == []
+
+
+def test_import_time_budget():
+    # Warm up bytecode caches so only import work is measured
+    run_python("-c", "import app.main")
+    result = run_python("-X", "importtime", "-c", "import app.main")
+    elapsed = cumulative_import_ms(result.stderr, "app.main")
+    assert elapsed < IMPORT_BUDGET_MS, f"import app.main took {elapsed:.0f} ms"
@@ -0,0 +1,52 @@
+import json
+import random
+
+from app.clustering import PostClusterer
+from app.models import Cluster
+from app.service import ClusterService
+from app.topics import bump_top_terms, ranked_terms
+from tests.sample_data.test_posts import get_earthquake_posts
+
+
+def test_heap_tracks_top_terms():
+    rng = random.Random(0)
+    words = [f"term{i}" for i in range(40)]
+    counts, heap = {}, []
+    for _ in range(2000):
+        # Skewed so the leaders keep changing early on
+        word = words[min(int(rng.expovariate(0.15)), len(words) - 1)]
+        counts[word] = counts.get(word, 0) + 1
+        bump_top_terms(heap, word, counts[word], k=5)
+
+    expected = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:5]
+    assert sorted(heap) == sorted((count, word) for word, count in expected)
+    assert ranked_terms(heap) == [word for word, _ in expected]
+
+
+def test_cluster_keywords_and_headline():
+    clusterer = PostClusterer(verbose=False)
+    eq_posts = get_earthquake_posts()
+    cluster_id = clusterer.create_cluster(eq_posts[0])
+    for post in eq_posts[1:]:
+        clusterer.add_to_cluster(cluster_id, post)
+
+    cluster = clusterer.active_clusters[cluster_id]
+    keywords = cluster.ranked_keywords()
+    assert keywords[:2] == ["earthquake", "japan"]
+    assert not {"the", "and", "after"} & set(keywords)
+    assert cluster.headline in {post["title"] for post in eq_posts}
+    # Matching still compares against the representative post
+    assert cluster.title == eq_posts[0]["title"]
+
+
+def test_service_persists_keywords(session_factory):
+    service = ClusterService(session_factory, PostClusterer(verbose=False))
+    results = service.cluster_batch(get_earthquake_posts())
+    cluster_id = results[0][0]
+
+    db = session_factory()
+    stored = db.get(Cluster, cluster_id)
+    record = service.clusterer.active_clusters[cluster_id]
+    assert json.loads(stored.keywords) == record.ranked_keywords()
+    assert stored.title == record.headline
+    db.close()